@@ -38,13 +38,25 @@ class ConfigValidator:
                             "required": ["id", "ip"],
                             "properties": {
                                 "id": {"type": "string"},
-                                "ip": {"type": "string", "format": "ipv4"}
+                                "ip": {"type": "string", "format": "ipv4"},
+                                "mac": {"type": "string", "pattern": r"^[0-9a-fA-F]{2}(:[0-9a-fA-F]{2}){5}$"}
                             }
                         }
                     },
                     "protocol": {
                         "type": "string",
                         "enum": ["batman-adv", "olsr", "babel"]
+                    },
+                    "batman": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "properties": {
+                            "interface": {"type": "string"},
+                            "batctl": {"type": "string"},
+                            "debugfs": {"type": "string"},
+                            "arp_table": {"type": "string"},
+                            "timeout": {"type": "number", "exclusiveMinimum": 0}
+                        }
                     }
                 }
             },
@@ -57,6 +69,51 @@ class ConfigValidator:
                     "metrics": {
                         "type": "array",
                         "items": {"type": "string"}
+                    },
+                    "probe": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "properties": {
+                            "method": {"type": "string", "enum": ["icmp", "udp"]},
+                            "count": {"type": "integer", "minimum": 1},
+                            "spacing": {"type": "number", "minimum": 0},
+                            "timeout": {"type": "number", "exclusiveMinimum": 0},
+                            "concurrency": {"type": "integer", "minimum": 1},
+                            "udp_port": {"type": "integer", "minimum": 1, "maximum": 65535},
+                            "cycle_budget": {"type": "number", "exclusiveMinimum": 0}
+                        }
+                    },
+                    "history": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "properties": {
+                            "retention": {"type": "number", "exclusiveMinimum": 0},
+                            "tiers": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "required": ["resolution", "retention"],
+                                    "properties": {
+                                        "resolution": {"type": "number", "exclusiveMinimum": 0},
+                                        "retention": {"type": "number", "exclusiveMinimum": 0}
+                                    }
+                                }
+                            },
+                            "trend_windows": {
+                                "type": "array",
+                                "items": {"type": "number", "exclusiveMinimum": 0}
+                            },
+                            "trend_refresh": {"type": "number", "exclusiveMinimum": 0}
+                        }
+                    },
+                    "http": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "properties": {
+                            "enabled": {"type": "boolean"},
+                            "host": {"type": "string"},
+                            "port": {"type": "integer", "minimum": 0, "maximum": 65535}
+                        }
                     }
                 }
             }
@@ -4,6 +4,7 @@ from typing import Dict, Any
 from pathlib import Path
 from config.validator import ConfigValidator, ConfigValidationError
 from monitoring.mesh_monitor import MeshMonitor
+from monitoring.http_server import HealthServer, HttpConfig
 from error.error_handler import ErrorHandler, error_handler
 
 # Configure logging
@@ -26,6 +27,7 @@ class Batman:
         self.validator = ConfigValidator(config_path)
         self.error_handler = ErrorHandler({})
         self.monitor = None
+        self.http_server = None
         
     @error_handler((ConfigValidationError,))
     def validate_config(self) -> bool:
@@ -49,6 +51,23 @@ class Batman:
             logger.info("Stopping mesh network monitoring...")
             self.monitor.stop()
     
+    @error_handler((Exception,))
+    def start_http_server(self):
+        """Expose /metrics and /health over HTTP."""
+        http_config = HttpConfig.from_config(self.validator.config['monitoring'])
+        if not http_config.enabled:
+            logger.info("HTTP endpoint disabled")
+            return
+        self.http_server = HealthServer(self.monitor, http_config)
+        self.http_server.start()
+    
+    @error_handler((Exception,))
+    def stop_http_server(self):
+        """Stop the HTTP endpoint."""
+        if self.http_server:
+            self.http_server.stop()
+            self.http_server = None
+    
     def start(self):
         """Start the BATMAN component."""
         try:
@@ -60,17 +79,23 @@ class Batman:
             # Start monitoring
             self.start_monitoring()
             
+            # Serve metrics and health
+            self.start_http_server()
+            
             logger.info("BATMAN component started successfully")
             return True
             
         except Exception as e:
             logger.error(f"Failed to start BATMAN component: {str(e)}")
             self.error_handler.handle_error(e)
+            # Don't leave monitoring running without the endpoint that exposes it
+            self.stop()
             return False
     
     def stop(self):
         """Stop the BATMAN component."""
         try:
+            self.stop_http_server()
             self.stop_monitoring()
             logger.info("BATMAN component stopped successfully")
         except Exception as e:
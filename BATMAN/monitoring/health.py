@@ -0,0 +1,66 @@
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict
+
+
+@dataclass(frozen=True)
+class HealthSnapshot:
+    """Mesh health as of the end of one monitoring cycle.
+
+    Published by replacing a single reference, so readers never lock and
+    never see a half-built cycle. ``health`` is shared by every reader and
+    must be treated as read-only; ``json`` is the same document serialised.
+    """
+    version: int
+    generated_at: float
+    health: Dict[str, Any]
+    json: str
+
+
+class HealthState:
+    """Mesh health maintained node by node as the monitor thread updates it.
+
+    The up-node count changes only when a node's status does, and each
+    node's JSON is serialised once when its entry changes, so publishing a
+    snapshot never rescans or re-serialises unchanged nodes. Only the
+    monitor thread may call ``update`` and ``publish``.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.up_nodes = 0
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.fragments: Dict[str, str] = {}
+
+    def update(self, node_id: str, entry: Dict[str, Any]):
+        """Replace a node's health entry; ``entry`` must not be modified afterwards."""
+        previous = self.entries.get(node_id)
+        was_up = previous is not None and previous['status'] == 'up'
+        is_up = entry['status'] == 'up'
+        if is_up != was_up:
+            self.up_nodes += 1 if is_up else -1
+        self.entries[node_id] = entry
+        self.fragments[node_id] = json.dumps(entry)
+
+    def publish(self, total_nodes: int, mesh: Dict[str, Any]) -> HealthSnapshot:
+        """Freeze the current state, plus mesh-wide fields ``mesh``, into a new snapshot."""
+        self.version += 1
+        now = time.time()
+        summary = {
+            'version': self.version,
+            'generated_at': datetime.fromtimestamp(now).isoformat(),
+            'total_nodes': total_nodes,
+            'up_nodes': self.up_nodes,
+            'health_ratio': self.up_nodes / total_nodes if total_nodes > 0 else 0,
+            **mesh,
+        }
+        nodes = ", ".join(f"{json.dumps(node_id)}: {fragment}" for node_id, fragment in self.fragments.items())
+        document = f"{json.dumps(summary)[:-1]}, \"nodes\": {{{nodes}}}}}"
+        return HealthSnapshot(
+            version=self.version,
+            generated_at=now,
+            health={**summary, 'nodes': dict(self.entries)},
+            json=document,
+        )
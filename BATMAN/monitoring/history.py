@@ -0,0 +1,185 @@
+import math
+import threading
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Per-node series kept in history; ``up`` is 1.0/0.0 so its mean is availability
+NODE_METRICS = ('latency', 'packet_loss', 'bandwidth', 'link_quality', 'up')
+
+NAN = float('nan')
+
+
+@dataclass
+class TierSpec:
+    """One resolution of history: a sample every ``resolution`` seconds, kept for ``retention`` seconds."""
+    resolution: float
+    retention: float
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(math.ceil(self.retention / self.resolution)))
+
+
+class _Tier:
+    """Fixed-capacity rings sharing one time axis: one float32 array per (series, metric).
+
+    Appending is O(1); a series first seen late is back-filled with NaN.
+    Coarser tiers fold finer samples into per-bucket means before storing.
+    """
+
+    def __init__(self, spec: TierSpec):
+        self.spec = spec
+        self.capacity = spec.capacity
+        self.times = array('d', [0.0]) * self.capacity
+        self.rings: Dict[str, Dict[str, array]] = {}
+        self.head = 0      # next slot to write
+        self.size = 0
+        # Running sums for the bucket being filled (coarse tiers only)
+        self.bucket: Optional[int] = None
+        self.sums: Dict[Tuple[str, str], List[float]] = {}
+
+    def _ring(self, series: str, metric: str) -> array:
+        metrics = self.rings.get(series)
+        if metrics is None:
+            metrics = self.rings[series] = {}
+        ring = metrics.get(metric)
+        if ring is None:
+            ring = metrics[metric] = array('f', [NAN]) * self.capacity
+        return ring
+
+    def append(self, ts: float, samples: Dict[str, Dict[str, float]]):
+        slot = self.head
+        self.times[slot] = ts
+        for series, metrics in self.rings.items():
+            for ring in metrics.values():
+                ring[slot] = NAN
+        for series, values in samples.items():
+            for metric, value in values.items():
+                self._ring(series, metric)[slot] = NAN if value is None else value
+        self.head = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def accumulate(self, ts: float, samples: Dict[str, Dict[str, float]]):
+        """Fold one finer sample in; emits the previous bucket's means once ``ts`` leaves it."""
+        bucket = int(ts // self.spec.resolution)
+        if self.bucket is not None and bucket != self.bucket:
+            self.flush()
+        self.bucket = bucket
+        for series, values in samples.items():
+            for metric, value in values.items():
+                if value is None or value != value:
+                    continue
+                total = self.sums.setdefault((series, metric), [0.0, 0])
+                total[0] += value
+                total[1] += 1
+
+    def flush(self):
+        if self.bucket is None:
+            return
+        means: Dict[str, Dict[str, float]] = {}
+        for (series, metric), (total, count) in self.sums.items():
+            means.setdefault(series, {})[metric] = total / count
+        self.append((self.bucket + 1) * self.spec.resolution, means)
+        self.sums = {}
+        self.bucket = None
+
+    def _index(self, position: int) -> int:
+        """Ring slot of the ``position``-th oldest sample."""
+        return (self.head - self.size + position) % self.capacity
+
+    def values_since(self, series: str, metric: str, cutoff: float) -> List[float]:
+        ring = self.rings.get(series, {}).get(metric)
+        if ring is None or not self.size:
+            return []
+        # Timestamps increase along the ring, so binary search the oldest sample to keep
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.times[self._index(middle)] <= cutoff:
+                low = middle + 1
+            else:
+                high = middle
+        values = []
+        for position in range(low, self.size):
+            value = ring[self._index(position)]
+            if value == value:  # skip NaN gaps
+                values.append(value)
+        return values
+
+    def span(self) -> float:
+        return self.spec.resolution * self.capacity
+
+    def memory_bytes(self) -> int:
+        rings = sum(len(metrics) for metrics in self.rings.values())
+        return self.times.itemsize * self.capacity + rings * 4 * self.capacity
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class MetricHistory:
+    """Time series of every node's metrics in fixed-size rings, at several resolutions.
+
+    The first tier stores each monitoring cycle as recorded, for
+    ``retention`` seconds; further tiers keep per-bucket means for longer
+    horizons (their min/max/percentiles are over those means). Values are
+    float32, 4 bytes per metric per sample, so with five metrics a node
+    costs 20 bytes per slot. The defaults keep 10 minutes of 1-second
+    cycles (12 KB per node), then 10-second means for an hour, 1-minute
+    means for 6 hours and 15-minute means for 7 days (28 KB per node):
+    about 4 MB for 100 nodes and 12 MB for 300. Raw seconds are what cost
+    memory, so an hour of them for 100 nodes would be 7 MB on its own.
+    """
+
+    DEFAULT_RETENTION = 600
+    DEFAULT_TIERS = ((10, 3600), (60, 6 * 3600), (900, 7 * 86400))
+
+    def __init__(self, interval: float, retention: float = DEFAULT_RETENTION,
+                 tiers: Iterable[Tuple[float, float]] = DEFAULT_TIERS):
+        specs = [TierSpec(interval, retention)] + [TierSpec(resolution, keep) for resolution, keep in tiers
+                                                    if resolution > interval]
+        self.tiers = [_Tier(spec) for spec in specs]
+        self._lock = threading.Lock()
+        self.last_ts: Optional[float] = None
+
+    def record(self, ts: float, samples: Dict[str, Dict[str, float]]):
+        """Append one cycle: ``{series: {metric: value}}``; missing series/metrics become gaps."""
+        with self._lock:
+            if self.last_ts is not None and ts <= self.last_ts:
+                return  # the clock went backwards; keep each ring ordered
+            self.last_ts = ts
+            self.tiers[0].append(ts, samples)
+            for tier in self.tiers[1:]:
+                tier.accumulate(ts, samples)
+
+    def _tier_for(self, window: float) -> _Tier:
+        for tier in self.tiers:
+            if tier.span() >= window:
+                return tier
+        return self.tiers[-1]
+
+    def stats(self, series: str, metric: str, window: float, now: Optional[float] = None) -> Dict:
+        """min/max/mean/p50/p95 of ``metric`` over the last ``window`` seconds, from the finest tier covering it."""
+        with self._lock:
+            now = now if now is not None else (self.last_ts or 0.0)
+            tier = self._tier_for(window)
+            values = tier.values_since(series, metric, now - window)
+        if not values:
+            return {'samples': 0, 'resolution': tier.spec.resolution}
+        ordered = sorted(values)
+        return {
+            'samples': len(values),
+            'resolution': tier.spec.resolution,
+            'min': ordered[0],
+            'max': ordered[-1],
+            'mean': sum(values) / len(values),
+            'p50': _percentile(ordered, 50),
+            'p95': _percentile(ordered, 95),
+        }
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(tier.memory_bytes() for tier in self.tiers)
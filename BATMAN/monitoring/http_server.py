@@ -0,0 +1,109 @@
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import unquote, urlsplit
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.registry import CollectorRegistry
+
+from error.error_handler import NetworkError
+
+logger = logging.getLogger(__name__)
+
+JSON_CONTENT_TYPE = "application/json"
+
+
+@dataclass
+class HttpConfig:
+    """HTTP endpoint settings, read from ``monitoring.http`` in the config.
+
+    The endpoints are unauthenticated and list every node, so they bind to
+    loopback unless the operator sets ``host`` explicitly. Keys are checked by
+    the validator schema before this is built.
+    """
+    enabled: bool = True
+    host: str = "127.0.0.1"
+    port: int = 9101
+
+    @classmethod
+    def from_config(cls, monitoring: Dict) -> 'HttpConfig':
+        return cls(**monitoring.get('http', {}))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'HealthServer'
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip('/')
+        if path == '/metrics':
+            self._send(200, CONTENT_TYPE_LATEST, self.server.exposition())
+        elif path == '/health':
+            self._send(200, JSON_CONTENT_TYPE, self.server.monitor.get_mesh_health_json().encode())
+        elif path.startswith('/health/'):
+            health = self.server.monitor.get_node_health(unquote(path[len('/health/'):]))
+            status = 404 if health['status'] == 'unknown' else 200
+            self._send(status, JSON_CONTENT_TYPE, json.dumps(health).encode())
+        else:
+            self._send(404, JSON_CONTENT_TYPE, b'{"error": "not found"}')
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class HealthServer(ThreadingHTTPServer):
+    """Serves ``/metrics``, ``/health`` and ``/health/<node_id>`` from a daemon thread.
+
+    ``/health`` is the monitor's pre-serialised snapshot. The Prometheus
+    exposition is rendered at most once per monitoring cycle (when the
+    snapshot version changes) and reused by every scrape until the next
+    one, so scraping costs the same however many nodes the mesh has.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, monitor, config: HttpConfig, registry: CollectorRegistry = REGISTRY):
+        try:
+            super().__init__((config.host, config.port), _Handler)
+        except OSError as e:
+            raise NetworkError(f"Cannot listen on {config.host}:{config.port}: {str(e)}",
+                               error_code="http_bind")
+        self.monitor = monitor
+        self.config = config
+        self.registry = registry
+        self.thread: Optional[threading.Thread] = None
+        self._render_lock = threading.Lock()
+        self._exposition = b""
+        self._exposition_version: Optional[int] = None
+
+    def exposition(self) -> bytes:
+        version = self.monitor.snapshot.version
+        if self._exposition_version != version:
+            with self._render_lock:
+                # Concurrent scrapes wait for one render instead of each doing their own
+                if self._exposition_version != version:
+                    self._exposition = generate_latest(self.registry)
+                    self._exposition_version = version
+        return self._exposition
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="batman-http")
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f"HTTP endpoint listening on {self.config.host}:{self.server_address[1]}")
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread:
+            self.thread.join(timeout=5)
+        logger.info("HTTP endpoint stopped")
@@ -1,3 +1,4 @@
+import math
 import time
 import logging
 from typing import Dict, List, Optional
@@ -7,6 +8,23 @@ from prometheus_client import Gauge, Counter, Histogram
 import threading
 from dataclasses import dataclass
 from datetime import datetime
+from monitoring.prober import ProbeConfig, ProbeEngine, ProbeResult
+from monitoring.originators import Originator, OriginatorCollector
+from monitoring.history import MetricHistory, NODE_METRICS
+from monitoring.health import HealthSnapshot, HealthState
+
+# History series holding mesh-wide values next to the per-node ones
+MESH_SERIES = "__mesh__"
+DEFAULT_TREND_WINDOWS = (300, 3600)
+DEFAULT_TREND_REFRESH = 60
+
+
+def _window_name(seconds: float) -> str:
+    if seconds % 3600 == 0:
+        return f"{int(seconds // 3600)}h"
+    if seconds % 60 == 0:
+        return f"{int(seconds // 60)}m"
+    return f"{int(seconds)}s"
 
 logger = logging.getLogger(__name__)
 
@@ -15,11 +33,13 @@ class NodeMetrics:
     """Metrics for a single mesh node."""
     node_id: str
     latency: float
-    bandwidth: float
+    bandwidth: Optional[float]  # batman-adv throughput (B.A.T.M.A.N. V), None without a source
     packet_loss: float
-    signal_strength: float
+    signal_strength: Optional[float]  # None until a radio source is wired in
     last_seen: datetime
     status: str
+    link_quality: Optional[float] = None  # batman-adv TQ / 255 (B.A.T.M.A.N. IV)
+    next_hop: Optional[str] = None
 
 class MeshMonitor:
     """Monitors mesh network health and performance."""
@@ -29,13 +49,33 @@ class MeshMonitor:
         self.metrics: Dict[str, NodeMetrics] = {}
         self.running = False
         self.monitor_thread: Optional[threading.Thread] = None
+        self.probe_config = ProbeConfig.from_config(config['monitoring'])
+        self.prober = ProbeEngine(self.probe_config)
+        # One originator table read per cycle supplies link data for every node
+        self.originators: Optional[OriginatorCollector] = None
+        if config['mesh'].get('protocol') == 'batman-adv':
+            self.originators = OriginatorCollector(**config['mesh'].get('batman', {}))
+        history = config['monitoring'].get('history', {})
+        self.trend_windows = history.get('trend_windows', DEFAULT_TREND_WINDOWS)
+        self.history = MetricHistory(
+            config['monitoring']['interval'],
+            retention=history.get('retention', MetricHistory.DEFAULT_RETENTION),
+            tiers=[(tier['resolution'], tier['retention'])
+                   for tier in history.get('tiers', [])] or MetricHistory.DEFAULT_TIERS,
+        )
+        # Node trends are recomputed round-robin so each is at most trend_refresh seconds old
+        self.trend_refresh = history.get('trend_refresh', DEFAULT_TREND_REFRESH)
+        self._trends: Dict[str, Dict] = {}
+        self._trend_cursor = 0
+        self.health = HealthState()
+        self.snapshot: HealthSnapshot = self.health.publish(len(config['mesh']['nodes']), self._mesh_summary())
         
         # Prometheus metrics
         self.node_latency = Gauge('mesh_node_latency_seconds', 
                                 'Latency to mesh node in seconds',
                                 ['node_id'])
         self.node_bandwidth = Gauge('mesh_node_bandwidth_bytes',
-                                  'Available bandwidth to node in bytes',
+                                  'batman-adv throughput to node in bytes per second',
                                   ['node_id'])
         self.node_packet_loss = Gauge('mesh_node_packet_loss_ratio',
                                     'Packet loss ratio to node',
@@ -46,6 +86,12 @@ class MeshMonitor:
         self.node_status = Gauge('mesh_node_status',
                                'Node status (1=up, 0=down)',
                                ['node_id'])
+        self.node_link_quality = Gauge('mesh_node_link_quality_ratio',
+                                     'batman-adv transmit quality (TQ) to node, 0-1',
+                                     ['node_id'])
+        self.route_changes = Counter('mesh_route_changes_total',
+                                   'Originators added, removed or switching next hop',
+                                   ['change'])
         self.mesh_errors = Counter('mesh_errors_total',
                                  'Total number of mesh network errors',
                                  ['error_type'])
@@ -74,82 +120,205 @@ class MeshMonitor:
 
     def _monitor_loop(self):
         """Main monitoring loop."""
-        while self.running:
-            try:
-                self._update_metrics()
-                time.sleep(self.config['monitoring']['interval'])
-            except Exception as e:
-                logger.error(f"Error in monitor loop: {str(e)}")
-                self.mesh_errors.labels(error_type='monitor_loop').inc()
-                time.sleep(5)  # Back off on error
+        interval = self.config['monitoring']['interval']
+        self.prober.check_capacity(len(self.config['mesh']['nodes']))
+        try:
+            while self.running:
+                started = time.monotonic()
+                try:
+                    self._update_metrics()
+                    # Keep a fixed cadence: the cycle's own duration counts against the interval
+                    time.sleep(max(0.0, interval - (time.monotonic() - started)))
+                except Exception as e:
+                    logger.error(f"Error in monitor loop: {str(e)}")
+                    self.mesh_errors.labels(error_type='monitor_loop').inc()
+                    time.sleep(5)  # Back off on error
+        finally:
+            self.prober.close()
 
     def _update_metrics(self):
-        """Update metrics for all nodes."""
+        """Probe every node at once and update its metrics."""
         with self.mesh_operations.labels(operation='update_metrics').time():
-            for node in self.config['mesh']['nodes']:
+            nodes = self.config['mesh']['nodes']
+            overruns = self.prober.overruns
+            link_source = self.originators.collect if self.originators else None
+            with self.mesh_operations.labels(operation='probe_cycle').time():
+                results, originators = self.prober.run_cycle(nodes, link_source)
+            if self.prober.overruns > overruns:
+                self.mesh_errors.labels(error_type='probe_cycle_budget').inc()
+
+            addresses = {}
+            if self.originators is not None:
+                if originators is None:
+                    self.mesh_errors.labels(error_type='originators').inc()
+                    originators = {}
+                else:
+                    self._record_route_changes()
+                addresses = self.originators.node_addresses(nodes)
+            else:
+                originators = {}
+            updated = set()
+            for node in nodes:
+                if results[node['id']].inconclusive:
+                    # Budget ran out before this node could answer or time out: keep its last metrics
+                    self.mesh_errors.labels(error_type='probe_skipped').inc()
+                    continue
                 try:
-                    metrics = self._collect_node_metrics(node)
+                    originator = originators.get(addresses.get(node['id']))
+                    metrics = self._collect_node_metrics(node, results[node['id']], originator)
                     self._update_prometheus_metrics(metrics)
                     self.metrics[node['id']] = metrics
+                    updated.add(node['id'])
                 except Exception as e:
                     logger.error(f"Failed to update metrics for node {node['id']}: {str(e)}")
                     self.mesh_errors.labels(error_type='node_metrics').inc()
+            self._record_history(nodes, results)
+            self._publish_health(nodes, updated)
+
+    def _publish_health(self, nodes: List[Dict], updated: set):
+        """Refresh the health entries that changed this cycle and publish a new snapshot."""
+        refresh = self._trend_batch(nodes)
+        for node in nodes:
+            node_id = node['id']
+            if node_id not in self.metrics:
+                continue
+            if node_id in refresh or node_id not in self._trends:
+                self._trends[node_id] = self._trend(node_id)
+            elif node_id not in updated:
+                continue
+            self.health.update(node_id, self._node_entry(node_id))
+        self.snapshot = self.health.publish(len(nodes), self._mesh_summary())
+
+    def _trend_batch(self, nodes: List[Dict]) -> set:
+        """Ids of the nodes whose turn it is to have their trend recomputed."""
+        if not nodes:
+            return set()
+        interval = self.config['monitoring']['interval']
+        count = min(len(nodes), max(1, math.ceil(len(nodes) * interval / self.trend_refresh)))
+        start = self._trend_cursor % len(nodes)
+        self._trend_cursor = start + count
+        return {nodes[(start + i) % len(nodes)]['id'] for i in range(count)}
+
+    def _mesh_summary(self) -> Dict:
+        return {
+            'trend': self._trend(MESH_SERIES),
+            'history_bytes': self.history.memory_bytes(),
+        }
+
+    def _record_history(self, nodes: List[Dict], results: Dict[str, ProbeResult]):
+        """Append this cycle's values; nodes skipped this cycle leave a gap."""
+        samples = {}
+        latencies = []
+        for node in nodes:
+            metrics = self.metrics.get(node['id'])
+            if metrics is None or results[node['id']].inconclusive:
+                continue
+            up = metrics.status == 'up'
+            samples[node['id']] = {
+                'latency': metrics.latency if results[node['id']].received else None,
+                'packet_loss': metrics.packet_loss,
+                'bandwidth': metrics.bandwidth,
+                'link_quality': metrics.link_quality,
+                'up': 1.0 if up else 0.0,
+            }
+            if up and results[node['id']].received:
+                latencies.append(metrics.latency)
+        samples[MESH_SERIES] = {
+            'up': sum(s['up'] for s in samples.values()) / len(nodes) if nodes else None,
+            'latency': sum(latencies) / len(latencies) if latencies else None,
+        }
+        self.history.record(time.time(), samples)
+
+    def get_node_history(self, node_id: str, metric: str, window: float) -> Dict:
+        """min/max/mean/p50/p95 of one node metric over the last ``window`` seconds."""
+        if metric not in NODE_METRICS:
+            raise ValueError(f"Unknown metric '{metric}' (expected one of {', '.join(NODE_METRICS)})")
+        return self.history.stats(node_id, metric, window)
+
+    def _trend(self, series: str) -> Dict:
+        trend = {}
+        for window in self.trend_windows:
+            latency = self.history.stats(series, 'latency', window)
+            up = self.history.stats(series, 'up', window)
+            entry = {
+                'availability': up.get('mean'),
+                'latency_mean': latency.get('mean'),
+                'latency_p95': latency.get('p95'),
+                'samples': up['samples'],
+            }
+            if series != MESH_SERIES:
+                entry['packet_loss_mean'] = self.history.stats(series, 'packet_loss', window).get('mean')
+            trend[_window_name(window)] = entry
+        return trend
 
-    def _collect_node_metrics(self, node: Dict) -> NodeMetrics:
-        """Collect metrics for a single node."""
+    def _record_route_changes(self):
+        for change in self.originators.changes:
+            self.route_changes.labels(change=change.kind).inc()
+            if change.kind == 'next_hop':
+                logger.info(f"Route to {change.address} moved from {change.previous.next_hop} "
+                            f"to {change.current.next_hop}")
+            else:
+                logger.info(f"Originator {change.address} {change.kind}")
+
+    def _collect_node_metrics(self, node: Dict, probe: ProbeResult,
+                              originator: Optional[Originator] = None) -> NodeMetrics:
+        """Build a node's metrics from this cycle's probe result and its originator entry."""
         try:
-            # Simulate metric collection - replace with actual implementation
-            latency = self._measure_latency(node['ip'])
-            bandwidth = self._measure_bandwidth(node['ip'])
-            packet_loss = self._measure_packet_loss(node['ip'])
-            signal_strength = self._measure_signal_strength(node['ip'])
-            
+            if probe.error:
+                self.mesh_errors.labels(error_type='probe').inc()
+            answered = probe.received > 0
+            # A node batman-adv heard from recently is up even if it does not answer echoes
+            heard = originator is not None and \
+                originator.last_seen <= 3 * self.config['monitoring']['interval']
+            previous = self.metrics.get(node['id'])
+            if answered:
+                last_seen = datetime.now()
+            elif originator is not None:
+                last_seen = datetime.fromtimestamp(time.time() - originator.last_seen)
+            else:
+                last_seen = previous.last_seen if previous else datetime.now()
+
             return NodeMetrics(
                 node_id=node['id'],
-                latency=latency,
-                bandwidth=bandwidth,
-                packet_loss=packet_loss,
-                signal_strength=signal_strength,
-                last_seen=datetime.now(),
-                status='up' if latency < 1.0 else 'down'
+                # Nodes not answering echoes report the probe timeout rather than a missing value
+                latency=probe.latency if answered else self.probe_config.timeout,
+                bandwidth=originator.bandwidth if originator is not None else None,
+                packet_loss=probe.packet_loss,
+                signal_strength=None,
+                last_seen=last_seen,
+                status='up' if answered or heard else 'down',
+                link_quality=originator.link_quality if originator is not None else None,
+                next_hop=originator.next_hop if originator is not None else None
             )
         except Exception as e:
             logger.error(f"Failed to collect metrics for node {node['id']}: {str(e)}")
             raise
 
     def _update_prometheus_metrics(self, metrics: NodeMetrics):
-        """Update Prometheus metrics for a node."""
+        """Update Prometheus metrics for a node.
+
+        Metrics without a real source for this node (bandwidth under
+        B.A.T.M.A.N. IV, signal strength, TQ under B.A.T.M.A.N. V) have their
+        sample removed rather than exported as a made-up value.
+        """
         self.node_latency.labels(node_id=metrics.node_id).set(metrics.latency)
-        self.node_bandwidth.labels(node_id=metrics.node_id).set(metrics.bandwidth)
         self.node_packet_loss.labels(node_id=metrics.node_id).set(metrics.packet_loss)
-        self.node_signal.labels(node_id=metrics.node_id).set(metrics.signal_strength)
         self.node_status.labels(node_id=metrics.node_id).set(1 if metrics.status == 'up' else 0)
+        self._set_optional(self.node_bandwidth, metrics.node_id, metrics.bandwidth)
+        self._set_optional(self.node_signal, metrics.node_id, metrics.signal_strength)
+        self._set_optional(self.node_link_quality, metrics.node_id, metrics.link_quality)
 
-    def _measure_latency(self, ip: str) -> float:
-        """Measure latency to a node."""
-        # Implement actual latency measurement
-        return 0.1  # Placeholder
-
-    def _measure_bandwidth(self, ip: str) -> float:
-        """Measure available bandwidth to a node."""
-        # Implement actual bandwidth measurement
-        return 1000000  # Placeholder
-
-    def _measure_packet_loss(self, ip: str) -> float:
-        """Measure packet loss to a node."""
-        # Implement actual packet loss measurement
-        return 0.0  # Placeholder
-
-    def _measure_signal_strength(self, ip: str) -> float:
-        """Measure signal strength to a node."""
-        # Implement actual signal strength measurement
-        return -60  # Placeholder
+    @staticmethod
+    def _set_optional(gauge: Gauge, node_id: str, value: Optional[float]):
+        if value is not None:
+            gauge.labels(node_id=node_id).set(value)
+            return
+        try:
+            gauge.remove(node_id)
+        except KeyError:
+            pass
 
-    def get_node_health(self, node_id: str) -> Dict:
-        """Get health status for a specific node."""
-        if node_id not in self.metrics:
-            return {'status': 'unknown', 'last_seen': None}
-        
+    def _node_entry(self, node_id: str) -> Dict:
         metrics = self.metrics[node_id]
         return {
             'status': metrics.status,
@@ -157,18 +326,24 @@ class MeshMonitor:
             'latency': metrics.latency,
             'bandwidth': metrics.bandwidth,
             'packet_loss': metrics.packet_loss,
-            'signal_strength': metrics.signal_strength
+            'signal_strength': metrics.signal_strength,
+            'link_quality': metrics.link_quality,
+            'next_hop': metrics.next_hop,
+            'trend': self._trends.get(node_id, {})
         }
 
+    def get_node_health(self, node_id: str) -> Dict:
+        """Get health status for a specific node, as of the last completed cycle."""
+        return self.snapshot.health['nodes'].get(node_id, {'status': 'unknown', 'last_seen': None})
+
     def get_mesh_health(self) -> Dict:
-        """Get overall mesh network health."""
-        total_nodes = len(self.config['mesh']['nodes'])
-        up_nodes = sum(1 for m in self.metrics.values() if m.status == 'up')
-        
-        return {
-            'total_nodes': total_nodes,
-            'up_nodes': up_nodes,
-            'health_ratio': up_nodes / total_nodes if total_nodes > 0 else 0,
-            'nodes': {node_id: self.get_node_health(node_id) 
-                     for node_id in self.metrics}
-        } 
\ No newline at end of file
+        """Get overall mesh network health, as of the last completed cycle.
+
+        Returns the published snapshot itself rather than a copy: callers
+        must not modify it.
+        """
+        return self.snapshot.health
+
+    def get_mesh_health_json(self) -> str:
+        """``get_mesh_health()`` already serialised to JSON."""
+        return self.snapshot.json
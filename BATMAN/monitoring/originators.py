@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from error.error_handler import NetworkError
+
+logger = logging.getLogger(__name__)
+
+MAC = r"[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5}"
+
+# " * 02:ba:de:af:fe:02    0.930s   (255) 02:ba:de:af:fe:01 [      mesh0]"  (B.A.T.M.A.N. IV: TQ)
+# "   02:ba:de:af:fe:02    0.090s (       10.0) 02:ba:de:af:fe:01 [  mesh0]" (B.A.T.M.A.N. V: Mbit/s)
+_ORIGINATOR_RE = re.compile(
+    rf"^\s*(?P<best>\*)?\s*(?P<originator>{MAC})\s+(?P<last_seen>\d+(?:\.\d+)?)s\s+"
+    rf"\(\s*(?P<metric>\d+(?:\.\d+)?)\)\s+(?P<next_hop>{MAC})\s+\[\s*(?P<interface>[^\]]*?)\s*\]"
+)
+_ARP_RE = re.compile(rf"^(?P<ip>\d+\.\d+\.\d+\.\d+)\s+\S+\s+(?P<flags>0x[0-9a-f]+)\s+(?P<mac>{MAC})\s+\S+\s+(?P<device>\S+)")
+
+TQ_MAX = 255
+
+
+@dataclass(frozen=True)
+class Originator:
+    """Best route to one mesh originator, as batman-adv sees it."""
+    address: str
+    last_seen: float                  # seconds since its last OGM
+    next_hop: str
+    interface: str
+    tq: Optional[int] = None          # B.A.T.M.A.N. IV link quality, 0-255
+    throughput: Optional[float] = None  # B.A.T.M.A.N. V estimate, Mbit/s
+
+    @property
+    def link_quality(self) -> Optional[float]:
+        return self.tq / TQ_MAX if self.tq is not None else None
+
+    @property
+    def bandwidth(self) -> Optional[float]:
+        """Throughput estimate in bytes per second (B.A.T.M.A.N. V only)."""
+        return self.throughput * 1e6 / 8 if self.throughput is not None else None
+
+
+@dataclass(frozen=True)
+class RouteChange:
+    """Difference for one originator between two snapshots."""
+    address: str
+    kind: str                          # added | removed | next_hop
+    previous: Optional[Originator]
+    current: Optional[Originator]
+
+
+def parse_originators(text: str) -> Dict[str, Originator]:
+    """Best route per originator from ``batctl o`` output or the debugfs ``originators`` file.
+
+    Header lines are ignored. When no line of an originator is marked best
+    (``*``), the one with the highest metric is kept.
+    """
+    best: Dict[str, Originator] = {}
+    marked = set()
+    for line in text.splitlines():
+        match = _ORIGINATOR_RE.match(line)
+        if not match:
+            continue
+        metric = match['metric']
+        originator = Originator(
+            address=match['originator'].lower(),
+            last_seen=float(match['last_seen']),
+            next_hop=match['next_hop'].lower(),
+            interface=match['interface'],
+            tq=int(metric) if "." not in metric else None,
+            throughput=float(metric) if "." in metric else None,
+        )
+        address = originator.address
+        if match['best']:
+            best[address] = originator
+            marked.add(address)
+        elif address not in marked:
+            current = best.get(address)
+            if current is None or _metric(originator) > _metric(current):
+                best[address] = originator
+    return best
+
+
+def _metric(originator: Originator) -> float:
+    return originator.tq if originator.tq is not None else (originator.throughput or 0.0)
+
+
+def parse_arp_table(text: str, device: Optional[str] = None) -> Dict[str, str]:
+    """IP -> MAC of complete entries in ``/proc/net/arp``, optionally for one device."""
+    table = {}
+    for line in text.splitlines():
+        match = _ARP_RE.match(line)
+        if not match or match['flags'] == "0x0":
+            continue
+        if device and match['device'] != device:
+            continue
+        table[match['ip']] = match['mac'].lower()
+    return table
+
+
+def diff_originators(previous: Dict[str, Originator], current: Dict[str, Originator]) -> List[RouteChange]:
+    """Originators that appeared, disappeared or switched next hop between two snapshots."""
+    changes = []
+    for address, originator in current.items():
+        before = previous.get(address)
+        if before is None:
+            changes.append(RouteChange(address, 'added', None, originator))
+        elif before.next_hop != originator.next_hop:
+            changes.append(RouteChange(address, 'next_hop', before, originator))
+    for address, before in previous.items():
+        if address not in current:
+            changes.append(RouteChange(address, 'removed', before, None))
+    return changes
+
+
+class OriginatorCollector:
+    """Reads the whole batman-adv originator table once per cycle.
+
+    One ``batctl meshif <iface> originators -H`` call (batctl talks netlink
+    to the kernel) returns every originator with its last-seen time, next
+    hop and TQ or throughput, instead of one measurement per node. Falls
+    back to the debugfs ``originators`` file when batctl is missing.
+
+    Configured nodes are matched to originators by their ``mac`` or, failing
+    that, through the ARP table of the mesh interface.
+    """
+
+    def __init__(self, interface: str = "bat0", batctl: str = "batctl",
+                 debugfs: str = "/sys/kernel/debug/batman_adv", arp_table: str = "/proc/net/arp",
+                 timeout: float = 2.0):
+        self.interface = interface
+        self.batctl = batctl
+        self.debugfs = Path(debugfs) / interface / "originators"
+        self.arp_table = Path(arp_table)
+        self.timeout = timeout
+        self.originators: Dict[str, Originator] = {}
+        self.changes: List[RouteChange] = []
+
+    async def _read_batctl(self) -> str:
+        process = await asyncio.create_subprocess_exec(
+            self.batctl, "meshif", self.interface, "originators", "-H",
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise NetworkError(f"batctl timed out after {self.timeout}s", error_code="batctl_timeout")
+        if process.returncode != 0:
+            raise NetworkError(f"batctl failed: {stderr.decode(errors='replace').strip()}",
+                               error_code="batctl_failed")
+        return stdout.decode(errors='replace')
+
+    async def read(self) -> str:
+        try:
+            return await self._read_batctl()
+        except FileNotFoundError:
+            if self.debugfs.exists():
+                return self.debugfs.read_text()
+            raise NetworkError(f"Neither {self.batctl} nor {self.debugfs} is available",
+                               error_code="no_originator_source")
+
+    async def collect(self) -> Dict[str, Originator]:
+        """Fetch a fresh snapshot; ``changes`` then holds its diff against the previous one."""
+        current = parse_originators(await self.read())
+        self.changes = diff_originators(self.originators, current)
+        self.originators = current
+        return current
+
+    def node_addresses(self, nodes: List[Dict]) -> Dict[str, str]:
+        """node id -> originator MAC, from the node's ``mac`` or the mesh interface's ARP entries."""
+        addresses = {node['id']: node['mac'].lower() for node in nodes if node.get('mac')}
+        if len(addresses) < len(nodes):
+            try:
+                arp = parse_arp_table(self.arp_table.read_text(), self.interface)
+            except OSError:
+                arp = {}
+            for node in nodes:
+                if node['id'] not in addresses and node['ip'] in arp:
+                    addresses[node['id']] = arp[node['ip']]
+        return addresses
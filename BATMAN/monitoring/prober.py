@@ -0,0 +1,324 @@
+import asyncio
+import itertools
+from abc import ABC, abstractmethod
+import logging
+import os
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from error.error_handler import NetworkError
+
+logger = logging.getLogger(__name__)
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+UDP_MAGIC = b"BATP"
+
+
+@dataclass
+class ProbeConfig:
+    """Probe settings, read from ``monitoring.probe`` in the config."""
+    method: str = "icmp"          # icmp | udp
+    count: int = 3                # echo requests per node per cycle
+    spacing: float = 0.05         # seconds between a node's requests
+    timeout: float = 1.0          # seconds to wait for each reply
+    concurrency: int = 64         # nodes probed at once
+    udp_port: int = 7
+    cycle_budget: Optional[float] = None  # seconds; defaults to 80% of monitoring.interval
+
+    @classmethod
+    def from_config(cls, monitoring: Dict) -> 'ProbeConfig':
+        probe = dict(monitoring.get('probe', {}))
+        config = cls(**probe)
+        if config.cycle_budget is None:
+            config.cycle_budget = 0.8 * monitoring['interval']
+        return config
+
+    @property
+    def node_duration(self) -> float:
+        """Longest time probing one node can take."""
+        return (self.count - 1) * self.spacing + self.timeout
+
+
+@dataclass
+class ProbeResult:
+    """Echo round trips to one node during one cycle."""
+    node_id: str
+    ip: str
+    sent: int = 0
+    rtts: List[float] = field(default_factory=list)
+    error: Optional[str] = None
+    truncated: bool = False   # the cycle budget ran out before this node finished
+
+    @property
+    def inconclusive(self) -> bool:
+        """No reply, but the node never got its full timeout either: nothing is known this cycle."""
+        return self.truncated and not self.rtts
+
+    @property
+    def received(self) -> int:
+        return len(self.rtts)
+
+    @property
+    def latency(self) -> Optional[float]:
+        return sum(self.rtts) / len(self.rtts) if self.rtts else None
+
+    @property
+    def packet_loss(self) -> float:
+        return 1.0 - self.received / self.sent if self.sent else 1.0
+
+
+class EchoSocket(ABC):
+    """One non-blocking socket shared by every probe in flight.
+
+    Requests carry a sequence number; replies are matched back to their
+    waiter by (source address, sequence), so probing hundreds of nodes
+    costs one file descriptor and no subprocesses.
+    """
+
+    def __init__(self):
+        self.sock: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._seq = itertools.count(1)
+
+    @abstractmethod
+    def _create_socket(self) -> socket.socket:
+        """A new socket of this echo method; made non-blocking by ``open``."""
+
+    @abstractmethod
+    def _packet(self, seq: int) -> bytes:
+        """Echo request carrying ``seq``."""
+
+    @abstractmethod
+    def _parse(self, data: bytes) -> Optional[int]:
+        """Sequence number of a reply addressed to us, or None."""
+
+    def _address(self, ip: str) -> Tuple[str, int]:
+        return (ip, 0)
+
+    def open(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self.sock = self._create_socket()
+        self.sock.setblocking(False)
+        loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    def close(self):
+        if self.sock is not None:
+            self._loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+        for waiter in self._waiters.values():
+            waiter.cancel()
+        self._waiters.clear()
+
+    def _on_readable(self):
+        now = time.perf_counter()
+        while True:
+            try:
+                data, address = self.sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # ICMP errors (e.g. port unreachable) surface here on UDP sockets
+                logger.debug(f"Echo socket receive error: {str(e)}")
+                return
+            seq = self._parse(data)
+            if seq is None:
+                continue
+            waiter = self._waiters.pop((address[0], seq), None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(now)
+
+    async def ping(self, ip: str, timeout: float) -> Optional[float]:
+        """Round-trip time of one echo to ``ip`` in seconds, or None if no reply came in time."""
+        seq = next(self._seq) & 0xFFFF
+        waiter = self._loop.create_future()
+        self._waiters[(ip, seq)] = waiter
+        sent_at = time.perf_counter()
+        try:
+            self.sock.sendto(self._packet(seq), self._address(ip))
+            received_at = await asyncio.wait_for(waiter, timeout)
+            return received_at - sent_at
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._waiters.pop((ip, seq), None)
+
+
+class UdpEchoSocket(EchoSocket):
+    """Echo over UDP to an echo responder (RFC 862) on every node."""
+
+    def __init__(self, port: int = 7):
+        super().__init__()
+        self.port = port
+
+    def _create_socket(self) -> socket.socket:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _address(self, ip: str) -> Tuple[str, int]:
+        return (ip, self.port)
+
+    def _packet(self, seq: int) -> bytes:
+        return UDP_MAGIC + struct.pack("!H", seq)
+
+    def _parse(self, data: bytes) -> Optional[int]:
+        if len(data) < 6 or not data.startswith(UDP_MAGIC):
+            return None
+        return struct.unpack_from("!H", data, 4)[0]
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class IcmpEchoSocket(EchoSocket):
+    """ICMP echo without spawning ping.
+
+    Uses an unprivileged ping socket when ``net.ipv4.ping_group_range``
+    allows it and a raw socket (CAP_NET_RAW, e.g. the privileged container)
+    otherwise.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.raw = False
+        self.ident = os.getpid() & 0xFFFF
+
+    def _create_socket(self) -> socket.socket:
+        try:
+            return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except OSError:
+            pass
+        try:
+            self.raw = True
+            return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        except OSError as e:
+            raise NetworkError(f"Cannot open an ICMP socket: {str(e)}", error_code="icmp_socket")
+
+    def _packet(self, seq: int) -> bytes:
+        payload = UDP_MAGIC
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, self.ident, seq)
+        checksum = _checksum(header + payload)
+        return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, self.ident, seq) + payload
+
+    def _parse(self, data: bytes) -> Optional[int]:
+        if self.raw:
+            data = data[(data[0] & 0x0F) * 4:]  # raw sockets include the IP header
+        if len(data) < 8:
+            return None
+        kind, _, _, ident, seq = struct.unpack_from("!BBHHH", data)
+        # Ping sockets rewrite the identifier, and the kernel only delivers our replies to them
+        if kind != ICMP_ECHO_REPLY or (self.raw and ident != self.ident):
+            return None
+        return seq
+
+
+# Coroutine run once per cycle alongside the probes, e.g. OriginatorCollector.collect
+LinkSource = Callable[[], Awaitable[Any]]
+
+
+class ProbeEngine:
+    """Probes every mesh node concurrently, within a fixed budget per cycle.
+
+    At most ``concurrency`` nodes are probed at once. Each node gets
+    ``count`` echo requests ``spacing`` seconds apart, each allowed
+    ``timeout`` seconds. Nodes still unfinished when ``cycle_budget``
+    runs out are reported with what they answered so far, so a cycle never
+    outlasts its budget however many nodes are slow or dead.
+    """
+
+    def __init__(self, config: ProbeConfig):
+        self.config = config
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.echo: Optional[EchoSocket] = None
+        self.cycles = 0
+        self.overruns = 0
+
+    def open(self):
+        """Create the event loop and echo socket; call from the thread that runs cycles."""
+        self.loop = asyncio.new_event_loop()
+        echo = IcmpEchoSocket() if self.config.method == "icmp" else UdpEchoSocket(self.config.udp_port)
+        try:
+            echo.open(self.loop)
+        except NetworkError as e:
+            logger.warning(f"{e.message}; falling back to UDP echo on port {self.config.udp_port}")
+            echo = UdpEchoSocket(self.config.udp_port)
+            echo.open(self.loop)
+        self.echo = echo
+
+    def close(self):
+        if self.echo is not None:
+            self.echo.close()
+            self.echo = None
+        if self.loop is not None:
+            self.loop.close()
+            self.loop = None
+
+    def check_capacity(self, node_count: int):
+        """Warn when the budget cannot cover every node at the configured concurrency."""
+        waves = -(-node_count // self.config.concurrency)
+        needed = waves * self.config.node_duration
+        if needed > self.config.cycle_budget:
+            logger.warning(f"Probing {node_count} nodes may take {needed:.1f}s, over the "
+                           f"{self.config.cycle_budget:.1f}s cycle budget; raise monitoring.probe.concurrency")
+
+    async def _probe_node(self, node: Dict, result: ProbeResult, limit: asyncio.Semaphore):
+        async with limit:
+            async def one(delay: float):
+                await asyncio.sleep(delay)
+                result.sent += 1
+                rtt = await self.echo.ping(node['ip'], self.config.timeout)
+                if rtt is not None:
+                    result.rtts.append(rtt)
+
+            try:
+                await asyncio.gather(*(one(i * self.config.spacing) for i in range(self.config.count)))
+            except OSError as e:
+                result.error = str(e)
+
+    async def _cycle(self, nodes: List[Dict], link_source: Optional[LinkSource]):
+        limit = asyncio.Semaphore(self.config.concurrency)
+        results = {node['id']: ProbeResult(node['id'], node['ip']) for node in nodes}
+        tasks = [self.loop.create_task(self._probe_node(node, results[node['id']], limit)) for node in nodes]
+        link_task = self.loop.create_task(link_source()) if link_source else None
+        waiting = tasks + ([link_task] if link_task else [])
+
+        _, pending = await asyncio.wait(waiting, timeout=self.config.cycle_budget)
+        if pending:
+            self.overruns += 1
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for node, task in zip(nodes, tasks):
+                if task in pending:
+                    results[node['id']].error = "cycle budget exceeded"
+                    results[node['id']].truncated = True
+
+        links = None
+        if link_task is not None and not link_task.cancelled():
+            if link_task.exception() is not None:
+                logger.error(f"Link metrics collection failed: {str(link_task.exception())}")
+            else:
+                links = link_task.result()
+        return results, links
+
+    def run_cycle(self, nodes: List[Dict],
+                  link_source: Optional[LinkSource] = None) -> Tuple[Dict[str, ProbeResult], Any]:
+        """Probe ``nodes`` (``{'id', 'ip'}`` dicts) and, alongside, await ``link_source()``.
+
+        Returns per-node probe results and whatever ``link_source`` produced
+        (None if it failed or ran out of budget).
+        """
+        if self.loop is None:
+            self.open()
+        self.cycles += 1
+        return self.loop.run_until_complete(self._cycle(nodes, link_source))
@@ -0,0 +1,36 @@
+import pytest
+
+from monitoring.history import MetricHistory, NODE_METRICS
+
+
+def _cycle(nodes: int, value: float = 1.0):
+    return {f"node{i}": {metric: value for metric in NODE_METRICS} for i in range(nodes)}
+
+
+def test_default_tiers_fit_a_hundred_nodes_in_a_few_megabytes():
+    history = MetricHistory(1)
+    history.record(0.0, _cycle(100))
+    assert history.memory_bytes() <= 4 * 1000 * 1000
+
+
+def test_windows_past_the_raw_tier_read_downsampled_means():
+    history = MetricHistory(1)
+    for ts in range(1, 3601):
+        history.record(float(ts), {'node': {'latency': float(ts % 2)}})
+
+    recent = history.stats('node', 'latency', 300)
+    assert recent['resolution'] == 1 and recent['samples'] == 300
+    assert (recent['min'], recent['max']) == (0.0, 1.0)
+    hourly = history.stats('node', 'latency', 3600)
+    assert hourly['resolution'] == 10 and hourly['mean'] == pytest.approx(0.5, abs=1e-3)
+
+
+def test_gaps_are_skipped_and_old_timestamps_ignored():
+    history = MetricHistory(1)
+    history.record(1.0, {'a': {'up': 1.0}})
+    history.record(2.0, {'a': {'up': None}, 'b': {'up': 0.0}})
+    history.record(2.0, {'a': {'up': 0.0}})   # not after the last cycle
+
+    assert history.stats('a', 'up', 60)['samples'] == 1
+    assert history.stats('b', 'up', 60)['samples'] == 1
+    assert history.stats('c', 'up', 60)['samples'] == 0
@@ -0,0 +1,90 @@
+import json
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import CollectorRegistry, Counter
+
+from config.validator import ConfigValidationError, ConfigValidator
+from error.error_handler import NetworkError
+from monitoring.http_server import HealthServer, HttpConfig
+
+CONFIG = {
+    'network': {'interface': 'bat0', 'ip_range': '10.0.0.0/24', 'port': 4305},
+    'mesh': {'protocol': 'batman-adv', 'nodes': [{'id': 'a', 'ip': '10.0.0.1'}, {'id': 'b', 'ip': '10.0.0.2'}]},
+    'monitoring': {'enabled': True, 'interval': 5},
+}
+
+
+class _Monitor:
+    def __init__(self):
+        self.snapshot = SimpleNamespace(version=1)
+
+    def get_mesh_health_json(self) -> str:
+        return '{"status": "healthy"}'
+
+    def get_node_health(self, node_id: str):
+        return {'status': 'up'} if node_id == 'a' else {'status': 'unknown'}
+
+
+@pytest.fixture
+def server():
+    registry = CollectorRegistry()
+    scrapes = Counter('test_renders', 'Exposition renders', registry=registry)
+    server = HealthServer(_Monitor(), HttpConfig(port=0), registry=registry)
+    server.start()
+    yield server, scrapes
+    server.stop()
+
+
+def _get(server: HealthServer, path: str):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _validator(http: dict) -> ConfigValidator:
+    validator = ConfigValidator("unused.yml")
+    validator.config = {**CONFIG, 'monitoring': {**CONFIG['monitoring'], 'http': http}}
+    return validator
+
+
+def test_schema_rejects_unknown_http_key():
+    assert _validator({'enabled': True, 'port': 9101}).validate()
+    with pytest.raises(ConfigValidationError):
+        _validator({'enabled': True, 'prot': 9101}).validate()
+
+
+def test_defaults_to_loopback():
+    config = HttpConfig.from_config({})
+    assert config.host == "127.0.0.1"
+    assert HttpConfig.from_config({'http': {'host': '0.0.0.0'}}).host == "0.0.0.0"
+
+
+def test_port_in_use_raises_network_error(server):
+    taken = server[0].server_address[1]
+    with pytest.raises(NetworkError) as raised:
+        HealthServer(_Monitor(), HttpConfig(port=taken))
+    assert raised.value.error_code == "http_bind"
+
+
+def test_serves_health_and_known_nodes(server):
+    server, _ = server
+    assert _get(server, '/health') == (200, b'{"status": "healthy"}')
+    status, body = _get(server, '/health/a')
+    assert status == 200 and json.loads(body) == {'status': 'up'}
+    assert _get(server, '/health/missing')[0] == 404
+    assert _get(server, '/nope')[0] == 404
+
+
+def test_exposition_is_rendered_once_per_snapshot(server):
+    server, renders = server
+    first = _get(server, '/metrics')[1]
+    renders.inc()
+    assert _get(server, '/metrics')[1] == first
+    server.monitor.snapshot.version += 1
+    assert _get(server, '/metrics')[1] != first
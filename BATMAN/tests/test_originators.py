@@ -0,0 +1,112 @@
+from pathlib import Path
+
+from monitoring.originators import (OriginatorCollector, RouteChange, diff_originators,
+                                    parse_arp_table, parse_originators)
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def fixture(name: str) -> str:
+    return (FIXTURES / name).read_text()
+
+
+def test_batman_iv_keeps_marked_best_route():
+    originators = parse_originators(fixture("batctl_originators_iv.txt"))
+
+    assert sorted(originators) == ["02:ba:de:af:fe:02", "02:ba:de:af:fe:03", "02:ba:de:af:fe:04"]
+    best = originators["02:ba:de:af:fe:02"]
+    assert best.next_hop == "02:ba:de:af:fe:02"
+    assert best.tq == 255 and best.throughput is None
+    assert best.link_quality == 1.0
+    assert best.bandwidth is None
+    # The unmarked row comes first but the '*' row is the best route
+    assert originators["02:ba:de:af:fe:03"].tq == 231
+    assert originators["02:ba:de:af:fe:03"].next_hop == "02:ba:de:af:fe:03"
+
+
+def test_batman_iv_normalises_addresses_and_reads_last_seen():
+    originator = parse_originators(fixture("batctl_originators_iv.txt"))["02:ba:de:af:fe:04"]
+
+    assert originator.last_seen == 12.05
+    assert originator.interface == "mesh0"
+    assert originator.tq == 37
+
+
+def test_batman_v_reports_throughput_not_tq():
+    originators = parse_originators(fixture("batctl_originators_v.txt"))
+
+    best = originators["02:ba:de:af:fe:02"]
+    assert best.tq is None and best.link_quality is None
+    assert best.throughput == 54.0
+    assert best.bandwidth == 54.0 * 1e6 / 8
+
+
+def test_unmarked_originator_keeps_highest_metric():
+    originators = parse_originators(fixture("batctl_originators_v.txt"))
+
+    # No '*' on either row for :03, so the higher throughput wins
+    assert originators["02:ba:de:af:fe:03"].throughput == 18.2
+    assert originators["02:ba:de:af:fe:03"].next_hop == "02:ba:de:af:fe:03"
+
+
+def test_debugfs_table_ignores_potential_next_hops():
+    originators = parse_originators(fixture("debugfs_originators.txt"))
+
+    assert sorted(originators) == ["02:ba:de:af:fe:02", "02:ba:de:af:fe:03"]
+    assert originators["02:ba:de:af:fe:03"].tq == 214
+    assert originators["02:ba:de:af:fe:03"].next_hop == "02:ba:de:af:fe:02"
+
+
+def test_headers_and_garbage_are_skipped():
+    assert parse_originators("No batman nodes in range ...\n\n") == {}
+
+
+def test_arp_table_keeps_complete_entries_on_device():
+    text = fixture("proc_net_arp.txt")
+
+    assert parse_arp_table(text, "bat0") == {
+        "192.168.199.12": "02:ba:de:af:fe:02",
+        "192.168.199.13": "02:ba:de:af:fe:03",
+    }
+    assert parse_arp_table(text) == {
+        "192.168.199.12": "02:ba:de:af:fe:02",
+        "192.168.199.13": "02:ba:de:af:fe:03",
+        "192.168.1.1": "a4:91:b1:0c:22:7e",
+    }
+
+
+def test_node_addresses_prefer_configured_mac(tmp_path):
+    arp = tmp_path / "arp"
+    arp.write_text(fixture("proc_net_arp.txt"))
+    collector = OriginatorCollector(arp_table=str(arp))
+    nodes = [
+        {'id': 'a', 'ip': '192.168.199.12', 'mac': '02:BA:DE:AF:FE:0A'},
+        {'id': 'b', 'ip': '192.168.199.13'},
+        {'id': 'c', 'ip': '192.168.199.14'},
+    ]
+
+    assert collector.node_addresses(nodes) == {'a': '02:ba:de:af:fe:0a', 'b': '02:ba:de:af:fe:03'}
+
+
+def test_diff_reports_added_removed_and_next_hop_changes():
+    previous = parse_originators(fixture("debugfs_originators.txt"))
+    current = parse_originators(fixture("batctl_originators_iv.txt"))
+
+    changes = {change.address: change for change in diff_originators(previous, current)}
+
+    assert set(changes) == {"02:ba:de:af:fe:03", "02:ba:de:af:fe:04"}
+    assert changes["02:ba:de:af:fe:03"].kind == 'next_hop'
+    assert changes["02:ba:de:af:fe:03"].previous.next_hop == "02:ba:de:af:fe:02"
+    assert changes["02:ba:de:af:fe:03"].current.next_hop == "02:ba:de:af:fe:03"
+    assert changes["02:ba:de:af:fe:04"] == RouteChange(
+        "02:ba:de:af:fe:04", 'added', None, current["02:ba:de:af:fe:04"])
+
+    removed = diff_originators(current, previous)
+    assert [(change.address, change.kind) for change in removed if change.kind == 'removed'] == \
+        [("02:ba:de:af:fe:04", 'removed')]
+
+
+def test_diff_of_identical_snapshots_is_empty():
+    current = parse_originators(fixture("batctl_originators_iv.txt"))
+
+    assert diff_originators(current, dict(current)) == []
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from monitoring.mesh_monitor import MeshMonitor, NodeMetrics
+from monitoring.prober import EchoSocket, ProbeConfig, ProbeEngine
+
+ALIVE = "127.0.0.1"
+DEAD = "127.0.0.2"   # loopback address nobody answers on
+
+
+class _Echo(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.transport.sendto(data, address)
+
+
+@pytest.fixture
+def echo_port():
+    """UDP echo responder on ALIVE, served by an asyncio loop in its own thread."""
+    loop = asyncio.new_event_loop()
+    transport, _ = loop.run_until_complete(
+        loop.create_datagram_endpoint(_Echo, local_addr=(ALIVE, 0)))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield transport.get_extra_info('sockname')[1]
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    transport.close()
+    loop.close()
+
+
+def _engine(port: int, **overrides) -> ProbeEngine:
+    settings = dict(method="udp", udp_port=port, count=3, spacing=0.01, timeout=0.3,
+                    concurrency=8, cycle_budget=1.0)
+    settings.update(overrides)
+    return ProbeEngine(ProbeConfig(**settings))
+
+
+def test_echo_socket_is_abstract():
+    with pytest.raises(TypeError):
+        EchoSocket()
+
+
+def test_cycle_measures_live_node_and_times_out_dead_one(echo_port):
+    engine = _engine(echo_port)
+    nodes = [{'id': 'alive', 'ip': ALIVE}, {'id': 'dead', 'ip': DEAD}]
+    try:
+        started = time.monotonic()
+        results, links = engine.run_cycle(nodes)
+        elapsed = time.monotonic() - started
+    finally:
+        engine.close()
+
+    assert elapsed < engine.config.cycle_budget
+    assert links is None
+    alive, dead = results['alive'], results['dead']
+    assert alive.sent == alive.received == 3
+    assert alive.latency is not None and 0 < alive.latency < engine.config.timeout
+    assert alive.packet_loss == 0.0
+    assert dead.sent == 3 and dead.received == 0
+    assert dead.latency is None and dead.packet_loss == 1.0
+    assert not dead.truncated and not dead.inconclusive
+    assert engine.overruns == 0
+
+
+def test_cycle_never_outlasts_budget(echo_port):
+    engine = _engine(echo_port, timeout=2.0, cycle_budget=0.3)
+    nodes = [{'id': 'alive', 'ip': ALIVE}, {'id': 'dead', 'ip': DEAD}]
+    try:
+        started = time.monotonic()
+        results, _ = engine.run_cycle(nodes)
+        elapsed = time.monotonic() - started
+    finally:
+        engine.close()
+
+    assert elapsed < engine.config.cycle_budget + 0.1
+    assert engine.overruns == 1
+    assert results['alive'].received == 3 and not results['alive'].truncated
+    assert results['dead'].truncated and results['dead'].inconclusive
+    assert results['dead'].error == "cycle budget exceeded"
+
+
+def test_monitor_keeps_previous_metrics_of_node_cut_off_by_budget(echo_port):
+    monitor = MeshMonitor({
+        'mesh': {'protocol': 'babel', 'nodes': [{'id': 'alive', 'ip': ALIVE}, {'id': 'dead', 'ip': DEAD}]},
+        'monitoring': {'interval': 1, 'probe': {'method': 'udp', 'udp_port': echo_port, 'count': 2,
+                                                'spacing': 0.01, 'timeout': 2.0, 'cycle_budget': 0.3}},
+    })
+    previous = NodeMetrics(node_id='dead', latency=0.004, bandwidth=1000000, packet_loss=0.0,
+                           signal_strength=-60, last_seen=datetime(2026, 1, 1), status='up')
+    monitor.metrics['dead'] = previous
+    try:
+        monitor._update_metrics()
+    finally:
+        monitor.prober.close()
+
+    assert monitor.metrics['dead'] is previous
+    alive = monitor.metrics['alive']
+    assert alive.status == 'up'
+    assert 0 < alive.latency < 2.0
+    assert alive.packet_loss == 0.0
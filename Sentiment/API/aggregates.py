@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+
+# name -> (span seconds, bucket count); each window is a fixed ring of buckets
+DEFAULT_WINDOWS = {
+    '1m': (60, 60),
+    '5m': (300, 60),
+    '1h': (3600, 60),
+}
+
+KINDS = ("channel", "user", "server")
+
+
+class _Bucket:
+    __slots__ = ("epoch", "count", "sums", "outputs")
+
+    def __init__(self, epoch):
+        self.epoch = epoch
+        self.count = 0
+        self.sums = {'sentiment': {}, 'emotion': {}}
+        self.outputs = {'sentiment': {}, 'emotion': {}}
+
+
+class RollingWindow:
+    """Counts and probability sums over the last ``span`` seconds, in ``buckets`` time slices.
+
+    Buckets are reused in a ring keyed by ``ts // width``, so adding is O(labels)
+    and reading is O(buckets) regardless of how many messages arrived.
+    """
+
+    __slots__ = ("width", "ring")
+
+    def __init__(self, span, buckets):
+        self.width = span / buckets
+        self.ring = [None] * buckets
+
+    def add(self, ts, outputs, now):
+        epoch = int(ts // self.width)
+        if epoch <= int(now // self.width) - len(self.ring):
+            return  # older than the window (e.g. replayed from the bot's spool)
+        index = epoch % len(self.ring)
+        bucket = self.ring[index]
+        if bucket is None or bucket.epoch != epoch:
+            if bucket is not None and bucket.epoch > epoch:
+                return  # slot already holds a newer slice
+            bucket = self.ring[index] = _Bucket(epoch)
+        bucket.count += 1
+        for model, probas in outputs.items():
+            sums = bucket.sums[model]
+            for proba in probas:
+                sums[proba['label']] = sums.get(proba['label'], 0.0) + proba['score']
+            top = bucket.outputs[model]
+            top[probas[0]['label']] = top.get(probas[0]['label'], 0) + 1
+
+    def snapshot(self, now):
+        oldest = int(now // self.width) - len(self.ring) + 1
+        count = 0
+        sums = {'sentiment': {}, 'emotion': {}}
+        outputs = {'sentiment': {}, 'emotion': {}}
+        for bucket in self.ring:
+            if bucket is None or bucket.epoch < oldest:
+                continue
+            count += bucket.count
+            for model in sums:
+                for label, value in bucket.sums[model].items():
+                    sums[model][label] = sums[model].get(label, 0.0) + value
+                for label, value in bucket.outputs[model].items():
+                    outputs[model][label] = outputs[model].get(label, 0) + value
+        summary = {'count': count}
+        for model in sums:
+            # Labels outside a message's top_k count as 0 for that message
+            summary[model] = {
+                'mean': {label: value / count for label, value in sums[model].items()} if count else {},
+                'counts': outputs[model],
+            }
+        return summary
+
+
+class SentimentAggregator:
+    """Sliding-window mood per channel, user and server, plus a global total.
+
+    At most ``max_keys`` names are tracked per kind; the least recently
+    updated one is evicted first.
+    """
+
+    def __init__(self, windows=None, max_keys=10000):
+        self.windows = dict(windows or DEFAULT_WINDOWS)
+        self.max_span = max(span for span, _ in self.windows.values())
+        self.max_keys = max(1, int(max_keys))
+        self._global = self._new_entry()
+        self._keys = {kind: OrderedDict() for kind in KINDS}
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def _new_entry(self):
+        return {name: RollingWindow(span, buckets) for name, (span, buckets) in self.windows.items()}
+
+    def _entry(self, kind, name):
+        entries = self._keys[kind]
+        entry = entries.get(name)
+        if entry is None:
+            if len(entries) >= self.max_keys:
+                entries.popitem(last=False)
+                self.evicted += 1
+            entry = entries[name] = self._new_entry()
+        else:
+            entries.move_to_end(name)
+        return entry
+
+    def add(self, record, emotion, sentiment, now=None):
+        """Fold one analysed message in; ``record`` supplies user/channel/server and an optional ``ts``."""
+        now = now or time.time()
+        ts = record.get("ts")
+        if not isinstance(ts, (int, float)) or ts > now:
+            ts = now
+        if ts < now - self.max_span:
+            return  # too old for every window; don't let it evict live names
+        outputs = {'sentiment': sentiment, 'emotion': emotion}
+        with self._lock:
+            entries = [self._global]
+            for kind in KINDS:
+                name = record.get(kind)
+                if name:
+                    entries.append(self._entry(kind, name))
+            for entry in entries:
+                for window in entry.values():
+                    window.add(ts, outputs, now)
+
+    def _check_window(self, window):
+        if window not in self.windows:
+            raise ValueError(f"Unknown window '{window}' (expected one of {', '.join(self.windows)})")
+
+    def overall(self, window=None):
+        now = time.time()
+        names = [window] if window else list(self.windows)
+        for name in names:
+            self._check_window(name)
+        with self._lock:
+            return {name: self._global[name].snapshot(now) for name in names}
+
+    def query(self, kind, name, window=None):
+        """Snapshot for one channel/user/server, or None if it is not tracked."""
+        now = time.time()
+        names = [window] if window else list(self.windows)
+        for window_name in names:
+            self._check_window(window_name)
+        with self._lock:
+            entry = self._keys[kind].get(name)
+            if entry is None:
+                return None
+            return {window_name: entry[window_name].snapshot(now) for window_name in names}
+
+    def top(self, kind, window, sort_by="count", limit=20):
+        """Tracked names ranked by message count or by the mean probability of label ``sort_by``."""
+        self._check_window(window)
+        now = time.time()
+        with self._lock:
+            rows = [(name, entry[window].snapshot(now)) for name, entry in self._keys[kind].items()]
+        rows = [(name, snap) for name, snap in rows if snap['count']]
+
+        def score(snap):
+            if sort_by == "count":
+                return snap['count']
+            for model in ('sentiment', 'emotion'):
+                if sort_by in snap[model]['mean']:
+                    return snap[model]['mean'][sort_by]
+            return 0.0
+
+        rows.sort(key=lambda row: score(row[1]), reverse=True)
+        return [{kind: name, **snap} for name, snap in rows[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'windows': {name: {'span_s': span, 'buckets': buckets}
+                            for name, (span, buckets) in self.windows.items()},
+                'tracked': {kind: len(entries) for kind, entries in self._keys.items()},
+                'max_keys': self.max_keys,
+                'evicted': self.evicted,
+            }
@@ -1,230 +1,722 @@
 import eventlet
 eventlet.monkey_patch()
 
-from flask import Flask, request, jsonify
-from flask_socketio import SocketIO, emit
-from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
-from deep_translator import GoogleTranslator
-import datetime
+from flask import Flask, request, jsonify, g, Response, stream_with_context
+from flask_socketio import SocketIO, join_room, leave_room
 import socket
-import json
-import requests
 import logging
 import os
-import sys
-import torch
-from concurrent.futures import ThreadPoolExecutor
 import threading
-from pathlib import Path
 import time
 from functools import wraps
-import shutil
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+from eventlet import tpool
+from models import (CACHE_DIR, EMOTION_MODEL, SENTIMENT_MODEL, setup_cache_directory,
+                    load_models_sequential, load_models_parallel, warmup_models)
+from batcher import InferenceBatcher, result_sizeof
+from cache import LRUCache
+from translation import create_translator
+from pipeline import AnalysisPipeline, PipelineOverloaded
+import multiprocessing
+import metrics
+from profiler import SamplingProfiler
+from logging_setup import configure_logging
+from broadcast import ALL_ROOM, Broadcaster, PreserializedJSON, subscription_rooms
+from aggregates import KINDS, SentimentAggregator
+from history import FILTERS, HistoryStore, to_ndjson
+from cascade import ModelCascade, create_fast_classifier
 
-# Configure logging to output to stdout
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout
-)
+# Flask debug mode; keep it off outside local development
+API_DEBUG = os.getenv("API_DEBUG", "false").lower() == "true"
+
+# Logging settings (LOG_FORMAT: text | json)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.01))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_AUDIT = os.getenv("LOG_AUDIT", "true").lower() == "true"
+
+# Configure queue-backed logging to stdout; formatting and I/O happen off the request path
+log_controller = configure_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE, LOG_QUEUE_SIZE)
 logger = logging.getLogger(__name__)
+# One structured record per processed message
+audit_logger = logging.getLogger("sentiment.audit")
 
-# Create persistent cache directory
-CACHE_DIR = Path("/root/.cache")
+# Micro-batching settings for model inference
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 16))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", 10))
 
-# Ensure cache directory exists and has proper permissions
-def setup_cache_directory():
-    try:
-        # Create cache directory if it doesn't exist
-        CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        
-        # Set permissions to ensure writability
-        os.chmod(CACHE_DIR, 0o777)
-        
-        logger.info(f"Cache directory set up at {CACHE_DIR}")
-    except Exception as e:
-        logger.error(f"Failed to set up cache directory: {e}")
-        raise
+# Sentiment result cache settings
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 50000))
+RESULT_CACHE_PERSIST = os.getenv("RESULT_CACHE_PERSIST", "false").lower() == "true"
+
+# Translation layer settings
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 10000))
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", 0)) or None
+TRANSLATION_CACHE_PERSIST = os.getenv("TRANSLATION_CACHE_PERSIST", "false").lower() == "true"
+TRANSLATION_DETECT_ENGLISH = os.getenv("TRANSLATION_DETECT_ENGLISH", "true").lower() == "true"
+
+# Asynchronous pipeline settings (RECEIVE_MODE: sync | async)
+RECEIVE_MODE = os.getenv("RECEIVE_MODE", "sync")
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 1000))
+PIPELINE_OVERLOAD_POLICY = os.getenv("PIPELINE_OVERLOAD_POLICY", "reject")
+PIPELINE_TRANSLATE_WORKERS = int(os.getenv("PIPELINE_TRANSLATE_WORKERS", 4))
+PIPELINE_INFER_WORKERS = int(os.getenv("PIPELINE_INFER_WORKERS", 2))
+PIPELINE_PUBLISH_WORKERS = int(os.getenv("PIPELINE_PUBLISH_WORKERS", 1))
+
+# Upper bound on records accepted by /receive_batch
+MAX_RECEIVE_BATCH = int(os.getenv("MAX_RECEIVE_BATCH", 500))
+
+# Model runtime (torch | onnx | onnx-int8)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+
+# Startup settings (MODEL_LOAD_MODE: parallel | sequential)
+MODEL_LOAD_MODE = os.getenv("MODEL_LOAD_MODE", "parallel")
+MODEL_LOCAL_FIRST = os.getenv("MODEL_LOCAL_FIRST", "true").lower() == "true"
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+
+# Multi-process inference (0 keeps the models in this process)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 0))
+INFERENCE_WORKER_THREADS = int(os.getenv("INFERENCE_WORKER_THREADS", 0)) or None
+INFERENCE_SHARE_WEIGHTS = os.getenv("INFERENCE_SHARE_WEIGHTS", "true").lower() == "true"
+
+# Model cascade: a cheap classifier (lexicon | path to a .npz from cascade.py train) answers
+# messages of at most CASCADE_MAX_TOKENS words it is CASCADE_THRESHOLD sure about
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+CASCADE_CLASSIFIER = os.getenv("CASCADE_CLASSIFIER", "lexicon")
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", 0.8))
+CASCADE_MAX_TOKENS = int(os.getenv("CASCADE_MAX_TOKENS", 8))
+
+# /debug/profiler and /logging answer loopback clients only unless this is set
+ADMIN_ALLOW_REMOTE = os.getenv("ADMIN_ALLOW_REMOTE", "false").lower() == "true"
+
+# Sampling profiler (can also be toggled at runtime via /debug/profiler)
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 5))
+
+# Socket.IO fan-out: 0 emits each result at once, otherwise results are coalesced
+# into one sentiment_batch frame per room every BROADCAST_INTERVAL_MS
+BROADCAST_INTERVAL_MS = float(os.getenv("BROADCAST_INTERVAL_MS", 0))
+BROADCAST_MAX_BATCH = int(os.getenv("BROADCAST_MAX_BATCH", 500))
+
+# Rolling 1m/5m/1h aggregates; names tracked per channel/user/server before LRU eviction
+AGGREGATE_MAX_KEYS = int(os.getenv("AGGREGATE_MAX_KEYS", 10000))
+
+# Message history (SQLite, written in batches off the request path)
+# Off by default: it stores every raw message and nick on disk
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "false").lower() == "true"
+HISTORY_PATH = os.getenv("HISTORY_PATH", str(CACHE_DIR / "history.db"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 500))
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", 30))
+HISTORY_MAX_QUERY_ROWS = int(os.getenv("HISTORY_MAX_QUERY_ROWS", 1000000))
+
+# Spawned inference workers re-import this module; only the main process owns the cache files
+IS_MAIN_PROCESS = multiprocessing.parent_process() is None
 
 # Set up cache directory on startup
 setup_cache_directory()
 
-# Global cache for models
-model_cache = {}
-model_lock = threading.Lock()
-
-def retry_on_failure(max_retries=3, delay=1):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
-                    if attempt < max_retries - 1:
-                        time.sleep(delay)
-            raise last_exception
-        return wrapper
-    return decorator
-
-@retry_on_failure(max_retries=3, delay=2)
-def load_model(model_name, task="text-classification", top_k=3):
-    """Load a model with caching and optimized settings"""
-    with model_lock:
-        if model_name in model_cache:
-            logger.info(f"Using cached model: {model_name}")
-            return model_cache[model_name]
-        
-        logger.info(f"Loading model: {model_name}")
-        try:
-            # Set timeout for model loading
-            os.environ['TRANSFORMERS_OFFLINE'] = '0'
-            os.environ['HF_HUB_DOWNLOAD_TIMEOUT'] = '300'  # 5 minutes timeout
-            
-            # Configure cache settings
-            os.environ['TRANSFORMERS_CACHE'] = str(CACHE_DIR)
-            os.environ['HF_HOME'] = str(CACHE_DIR)
-            
-            # Debug: Check cache directory
-            logger.info(f"Cache directory contents before loading: {list(CACHE_DIR.glob('*'))}")
-            logger.info(f"Environment variables: TRANSFORMERS_CACHE={os.environ.get('TRANSFORMERS_CACHE')}, HF_HOME={os.environ.get('HF_HOME')}")
-            
-            # Load model with simplified settings
-            model = pipeline(
-                task=task,
-                model=model_name,
-                device=0 if torch.cuda.is_available() else -1,
-                top_k=top_k,
-                model_kwargs={
-                    "cache_dir": str(CACHE_DIR),
-                    "local_files_only": False
-                }
-            )
-            
-            # Debug: Check cache directory after loading
-            logger.info(f"Cache directory contents after loading: {list(CACHE_DIR.glob('*'))}")
-            
-            # Cache the model
-            model_cache[model_name] = model
-            logger.info(f"Successfully loaded and cached model: {model_name}")
-            return model
-            
-        except Exception as e:
-            logger.error(f"Failed to load model {model_name}: {str(e)}")
-            raise
-
-def load_models_sequential():
-    """Load models sequentially with better error handling"""
-    try:
-        logger.info("Starting model loading...")
-        
-        # Define models to load
-        models_to_load = [
-            ("j-hartmann/emotion-english-distilroberta-base", "emotion"),
-            ("finiteautomata/bertweet-base-sentiment-analysis", "sentiment")
-        ]
-        
-        results = {}
-        for model_name, name in models_to_load:
-            try:
-                logger.info(f"Loading {name} model...")
-                results[name] = load_model(model_name)
-                logger.info(f"{name} model loaded successfully")
-            except Exception as e:
-                logger.error(f"Failed to load {name} model: {e}")
-                raise
-            
-        logger.info("All models loaded successfully")
-        return results["emotion"], results["sentiment"]
-    except Exception as e:
-        logger.error(f"Failed to load models: {e}")
-        raise
+# Startup progress, reported by /readyz; phases: starting -> loading -> warming -> ready | failed
+PROCESS_START = time.perf_counter()
+startup_state = {'phase': 'starting', 'error': None, 'timings': {}}
+
+result_cache = None
+if RESULT_CACHE_SIZE > 0:
+    result_cache = LRUCache(
+        max_size=RESULT_CACHE_SIZE,
+        path=str(CACHE_DIR / "results.json") if RESULT_CACHE_PERSIST else None,
+        sizeof=result_sizeof,
+    )
+    if IS_MAIN_PROCESS:
+        atexit.register(result_cache.save)
 
-# Load models before creating Flask app
-logger.info("Initializing models...")
-emotion_model, sentiment_model = load_models_sequential()
-logger.info("Models initialized successfully")
+cascade = None
+if CASCADE_ENABLED:
+    cascade = ModelCascade(create_fast_classifier(CASCADE_CLASSIFIER),
+                           threshold=CASCADE_THRESHOLD, max_tokens=CASCADE_MAX_TOKENS)
+
+# Models are attached by load_models_in_background() once loaded
+batcher = InferenceBatcher(
+    {},
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    cache=result_cache,
+    # Cascade answers are cached apart from full-model ones
+    cache_namespace=f"{EMOTION_MODEL}|{SENTIMENT_MODEL}|{INFERENCE_BACKEND}"
+                    + (f"|cascade:{CASCADE_CLASSIFIER}:{CASCADE_THRESHOLD}:{CASCADE_MAX_TOKENS}" if cascade else ""),
+    concurrency=max(1, INFERENCE_WORKERS),
+)
+worker_pool = None
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', json=PreserializedJSON)
+broadcaster = Broadcaster(socketio, interval=BROADCAST_INTERVAL_MS / 1000.0, max_batch=BROADCAST_MAX_BATCH)
+aggregator = SentimentAggregator(max_keys=AGGREGATE_MAX_KEYS)
+
+history = None
+if HISTORY_ENABLED and IS_MAIN_PROCESS:
+    history = HistoryStore(HISTORY_PATH, batch_size=HISTORY_BATCH_SIZE, retention_days=HISTORY_RETENTION_DAYS)
+    history.start()
+    atexit.register(history.stop)
 
 latest_results = {}
 
+translator = create_translator(
+    backend=TRANSLATION_BACKEND,
+    cache_size=TRANSLATION_CACHE_SIZE,
+    cache_ttl=TRANSLATION_CACHE_TTL,
+    cache_path=str(CACHE_DIR / "translations.json") if TRANSLATION_CACHE_PERSIST else None,
+    detect_english=TRANSLATION_DETECT_ENGLISH,
+    # Requests to the backend run on OS threads, never on the eventlet hub
+    offload=tpool.execute,
+)
+if IS_MAIN_PROCESS:
+    atexit.register(translator.cache.save)
+
+@metrics.timed(metrics.TRANSLATION_LATENCY)
 def translate_to_english(text):
+    return translator.translate(text)
+
+def build_result(emo_result, sent_result):
+    """Shape model outputs into the payload emitted to dashboards"""
+    return {
+        'data': {
+             'sentiment': {
+                'probas': sent_result,
+                'output': sent_result[0]['label'],
+             },
+             'emotion': {
+                'probas': emo_result,
+                'output': emo_result[0]['label']
+            }
+        }
+    }
+
+@metrics.timed(metrics.EMIT_LATENCY)
+def emit_result(max_data, record):
+    """Publish a result to the rooms of its channel, user and server"""
+    broadcaster.publish({**max_data,
+                         'user': record.get("user"),
+                         'channel': record.get("channel"),
+                         'server': record.get("server")}, record)
+
+def publish_result(max_data, record, translated):
+    """Record a result in history and the rolling aggregates, then broadcast it"""
+    emotion = max_data['data']['emotion']['probas']
+    sentiment = max_data['data']['sentiment']['probas']
+    if history is not None:
+        history.record(record, translated, emotion, sentiment)
+    aggregator.add(record, emotion, sentiment)
+    emit_result(max_data, record)
+
+def log_processed(record, translated, emo_result, sent_result, **extra):
+    """Emit the single audit record for one analysed message"""
+    if not LOG_AUDIT:
+        return
+    audit_logger.info("message_processed", extra={'fields': {
+        'user': record.get("user"),
+        'server': record.get("server"),
+        'channel': record.get("channel"),
+        'message': record.get("message"),
+        'translated': translated,
+        'emotion': {e['label']: round(e['score'], 4) for e in emo_result},
+        'sentiment': {s['label']: round(s['score'], 4) for s in sent_result},
+        **extra,
+    }})
+
+def publish_job(job):
+    """Final pipeline stage: emit a finished job's result over Socket.IO"""
+    global latest_results
+    max_data = build_result(job["outputs"]["emotion"], job["outputs"]["sentiment"])
+    max_data['job_id'] = job["job_id"]
+    log_processed(job, job["translated"], job["outputs"]["emotion"], job["outputs"]["sentiment"],
+                  job_id=job["job_id"])
+    latest_results = max_data
+    publish_result(max_data, job, job["translated"])
+
+def fail_job(job, error):
+    """Pipeline error hook: tell the job's subscribers it will not produce a result"""
+    socketio.emit('sentiment_error', {
+        'job_id': job["job_id"],
+        'error': str(error),
+        'user': job.get("user"),
+        'channel': job.get("channel"),
+        'server': job.get("server"),
+    }, to=broadcaster.rooms_for(job))
+
+# Translates the records of a synchronous /receive_batch concurrently
+translate_pool = ThreadPoolExecutor(max_workers=PIPELINE_TRANSLATE_WORKERS, thread_name_prefix="batch-translate")
+
+pipeline = AnalysisPipeline(
+    translate=translate_to_english,
+    infer_many=batcher.infer_many,
+    publish=publish_job,
+    policy=PIPELINE_OVERLOAD_POLICY,
+    queue_size=PIPELINE_QUEUE_SIZE,
+    translate_workers=PIPELINE_TRANSLATE_WORKERS,
+    infer_workers=PIPELINE_INFER_WORKERS,
+    publish_workers=PIPELINE_PUBLISH_WORKERS,
+    infer_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    fail=fail_job,
+)
+
+metrics.register_component_collector({
+    'translator': lambda: translator,
+    'batcher': lambda: batcher,
+    'pipeline': lambda: pipeline,
+    'broadcaster': lambda: broadcaster,
+    'history': lambda: history,
+    'cascade': lambda: cascade,
+})
+
+profiler = SamplingProfiler(interval=PROFILER_INTERVAL_MS / 1000.0)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None and request.endpoint != 'prometheus_metrics':
+        metrics.REQUEST_LATENCY.labels(endpoint=request.endpoint or "unknown").observe(time.perf_counter() - start)
+    return response
+
+@socketio.on('connect')
+def on_socketio_connect():
+    metrics.SOCKETIO_CLIENTS.inc()
+    # Clients see everything until they subscribe to something narrower
+    join_room(ALL_ROOM)
+    broadcaster.join(request.sid, [ALL_ROOM])
+
+@socketio.on('subscribe')
+def on_socketio_subscribe(data):
+    """Join channel/user/server rooms; leaves the catch-all room unless {"all": true}"""
+    try:
+        rooms = subscription_rooms(data)
+    except ValueError as e:
+        return {'error': str(e)}
+    if ALL_ROOM not in rooms:
+        leave_room(ALL_ROOM)
+        broadcaster.leave(request.sid, [ALL_ROOM])
+    for room in rooms:
+        join_room(room)
+    broadcaster.join(request.sid, rooms)
+    return {'rooms': rooms}
+
+@socketio.on('unsubscribe')
+def on_socketio_unsubscribe(data):
+    try:
+        rooms = subscription_rooms(data)
+    except ValueError as e:
+        return {'error': str(e)}
+    for room in rooms:
+        leave_room(room)
+    broadcaster.leave(request.sid, rooms)
+    return {'rooms': rooms}
+
+@socketio.on('disconnect')
+def on_socketio_disconnect():
+    metrics.SOCKETIO_CLIENTS.dec()
+    broadcaster.disconnect(request.sid)
+
+def load_and_warm_models():
+    """Load (and optionally warm up) both models; runs on an OS thread via tpool"""
+    global worker_pool
+    share_weights = INFERENCE_WORKERS > 0 and INFERENCE_BACKEND == "torch" and INFERENCE_SHARE_WEIGHTS
+    models = {}
+
+    # Worker processes load their own copy unless they map the parent's weights
+    if INFERENCE_WORKERS == 0 or share_weights:
+        startup_state['phase'] = 'loading'
+        start = time.perf_counter()
+        if MODEL_LOAD_MODE == "parallel":
+            emotion, sentiment, per_model = load_models_parallel(INFERENCE_BACKEND, MODEL_LOCAL_FIRST)
+            startup_state['timings'].update({f"load_{name}": secs for name, secs in per_model.items()})
+        else:
+            emotion, sentiment = load_models_sequential(INFERENCE_BACKEND, MODEL_LOCAL_FIRST)
+        startup_state['timings']['load_models'] = time.perf_counter() - start
+        models = {"emotion": emotion, "sentiment": sentiment}
+
+    if INFERENCE_WORKERS > 0:
+        from worker_pool import InferenceWorkerPool
+        startup_state['phase'] = 'starting_workers'
+        start = time.perf_counter()
+        worker_pool = InferenceWorkerPool(
+            INFERENCE_WORKERS,
+            backend=INFERENCE_BACKEND,
+            intra_op_threads=INFERENCE_WORKER_THREADS,
+            local_first=MODEL_LOCAL_FIRST,
+            shared_models=models if share_weights else None,
+            warmup=MODEL_WARMUP,
+        )
+        worker_pool.start()
+        startup_state['timings']['start_workers'] = time.perf_counter() - start
+        return models
+
+    if MODEL_WARMUP:
+        startup_state['phase'] = 'warming'
+        start = time.perf_counter()
+        warmup_models(models)
+        startup_state['timings']['warmup'] = time.perf_counter() - start
+    return models
+
+@metrics.timed(metrics.INFERENCE_LATENCY.labels(model="worker_pool"))
+def run_on_worker_pool(texts):
+    # The pool blocks on pipes, so keep it off the eventlet hub
+    metrics.INFERENCE_BATCH_SIZE.observe(len(texts))
+    return tpool.execute(worker_pool.run, texts)
+
+def offloaded(model):
+    """Run a model call on a tpool OS thread.
+
+    The batcher's workers are green threads, so calling a model directly
+    would hold the eventlet hub (and every request and Socket.IO client)
+    for the whole batch. Only the bare model call moves: eventlet's green
+    locks (batcher, cascade and metrics state) must not be taken from tpool
+    threads, so everything around it stays on the hub.
+    """
+    def run(texts, **kwargs):
+        return tpool.execute(model, texts, **kwargs)
+    return run
+
+def activate_models(models, runner=None):
+    """Attach loaded models (or a runner) to the batcher and start serving"""
+    batcher.models = {name: metrics.timed_model(name, offloaded(model)) for name, model in models.items()}
+    if runner is not None:
+        batcher.runner = runner
+    if cascade is not None:
+        cascade.full = batcher.runner or batcher.run_models
+        batcher.runner = cascade
+    batcher.start()
+    pipeline.start()
+    startup_state['phase'] = 'ready'
+
+def load_models_in_background():
+    """Bring the inference path up while the server already answers health checks"""
     try:
-        translated = GoogleTranslator(source='auto', target='en').translate(text)
-        return translated
+        models = tpool.execute(load_and_warm_models)
     except Exception as e:
-        logger.warning(f"Translation failed: {e}")
-        return text
+        logger.error(f"Model initialization failed: {e}")
+        startup_state['phase'] = 'failed'
+        startup_state['error'] = str(e)
+        return
+    activate_models(models, run_on_worker_pool if worker_pool is not None else None)
+    startup_state['timings']['total'] = time.perf_counter() - PROCESS_START
+    logger.info(f"Models initialized successfully, startup timings: "
+                f"{ {k: round(v, 2) for k, v in startup_state['timings'].items()} }")
+
+LOOPBACK_ADDRESSES = ("127.0.0.1", "::1")
+
+def local_only(view):
+    """Answer 403 to non-loopback clients unless ADMIN_ALLOW_REMOTE is set"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_ALLOW_REMOTE and request.remote_addr not in LOOPBACK_ADDRESSES:
+            return jsonify({"error": "Only available from localhost"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def require_ready(view):
+    """Answer 503 until models are loaded and warmed up"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if startup_state['phase'] != 'ready':
+            return jsonify({"error": "Models are not ready", "phase": startup_state['phase']}), 503
+        return view(*args, **kwargs)
+    return wrapper
+
+def wants_async():
+    """Per-request override of RECEIVE_MODE via ?async=true|false"""
+    flag = request.args.get("async")
+    if flag is None:
+        return RECEIVE_MODE == "async"
+    return flag.lower() in ("1", "true", "yes")
+
+def has_message(record):
+    """A record is analysable only if it is an object with a non-empty string message"""
+    if not isinstance(record, dict):
+        return False
+    message = record.get("message")
+    return isinstance(message, str) and bool(message.strip())
 
 @app.route('/receive', methods=['POST'])
+@require_ready
 def receive():
     global latest_results
     try:
-        data = request.get_json()
-        if not data:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data:
             logger.warning("Received invalid JSON")
             return jsonify({"error": "Invalid JSON"}), 400
+        if not has_message(data):
+            return jsonify({"error": "Missing message"}), 400
 
         user = data.get("user")
         message = data.get("message")
-        logger.info(f"Received message from {user}: {message}")
+        logger.debug("received", extra={'fields': {'user': user, 'message': message}, 'sample': True})
+
+        if wants_async():
+            # Acknowledge now; the result (or a sentiment_error) arrives carrying this job id
+            try:
+                job_id = pipeline.submit(data)
+            except PipelineOverloaded as e:
+                return jsonify({"error": str(e)}), 429
+            return jsonify({"job_id": job_id}), 202
 
         translated = translate_to_english(message)
 
-        logger.info("=" * 40)
-        logger.info(f"User       : {user}")
-        logger.info(f"Message    : {message}")
-        logger.info(f"Translated : {translated}")
-
-        # Process models in parallel
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            emo_future = executor.submit(emotion_model, translated)
-            sent_future = executor.submit(sentiment_model, translated)
-            
-            emo_result = emo_future.result()[0]
-            sent_result = sent_future.result()[0]
-
-        logger.info("\nEmotion results:")
-        for e in emo_result:
-            logger.info(f"  - {e['label']}: {e['score']:.2f}")
-        logger.info("\nSentiment results:")
-        for s in sent_result:
-            logger.info(f"  - {s['label']}: {s['score']:.2f}")
-
-        primary_emotion = emo_result[0]['label']
-        primary_sentiment = sent_result[0]['label']
-        
-        logger.info(f"Selected emotion label: {primary_emotion}")
-        logger.info(f"Selected sentiment label: {primary_sentiment}")
-        logger.info("=" * 40)
-
-        max_data = {
-            'data': {
-                 'sentiment': {
-                    'probas': sent_result,
-                    'output': primary_sentiment,
-                 },
-                 'emotion': {
-                    'probas': emo_result,
-                    'output': primary_emotion
-                }
-            }
-        }
+        # Queue for the shared batcher, which runs both models once per batch
+        results = batcher.infer(translated)
+        emo_result = results["emotion"]
+        sent_result = results["sentiment"]
+        log_processed(data, translated, emo_result, sent_result)
+
+        max_data = build_result(emo_result, sent_result)
 
         latest_results = max_data
-        socketio.emit('sentiment_event', max_data)
+        publish_result(max_data, data, translated)
 
         return jsonify(max_data), 201
     except Exception as e:
         logger.error(f"Error processing request: {e}")
+        metrics.ERRORS.labels(stage="receive").inc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/receive_batch', methods=['POST'])
+@require_ready
+def receive_batch():
+    """Analyse an array of {user, message, channel, server, ts} records in one request"""
+    global latest_results
+    try:
+        data = request.get_json(silent=True)
+        records = data.get("messages") if isinstance(data, dict) else data
+        if not isinstance(records, list):
+            logger.warning("Received invalid batch payload")
+            return jsonify({"error": "Expected a JSON array of messages"}), 400
+        if len(records) > MAX_RECEIVE_BATCH:
+            return jsonify({"error": f"Batch too large (max {MAX_RECEIVE_BATCH})"}), 413
+
+        logger.info("received_batch", extra={'fields': {'size': len(records)}, 'sample': True})
+
+        valid = [index for index, record in enumerate(records) if has_message(record)]
+        results = [{"error": "Missing message"} for _ in records]
+
+        if wants_async():
+            # Same admission and overload policy as /receive; results arrive per job id
+            try:
+                job_ids = pipeline.submit_many([records[index] for index in valid])
+            except PipelineOverloaded as e:
+                return jsonify({"error": str(e)}), 429
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 413
+            for index, job_id in zip(valid, job_ids):
+                results[index] = {"job_id": job_id}
+            return jsonify({"results": results}), 202
+
+        # Sync mode bypasses the pipeline queues; the batcher backlog stands in for them
+        try:
+            degrade = pipeline.admit(len(valid), batcher.queue_depth())
+        except PipelineOverloaded as e:
+            return jsonify({"error": str(e)}), 429
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 413
+
+        # Translate concurrently, then submit everything so the records share batches
+        messages = [records[index]["message"] for index in valid]
+        translations = messages if degrade else translate_pool.map(translate_to_english, messages)
+        futures = [(index, translated, batcher.submit(translated)) for index, translated in zip(valid, translations)]
+
+        for index, translated, future in futures:
+            record = records[index]
+            try:
+                outputs = future.result()
+            except Exception as e:
+                logger.error(f"Inference failed for batch item {index}: {e}")
+                metrics.ERRORS.labels(stage="inference").inc()
+                results[index] = {"error": str(e)}
+                continue
+
+            log_processed(record, translated, outputs["emotion"], outputs["sentiment"])
+            max_data = build_result(outputs["emotion"], outputs["sentiment"])
+            latest_results = max_data
+            publish_result(max_data, record, translated)
+
+            results[index] = {
+                'user': record.get("user"),
+                'server': record.get("server"),
+                'channel': record.get("channel"),
+                'ts': record.get("ts"),
+                **max_data,
+            }
+
+        return jsonify({"results": results}), 201
+    except Exception as e:
+        logger.error(f"Error processing batch request: {e}")
+        metrics.ERRORS.labels(stage="receive_batch").inc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({"status": "alive", "phase": startup_state['phase']}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: models are loaded and warmed up"""
+    status = 200 if startup_state['phase'] == 'ready' else 503
+    return jsonify(startup_state), status
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    body, content_type = metrics.render_latest()
+    return Response(body, content_type=content_type)
+
+@app.route('/debug/profiler', methods=['GET', 'POST'])
+@local_only
+def debug_profiler():
+    """GET: top sampled stacks (?format=collapsed for flame graphs); POST {"enabled": bool, "interval_ms": n}"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get("enabled"):
+            interval_ms = data.get("interval_ms")
+            if interval_ms is not None and (isinstance(interval_ms, bool)
+                                            or not isinstance(interval_ms, (int, float)) or interval_ms <= 0):
+                return jsonify({"error": "interval_ms must be a positive number"}), 400
+            profiler.start(interval=interval_ms / 1000.0 if interval_ms else None)
+        else:
+            profiler.stop()
+    if request.args.get("format") == "collapsed":
+        return Response(profiler.collapsed(), content_type="text/plain")
+    try:
+        top = int(request.args.get("top", 50))
+    except ValueError:
+        return jsonify({"error": "top must be an integer"}), 400
+    return jsonify(profiler.report(top=top)), 200
+
+@app.route('/logging', methods=['GET', 'POST'])
+@local_only
+def logging_settings():
+    """GET current settings; POST {"level": "DEBUG", "logger": optional name, "sample_rate": 0.1}"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            if "level" in data:
+                log_controller.set_level(data["level"], data.get("logger"))
+            if "sample_rate" in data:
+                log_controller.set_sample_rate(data["sample_rate"])
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(log_controller.stats()), 200
+
+@app.route('/inference/stats', methods=['GET'])
+def inference_stats():
+    return jsonify(batcher.stats()), 200
+
+@app.route('/pipeline/stats', methods=['GET'])
+def pipeline_stats():
+    return jsonify(pipeline.stats()), 200
+
+@app.route('/workers/stats', methods=['GET'])
+def workers_stats():
+    if worker_pool is None:
+        return jsonify({"workers": 0}), 200
+    return jsonify(worker_pool.stats()), 200
+
+@app.route('/cascade/stats', methods=['GET'])
+def cascade_stats():
+    if cascade is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **cascade.stats()}), 200
+
+@app.route('/broadcast/stats', methods=['GET'])
+def broadcast_stats():
+    return jsonify(broadcaster.stats()), 200
+
+@app.route('/aggregates', methods=['GET'])
+def aggregates_overall():
+    """Global rolling mood; ?window=1m|5m|1h for one window"""
+    try:
+        windows = aggregator.overall(request.args.get("window"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"windows": windows, "stats": aggregator.stats()}), 200
+
+@app.route('/aggregates/<kind>', methods=['GET'])
+def aggregates_top(kind):
+    """Channels/users/servers ranked by ?sort=count or a label's mean, e.g. ?sort=negative&window=5m"""
+    if kind not in KINDS:
+        return jsonify({"error": f"Unknown kind '{kind}' (expected one of {', '.join(KINDS)})"}), 404
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 1000))
+        rows = aggregator.top(kind, request.args.get("window", "5m"),
+                              sort_by=request.args.get("sort", "count"), limit=limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"results": rows}), 200
+
+@app.route('/aggregates/<kind>/<path:name>', methods=['GET'])
+def aggregates_query(kind, name):
+    """Rolling mood of one channel/user/server (URL-encode '#' as %23)"""
+    if kind not in KINDS:
+        return jsonify({"error": f"Unknown kind '{kind}' (expected one of {', '.join(KINDS)})"}), 404
+    try:
+        windows = aggregator.query(kind, name, request.args.get("window"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if windows is None:
+        return jsonify({"error": f"No recent messages for {kind} '{name}'"}), 404
+    return jsonify({kind: name, "windows": windows}), 200
+
+@app.route('/history', methods=['GET'])
+def history_query():
+    """Stream stored results as NDJSON.
+
+    ?start=&end= (unix seconds), ?user=&channel=&server=, ?limit= (0 = up to
+    HISTORY_MAX_QUERY_ROWS), ?after_ts=&after_id= (the last row's ts and id) to
+    resume, ?probs=false to skip vectors. Rows come in (ts, id) order.
+    """
+    if history is None:
+        return jsonify({"error": "History is disabled"}), 404
+    try:
+        start = float(request.args["start"]) if "start" in request.args else None
+        end = float(request.args["end"]) if "end" in request.args else None
+        limit = int(request.args.get("limit", 1000))
+        after = None
+        if "after_ts" in request.args or "after_id" in request.args:
+            after = (float(request.args["after_ts"]), int(request.args["after_id"]))
+    except KeyError as e:
+        return jsonify({"error": f"after_ts and after_id must be given together, missing {e}"}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+    if limit <= 0 or limit > HISTORY_MAX_QUERY_ROWS:
+        limit = HISTORY_MAX_QUERY_ROWS
+    rows = history.query(
+        start=start, end=end, limit=limit, after=after,
+        probs=request.args.get("probs", "true").lower() != "false",
+        offload=tpool.execute,
+        **{key: request.args.get(key) for key in FILTERS},
+    )
+    return Response(stream_with_context(to_ndjson(rows)), mimetype='application/x-ndjson')
+
+@app.route('/history/stats', methods=['GET'])
+def history_stats():
+    if history is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify(history.stats()), 200
+
+@app.route('/translation/stats', methods=['GET'])
+def translation_stats():
+    return jsonify(translator.stats()), 200
+
 if __name__ == '__main__':
     logger.info("Starting sentiment-api on port 6000...")
+    threading.Thread(target=load_models_in_background, name="model-startup", daemon=True).start()
+    if PROFILER_ENABLED:
+        profiler.start()
+    broadcaster.start()
     try:
         # Test if we can bind to the port
         test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -234,7 +726,7 @@ if __name__ == '__main__':
         
         # Start the server
         logger.info("Starting Flask-SocketIO server...")
-        socketio.run(app, host='0.0.0.0', port=6000, debug=True, use_reloader=False)
+        socketio.run(app, host='0.0.0.0', port=6000, debug=API_DEBUG, use_reloader=False)
     except Exception as e:
         logger.error(f"Failed to start server: {e}")
         raise
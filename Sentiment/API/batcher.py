@@ -0,0 +1,224 @@
+import hashlib
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Case-fold and collapse whitespace so trivially different lines share a cache key."""
+    return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+
+def result_sizeof(key, value):
+    """Rough memory footprint of one cached {model: [{label, score}, ...]} entry."""
+    size = sys.getsizeof(key) + sys.getsizeof(value)
+    for probas in value.values():
+        size += sys.getsizeof(probas)
+        for proba in probas:
+            size += sys.getsizeof(proba) + sys.getsizeof(proba['label']) + sys.getsizeof(proba['score'])
+    return size
+
+
+class InferenceBatcher:
+    """Collects single-message requests into dynamic batches for the models.
+
+    Callers submit one text at a time and get a Future back. A background
+    worker drains the queue into batches bounded by ``max_batch_size`` and
+    ``max_wait_ms``, runs every model once per batch and resolves each
+    Future with that text's ``{name: [{label, score}, ...]}`` result.
+
+    With a ``cache`` (an LRUCache), results are keyed on a hash of the
+    normalized text plus ``cache_namespace`` and repeated texts are answered
+    without reaching the models.
+
+    ``runner``, if given, replaces the in-process model calls: it receives
+    the batch's texts and returns ``{name: outputs}`` (e.g. an inference
+    worker pool). ``concurrency`` sets how many batches may be in flight.
+
+    If a batch fails, its texts are retried one at a time so an input the
+    models choke on fails only its own Future.
+    """
+
+    def __init__(self, models, max_batch_size=16, max_wait_ms=10, stats_window=1000,
+                 cache=None, cache_namespace="", runner=None, concurrency=1):
+        self.models = models
+        self.runner = runner
+        self.concurrency = max(1, int(concurrency))
+        self.cache = cache
+        self.cache_namespace = cache_namespace
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms) / 1000.0)
+        self._queue = queue.Queue()
+        self._running = False
+        self._workers = []
+
+        # Rolling statistics for tuning batch size against latency
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._batch_latencies = deque(maxlen=stats_window)
+        self._total_batches = 0
+        self._total_items = 0
+
+    def start(self):
+        """Start the background batching worker."""
+        if self._running:
+            return
+        self._running = True
+        for i in range(self.concurrency):
+            worker = threading.Thread(target=self._run, name=f"inference-batcher-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"Inference batcher started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait * 1000:.1f}, concurrency={self.concurrency})")
+
+    def stop(self, timeout=5):
+        """Stop the worker; pending requests are failed."""
+        self._running = False
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("Inference batcher stopped"))
+
+    def submit(self, text):
+        """Queue a text for inference and return a Future for its result."""
+        future = Future()
+        if not isinstance(text, str):
+            future.set_exception(TypeError(f"Expected a str to analyse, got {type(text).__name__}"))
+            return future
+        if not self._running:
+            future.set_exception(RuntimeError("Inference batcher is not running"))
+            return future
+        if self.cache is not None:
+            cached = self.cache.get(self.cache_key(text))
+            if cached is not None:
+                future.set_result(cached)
+                return future
+        self._queue.put((text, future))
+        return future
+
+    def cache_key(self, text):
+        normalized = normalize_text(text)
+        return hashlib.sha1(f"{self.cache_namespace}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def infer(self, text, timeout=None):
+        """Blocking helper returning the per-model results for one text."""
+        return self.submit(text).result(timeout=timeout)
+
+    def infer_many(self, texts, timeout=None):
+        """Queue several texts at once and wait for all of their results."""
+        futures = [self.submit(text) for text in texts]
+        return [f.result(timeout=timeout) for f in futures]
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _collect_batch(self):
+        """Block for the first item, then gather more until full or the wait window closes."""
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            self._process(batch)
+
+    def run_models(self, texts):
+        """Run every in-process model once over ``texts``."""
+        return {name: model(texts, batch_size=len(texts)) for name, model in self.models.items()}
+
+    def _process(self, batch):
+        texts = [text for text, _ in batch]
+        start = time.perf_counter()
+        try:
+            outputs = (self.runner or self.run_models)(texts)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Inference failed for one message: {e}")
+                batch[0][1].set_exception(e)
+                return
+            logger.error(f"Batch inference failed for {len(texts)} messages, retrying one by one: {e}")
+            for item in batch:
+                self._process([item])
+            return
+        elapsed = time.perf_counter() - start
+
+        for i, (text, future) in enumerate(batch):
+            result = {name: output[i] for name, output in outputs.items()}
+            if self.cache is not None:
+                self.cache.put(self.cache_key(text), result)
+            future.set_result(result)
+
+        with self._stats_lock:
+            self._batch_sizes.append(len(batch))
+            self._batch_latencies.append(elapsed)
+            self._total_batches += 1
+            self._total_items += len(batch)
+
+    def stats(self):
+        """Achieved batch sizes, queue depth and per-batch latency over the recent window."""
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            latencies = sorted(self._batch_latencies)
+            total_batches = self._total_batches
+            total_items = self._total_items
+
+        def percentile(values, pct):
+            if not values:
+                return 0.0
+            index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+            return values[index]
+
+        return {
+            'cache': self.cache.stats() if self.cache is not None else None,
+            'config': {
+                'concurrency': self.concurrency,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+            },
+            'queue_depth': self.queue_depth(),
+            'total_batches': total_batches,
+            'total_items': total_items,
+            'batch_size': {
+                'mean': sum(sizes) / len(sizes) if sizes else 0.0,
+                'max': max(sizes) if sizes else 0,
+                'last': sizes[-1] if sizes else 0,
+            },
+            'batch_latency_ms': {
+                'p50': percentile(latencies, 50) * 1000,
+                'p95': percentile(latencies, 95) * 1000,
+                'p99': percentile(latencies, 99) * 1000,
+                'max': (latencies[-1] if latencies else 0.0) * 1000,
+            },
+        }
@@ -0,0 +1,221 @@
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Every client starts here, so dashboards that never subscribe still see everything
+ALL_ROOM = "all"
+
+
+def channel_room(channel):
+    return f"channel:{channel}"
+
+
+def user_room(user):
+    return f"user:{user}"
+
+
+def server_room(server):
+    return f"server:{server}"
+
+
+def subscription_rooms(data):
+    """Rooms named by a ``subscribe`` payload: ``{"channels": [...], "users": [...], "servers": [...], "all": bool}``."""
+    if not isinstance(data, dict):
+        raise ValueError("Expected an object with channels, users, servers or all")
+    rooms = []
+    for key, room_for in (("channels", channel_room), ("users", user_room), ("servers", server_room)):
+        values = data.get(key) or []
+        if isinstance(values, str):
+            values = [values]
+        rooms.extend(room_for(value) for value in values if value)
+    if data.get("all"):
+        rooms.append(ALL_ROOM)
+    return rooms
+
+
+class Preserialized:
+    """An event payload encoded to JSON once and spliced verbatim into every packet carrying it."""
+
+    __slots__ = ("raw",)
+
+    def __init__(self, payload):
+        self.raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _encode(obj, kwargs):
+    if isinstance(obj, Preserialized):
+        return obj.raw
+    if isinstance(obj, list):
+        return "[" + ",".join(_encode(item, kwargs) for item in obj) + "]"
+    return json.dumps(obj, **kwargs)
+
+
+class PreserializedJSON:
+    """``json`` module for python-socketio (``SocketIO(json=...)``) that understands Preserialized."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return _encode(obj, kwargs)
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return json.loads(s, *args, **kwargs)
+
+
+class Broadcaster:
+    """Fans analysed results out to Socket.IO rooms.
+
+    Each event is encoded once and addressed to ``ALL_ROOM`` plus the rooms of
+    its channel, user and server; Socket.IO sends it once per subscribed
+    client however many of those rooms the client is in.
+
+    Room membership is mirrored here through ``join``/``leave``/``disconnect``
+    (called next to Flask-SocketIO's ``join_room``/``leave_room``), so events
+    for rooms nobody is in are skipped without reading Socket.IO internals.
+
+    With ``interval`` 0 every event is emitted immediately as ``event``.
+    Otherwise events are queued per room and a flusher emits, every
+    ``interval`` seconds, one ``batch_event`` frame per group of clients
+    subscribed to the same rooms, holding each queued event once and in
+    publish order. A room keeps at most ``max_batch`` events between
+    flushes; older ones are dropped first.
+    """
+
+    def __init__(self, socketio, event="sentiment_event", batch_event="sentiment_batch",
+                 interval=0.0, max_batch=500, namespace="/"):
+        self.socketio = socketio
+        self.event = event
+        self.batch_event = batch_event
+        self.interval = max(0.0, float(interval))
+        self.max_batch = max(1, int(max_batch))
+        self.namespace = namespace
+        self._pending = {}
+        self._sequence = itertools.count()
+        self._members = {}    # room -> set of session ids
+        self._sessions = {}   # session id -> set of rooms
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self.published = 0
+        self.frames = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._running or not self.interval:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="broadcast-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"Broadcast coalescing every {self.interval * 1000:.0f}ms (max_batch={self.max_batch})")
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2 + 1)
+            self._thread = None
+        self.flush()
+
+    def rooms_for(self, record):
+        rooms = [ALL_ROOM]
+        if record.get("channel"):
+            rooms.append(channel_room(record["channel"]))
+        if record.get("user"):
+            rooms.append(user_room(record["user"]))
+        if record.get("server"):
+            rooms.append(server_room(record["server"]))
+        return rooms
+
+    def join(self, sid, rooms):
+        with self._lock:
+            joined = self._sessions.setdefault(sid, set())
+            for room in rooms:
+                joined.add(room)
+                self._members.setdefault(room, set()).add(sid)
+
+    def leave(self, sid, rooms):
+        with self._lock:
+            joined = self._sessions.get(sid, set())
+            for room in rooms:
+                joined.discard(room)
+                members = self._members.get(room)
+                if members is not None:
+                    members.discard(sid)
+                    if not members:
+                        del self._members[room]
+
+    def disconnect(self, sid):
+        with self._lock:
+            rooms = self._sessions.pop(sid, ())
+        self.leave(sid, rooms)
+
+    def _occupied(self, rooms):
+        with self._lock:
+            return [room for room in rooms if room in self._members]
+
+    def publish(self, payload, record):
+        """Send ``payload`` to every room ``record`` (a {user, channel, server} dict) belongs to."""
+        self.published += 1
+        rooms = self._occupied(self.rooms_for(record))
+        if not rooms:
+            return
+        event = Preserialized(payload)
+        if not self.interval:
+            self.socketio.emit(self.event, event, to=rooms, namespace=self.namespace)
+            return
+        with self._lock:
+            entry = (next(self._sequence), event)
+            for room in rooms:
+                pending = self._pending.get(room)
+                if pending is None:
+                    pending = self._pending[room] = deque(maxlen=self.max_batch)
+                elif len(pending) == self.max_batch:
+                    self.dropped += 1
+                pending.append(entry)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            # Clients subscribed to the same pending rooms share one frame
+            groups = {}
+            for sid, rooms in self._sessions.items():
+                key = frozenset(room for room in rooms if room in pending)
+                if key:
+                    groups.setdefault(key, []).append(sid)
+        for rooms, sids in groups.items():
+            if len(rooms) == 1:
+                events = [event for _, event in pending[next(iter(rooms))]]
+            else:
+                # An event queued in several of these rooms is sent once
+                merged = dict(entry for room in rooms for entry in pending[room])
+                events = [merged[seq] for seq in sorted(merged)]
+            self.socketio.emit(self.batch_event, events, to=sids, namespace=self.namespace)
+            self.frames += 1
+
+    def _run(self):
+        while self._running:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Broadcast flush failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            queued = sum(len(events) for events in self._pending.values())
+            rooms = {room: len(members) for room, members in self._members.items()}
+        return {
+            'mode': 'coalesced' if self.interval else 'immediate',
+            'interval_ms': self.interval * 1000,
+            'max_batch': self.max_batch,
+            'published': self.published,
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'queued': queued,
+            'clients': len(self._sessions),
+            'rooms': rooms,
+        }
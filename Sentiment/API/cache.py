@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe bounded LRU cache with optional TTL and JSON persistence.
+
+    Values must be JSON-serialisable if the cache is persisted to disk. When
+    ``sizeof`` is given it is called once per stored entry to keep a running
+    estimate of the cache's memory footprint.
+    """
+
+    def __init__(self, max_size=10000, ttl=None, path=None, sizeof=None):
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self.path = path
+        self.sizeof = sizeof
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+        if self.path:
+            self.load()
+
+    def get(self, key):
+        """Return the cached value or None, refreshing its recency on a hit."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl is None or time.time() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value, time.time())
+            while len(self._data) > self.max_size:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _store(self, key, value, stored_at):
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (value, stored_at)
+        if self.sizeof:
+            size = self.sizeof(key, value)
+            self._sizes[key] = size
+            self.bytes += size
+
+    def _remove(self, key):
+        del self._data[key]
+        self.bytes -= self._sizes.pop(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def load(self):
+        """Load entries from ``path``, skipping any that have already expired."""
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load cache from {self.path}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, value, stored_at in entries[-self.max_size:]:
+                if self.ttl is None or now - stored_at < self.ttl:
+                    self._store(key, value, stored_at)
+        logger.info(f"Loaded {len(self._data)} cache entries from {self.path}")
+
+    def save(self):
+        """Atomically write entries to ``path`` in LRU order."""
+        if not self.path:
+            return
+        with self._lock:
+            entries = [[key, value, stored_at] for key, (value, stored_at) in self._data.items()]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not persist cache to {self.path}: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'approx_bytes': self.bytes if self.sizeof else None,
+        }
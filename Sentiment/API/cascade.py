@@ -0,0 +1,413 @@
+"""Model cascade: a cheap first-pass classifier answers the messages it is sure about,
+everything else goes on to the transformer pipelines.
+
+Two first-pass classifiers are available:
+
+* ``lexicon`` -- built-in chat lexicon, emoticon and emoji table; no training,
+  sure of itself only on short lines made of words it knows ("lol", "gg",
+  "brb", "😂", "ugh").
+* a ``.npz`` file -- a linear model over hashed word and character n-grams,
+  distilled from the transformers' own outputs with ``cascade.py train``.
+
+A message takes the fast path when its confidence reaches the threshold and
+it has at most ``max_tokens`` words; the fast result has the same
+``[{label, score}, ...]`` shape as the pipelines' top_k=3 output.
+
+    python3 cascade.py evaluate --corpus lines.txt --thresholds 0.6 0.8 0.9
+    python3 cascade.py train --history /root/.cache/history.db --output /root/.cache/cascade.npz
+    python3 cascade.py evaluate --history /root/.cache/history.db --classifier /root/.cache/cascade.npz
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from collections import Counter
+
+from translation import ENGLISH_WORDS
+
+logger = logging.getLogger(__name__)
+
+# Label sets of EMOTION_MODEL and SENTIMENT_MODEL
+LABELS = {
+    'emotion': ("anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"),
+    'sentiment': ("NEG", "NEU", "POS"),
+}
+NEUTRAL = {'emotion': "neutral", 'sentiment': "NEU"}
+TOP_K = 3
+
+_LEXICON = {
+    ("joy", "POS"): """lol lmao lmfao rofl haha hahaha hehe heh xd nice cool great awesome amazing love
+        loved lovely thanks thank thx ty tyvm gg wp congrats congratulations yay woohoo glad happy fun
+        funny excellent perfect good best beautiful wonderful enjoy sweet""",
+    ("neutral", "NEU"): """hi hey hello yo sup ok okay k kk yes yep yeah brb afk bbl back bye cya gn gm
+        morning night np sure hmm hm ah oh alright""",
+    ("sadness", "NEG"): """sad rip unfortunately sorry miss cry crying depressed lonely tired sigh bad
+        terrible awful worst horrible""",
+    ("anger", "NEG"): """wtf angry hate hated furious annoying annoyed stupid damn dammit ffs fuck fucking
+        shit mad pissed""",
+    ("disgust", "NEG"): "ugh eww ew gross disgusting yuck nasty",
+    ("fear", "NEG"): "scared afraid fear worried nervous terrified anxious panic",
+    ("surprise", "NEU"): "wow whoa woah omg surprised unexpected",
+}
+_SYMBOLS = {
+    ("joy", "POS"): "😀 😃 😄 😁 😆 😂 🤣 😊 🙂 😍 🥰 😘 👍 🎉 ❤ ♥ 💕 🙌 👏 😎 :) :-) :D :-D =) ;) ;-) <3 xD XD",
+    ("sadness", "NEG"): "😢 😭 😞 😔 ☹ 🙁 💔 :( :-( :'( </3",
+    ("anger", "NEG"): "😡 😠 🤬 👎",
+    ("disgust", "NEG"): "🤢 🤮 😒 🙄",
+    ("fear", "NEG"): "😱 😨 😰 😬",
+    ("surprise", "NEU"): "😮 😲 😯 🤯 😳 :O :o :-O",
+    ("neutral", "NEU"): "😐 😶 🤔 👀 :/ :| :P :p",
+}
+LEXICON = {word: labels for labels, words in _LEXICON.items() for word in words.split()}
+SYMBOLS = {symbol: labels for labels, symbols in _SYMBOLS.items() for symbol in symbols.split()}
+NEGATORS = frozenset("""not no never dont don't didnt didn't isnt isn't cant can't wont won't nothing
+    neither nor without""".split())
+
+_EMOTICON_RE = re.compile(r"(?<!\S)(?:[:;=][-']?[()DPpOo/|]|</?3|[xX]D)(?!\S)")
+_WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)*")
+
+
+def _distribution(model, counts):
+    """Top-k ``[{label, score}]`` from label vote counts, lightly smoothed."""
+    labels = LABELS[model]
+    total = sum(counts.values()) + 0.05 * len(labels)
+    scores = sorted(((counts.get(label, 0) + 0.05) / total, label) for label in labels)
+    return [{'label': label, 'score': score} for score, label in reversed(scores[-TOP_K:])]
+
+
+class LexiconClassifier:
+    """Word/emoticon/emoji votes; confidence is vote agreement times the share of words it recognises."""
+
+    name = "lexicon"
+
+    def __init__(self, neutral_confidence=0.85):
+        self.neutral_confidence = neutral_confidence
+
+    def classify(self, text):
+        """``({model: [{label, score}, ...]}, confidence)`` for one message."""
+        votes = [SYMBOLS[symbol] for symbol in _EMOTICON_RE.findall(text) if symbol in SYMBOLS]
+        rest = _EMOTICON_RE.sub(" ", text)
+        unknown = 0
+        for char in rest:
+            if char in SYMBOLS:
+                votes.append(SYMBOLS[char])
+            elif unicodedata.category(char) == "So":
+                unknown += 1  # an emoji we have no opinion on
+        symbols = len(votes) + unknown
+        words = _WORD_RE.findall(rest.lower())
+        negated = False
+        for word in words:
+            if word in LEXICON:
+                votes.append(LEXICON[word])
+            elif word in NEGATORS:
+                negated = True
+            elif word.replace("'", "") not in ENGLISH_WORDS:
+                unknown += 1
+        tokens = len(words) + symbols
+        coverage = 1.0 - unknown / tokens if tokens else 1.0
+
+        if not votes:
+            # "ok?" is neutral; a sentence of common words we have no opinion on may not be
+            counts = {model: {NEUTRAL[model]: 1} for model in LABELS}
+            confidence = coverage * self.neutral_confidence * min(1.0, 2 / len(words)) if words \
+                else coverage * self.neutral_confidence
+        elif negated:
+            # "not bad", "don't love it": leave polarity flips to the transformers
+            counts = {model: {NEUTRAL[model]: 1} for model in LABELS}
+            confidence = 0.0
+        else:
+            counts = {'emotion': Counter(emotion for emotion, _ in votes),
+                      'sentiment': Counter(sentiment for _, sentiment in votes)}
+            agreement = min(max(c.values()) / len(votes) for c in counts.values())
+            confidence = coverage * agreement
+        return {model: _distribution(model, counts[model]) for model in LABELS}, confidence
+
+    def predict(self, texts):
+        return [self.classify(text) for text in texts]
+
+
+class HashedNgramClassifier:
+    """Softmax regression per model over hashed word uni/bigrams and character trigrams.
+
+    Trained on the transformers' probabilities (``fit``), so it learns to
+    imitate them; confidence is the lower of the two heads' top probability.
+    """
+
+    name = "ngram"
+
+    def __init__(self, dim=2 ** 18, weights=None, biases=None):
+        import numpy as np
+        self.np = np
+        self.dim = int(dim)
+        self.weights = weights or {model: np.zeros((self.dim, len(labels)), dtype=np.float32)
+                                   for model, labels in LABELS.items()}
+        self.biases = biases or {model: np.zeros(len(labels), dtype=np.float32) for model, labels in LABELS.items()}
+
+    def features(self, text):
+        words = _WORD_RE.findall(text.lower()) + _EMOTICON_RE.findall(text)
+        words += [char for char in text if unicodedata.category(char) == "So"]
+        keys = [f"w:{word}" for word in words]
+        keys += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"^{word}$"
+            keys += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        if not keys:
+            keys = ["empty"]
+        return self.np.unique(self.np.fromiter((zlib.crc32(key.encode("utf-8")) % self.dim for key in keys),
+                                               dtype=self.np.int64, count=len(keys)))
+
+    def _probabilities(self, model, index):
+        np = self.np
+        logits = self.weights[model][index].sum(axis=0) / np.sqrt(len(index)) + self.biases[model]
+        logits = np.exp(logits - logits.max())
+        return logits / logits.sum()
+
+    def classify(self, text):
+        index = self.features(text)
+        result, confidence = {}, 1.0
+        for model, labels in LABELS.items():
+            probs = self._probabilities(model, index)
+            order = probs.argsort()[::-1][:TOP_K]
+            result[model] = [{'label': labels[i], 'score': float(probs[i])} for i in order]
+            confidence = min(confidence, float(probs[order[0]]))
+        return result, confidence
+
+    def predict(self, texts):
+        return [self.classify(text) for text in texts]
+
+    def fit(self, texts, targets, epochs=5, learning_rate=0.5, seed=0):
+        """SGD on cross-entropy against ``targets`` (``{model: [[{label, score}, ...], ...]}``)."""
+        np = self.np
+        rows = [self.features(text) for text in texts]
+        dense = {}
+        for model, labels in LABELS.items():
+            position = {label: i for i, label in enumerate(labels)}
+            matrix = np.zeros((len(texts), len(labels)), dtype=np.float32)
+            for row, probas in enumerate(targets[model]):
+                for proba in probas:
+                    matrix[row, position[proba['label']]] = proba['score']
+            dense[model] = matrix / np.maximum(matrix.sum(axis=1, keepdims=True), 1e-9)
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            rate = learning_rate / (1 + epoch)
+            for row in rng.permutation(len(rows)):
+                index = rows[row]
+                scale = 1.0 / np.sqrt(len(index))
+                for model in LABELS:
+                    grad = self._probabilities(model, index) - dense[model][row]
+                    self.weights[model][index] -= (rate * scale * grad).astype(np.float32)
+                    self.biases[model] -= (rate * 0.1 * grad).astype(np.float32)
+        return self
+
+    def save(self, path):
+        arrays = {f"weights_{model}": w for model, w in self.weights.items()}
+        arrays.update({f"bias_{model}": b for model, b in self.biases.items()})
+        with open(path, "wb") as f:
+            self.np.savez_compressed(f, dim=self.dim, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        with np.load(path) as data:
+            return cls(int(data["dim"]),
+                       weights={model: data[f"weights_{model}"] for model in LABELS},
+                       biases={model: data[f"bias_{model}"] for model in LABELS})
+
+
+def create_fast_classifier(spec="lexicon"):
+    """``lexicon`` or the path of a model saved by ``cascade.py train``."""
+    if spec == LexiconClassifier.name:
+        return LexiconClassifier()
+    if spec.endswith(".npz"):
+        return HashedNgramClassifier.load(spec)
+    raise ValueError(f"Unknown cascade classifier: {spec} (expected 'lexicon' or a .npz path)")
+
+
+class ModelCascade:
+    """Batch runner (``runner(texts) -> {model: outputs}``) that only sends uncertain texts to ``full``.
+
+    ``full`` is the runner it falls back to (in-process pipelines or the
+    worker pool) and may be attached after construction.
+    """
+
+    def __init__(self, fast, full=None, threshold=0.8, max_tokens=8):
+        self.fast = fast
+        self.full = full
+        self.threshold = threshold
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.escalated = 0
+        self.fast_seconds = 0.0
+        self.full_seconds = 0.0
+
+    def __call__(self, texts):
+        start = time.perf_counter()
+        outputs = {model: [None] * len(texts) for model in LABELS}
+        candidates = [i for i, text in enumerate(texts)
+                      if not self.max_tokens or len(text.split()) <= self.max_tokens]
+        accepted = set()
+        for i, (result, confidence) in zip(candidates, self.fast.predict([texts[i] for i in candidates])):
+            if confidence >= self.threshold:
+                accepted.add(i)
+                for model in LABELS:
+                    outputs[model][i] = result[model]
+        escalate = [i for i in range(len(texts)) if i not in accepted]
+        fast_done = time.perf_counter()
+
+        if escalate:
+            full = self.full([texts[i] for i in escalate])
+            for model, results in full.items():
+                column = outputs.setdefault(model, [None] * len(texts))
+                for j, i in enumerate(escalate):
+                    column[i] = results[j]
+
+        with self._lock:
+            self.messages += len(texts)
+            self.escalated += len(escalate)
+            self.fast_seconds += fast_done - start
+            self.full_seconds += time.perf_counter() - fast_done if escalate else 0.0
+        return outputs
+
+    def stats(self):
+        with self._lock:
+            return {
+                'classifier': self.fast.name,
+                'threshold': self.threshold,
+                'max_tokens': self.max_tokens,
+                'messages': self.messages,
+                'fast_path': self.messages - self.escalated,
+                'escalated': self.escalated,
+                'escalation_rate': self.escalated / self.messages if self.messages else 0.0,
+                'fast_seconds': round(self.fast_seconds, 3),
+                'full_seconds': round(self.full_seconds, 3),
+            }
+
+
+def load_labelled(args):
+    """Texts plus the transformers' outputs for them, from a history database or by running the models."""
+    if args.history:
+        from history import HistoryStore
+        store = HistoryStore(args.history)
+        texts, reference = [], {model: [] for model in LABELS}
+        for row in store.query(limit=args.limit, probs=True):
+            texts.append(row['translated'] or row['message'] or "")
+            for model in LABELS:
+                probas = sorted(row[f"{model}_probs"].items(), key=lambda item: item[1], reverse=True)
+                reference[model].append([{'label': label, 'score': score} for label, score in probas])
+        return texts, reference, None
+
+    from compare_backends import SAMPLE_CORPUS, run
+    from models import EMOTION_MODEL, SENTIMENT_MODEL, load_model
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8", errors="replace") as f:
+            texts = [line.strip() for line in f if line.strip()][:args.limit or None]
+    else:
+        texts = SAMPLE_CORPUS
+    reference, elapsed = {}, 0.0
+    for model, model_name in (('emotion', EMOTION_MODEL), ('sentiment', SENTIMENT_MODEL)):
+        pipeline = load_model(model_name, backend=args.backend)
+        start = time.perf_counter()
+        reference[model] = run(pipeline, texts, args.batch_size)
+        elapsed += time.perf_counter() - start
+    return texts, reference, len(texts) / elapsed if elapsed > 0 else None
+
+
+def evaluate(fast, texts, reference, threshold, max_tokens):
+    """Escalation rate and top-1 agreement with ``reference`` of the cascade at one threshold."""
+    predictions = fast.predict(texts)
+    agree = {model: 0 for model in LABELS}
+    fast_agree = {model: 0 for model in LABELS}
+    accepted = 0
+    for i, (result, confidence) in enumerate(predictions):
+        if confidence < threshold or (max_tokens and len(texts[i].split()) > max_tokens):
+            for model in LABELS:
+                agree[model] += 1  # escalated messages get the full models' answer
+            continue
+        accepted += 1
+        for model in LABELS:
+            hit = result[model][0]['label'] == reference[model][i][0]['label']
+            agree[model] += hit
+            fast_agree[model] += hit
+    total = len(texts) or 1
+    escalation = 1 - accepted / total
+    report = {
+        'threshold': threshold,
+        'escalation_rate': escalation,
+        'agreement': {model: count / total for model, count in agree.items()},
+        'fast_path_agreement': {model: count / accepted if accepted else None for model, count in fast_agree.items()},
+    }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("evaluate", "train"))
+    parser.add_argument("--corpus", help="Text file with one message per line, labelled by running the models "
+                                         "(default: built-in sample)")
+    parser.add_argument("--history", help="History database whose stored results serve as labels instead")
+    parser.add_argument("--limit", type=int, default=0, help="Use at most this many messages (0 = all)")
+    parser.add_argument("--backend", default="torch", help="Backend for labelling a --corpus")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--classifier", default="lexicon", help="evaluate: 'lexicon' or a trained .npz")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[0.5, 0.6, 0.7, 0.8, 0.9])
+    parser.add_argument("--max-tokens", type=int, default=8)
+    parser.add_argument("--min-agreement", type=float, default=0.0,
+                        help="evaluate: exit non-zero if agreement at any threshold falls below this")
+    parser.add_argument("--output", help="train: where to save the model (.npz)")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--holdout", type=float, default=0.1, help="train: share of messages kept for evaluation")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    texts, reference, full_msgs_per_sec = load_labelled(args)
+    logger.info(f"{len(texts)} labelled messages")
+
+    if args.command == "train":
+        if not args.output or not args.output.endswith(".npz"):
+            parser.error("train needs --output ending in .npz")
+        split = len(texts) - int(len(texts) * args.holdout)
+        start = time.perf_counter()
+        fast = HashedNgramClassifier().fit(texts[:split], {m: r[:split] for m, r in reference.items()},
+                                           epochs=args.epochs)
+        logger.info(f"Trained on {split} messages in {time.perf_counter() - start:.1f}s")
+        fast.save(args.output)
+        texts, reference = texts[split:], {m: r[split:] for m, r in reference.items()}
+    else:
+        fast = create_fast_classifier(args.classifier)
+
+    start = time.perf_counter()
+    fast.predict(texts)
+    elapsed = time.perf_counter() - start
+    fast_msgs_per_sec = len(texts) / elapsed if elapsed > 0 else None
+
+    results = [evaluate(fast, texts, reference, threshold, args.max_tokens)
+               for threshold in args.thresholds]
+    if full_msgs_per_sec and fast_msgs_per_sec:
+        for result in results:
+            # Every message pays for the fast pass; escalated ones pay for the models too
+            per_message = 1 / fast_msgs_per_sec + result['escalation_rate'] / full_msgs_per_sec
+            result['estimated_msgs_per_sec'] = 1 / per_message
+            result['estimated_speedup'] = 1 / (per_message * full_msgs_per_sec)
+    report = {
+        'classifier': fast.name,
+        'messages': len(texts),
+        'max_tokens': args.max_tokens,
+        'fast_msgs_per_sec': fast_msgs_per_sec,
+        'full_msgs_per_sec': full_msgs_per_sec,
+        'thresholds': results,
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    ok = all(min(r['agreement'].values()) >= args.min_agreement for r in results)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
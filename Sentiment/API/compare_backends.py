@@ -0,0 +1,117 @@
+"""Accuracy-parity and throughput comparison between inference backends.
+
+Runs the emotion and sentiment models under each backend on the same corpus
+and reports, relative to the PyTorch path, how often the top label agrees,
+the largest per-label score difference, and messages/sec per batch size.
+
+    python3 compare_backends.py --backends torch onnx onnx-int8 --corpus lines.txt
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+from models import EMOTION_MODEL, SENTIMENT_MODEL, INFERENCE_BACKENDS, load_model
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_CORPUS = [
+    "hello everyone, good morning!",
+    "this is the worst day ever",
+    "lol that was hilarious",
+    "I'm so scared about the exam tomorrow",
+    "why does nothing ever work in this channel",
+    "thanks a lot, you really helped me",
+    "meh, whatever",
+    "I can't believe they cancelled the show, I'm furious",
+    "gg wp",
+    "what a wonderful surprise, I love it",
+    "the server went down again",
+    "I miss you all so much",
+]
+
+
+def run(model, texts, batch_size):
+    outputs = []
+    for i in range(0, len(texts), batch_size):
+        chunk = texts[i:i + batch_size]
+        outputs.extend(model(chunk, batch_size=len(chunk)))
+    return outputs
+
+
+def parity(reference, candidate):
+    """Top-label agreement and score drift of ``candidate`` against ``reference`` outputs."""
+    agree = 0
+    max_diff = 0.0
+    total_diff = 0.0
+    count = 0
+    for ref, cand in zip(reference, candidate):
+        agree += ref[0]['label'] == cand[0]['label']
+        cand_scores = {p['label']: p['score'] for p in cand}
+        for p in ref:
+            diff = abs(p['score'] - cand_scores.get(p['label'], 0.0))
+            max_diff = max(max_diff, diff)
+            total_diff += diff
+            count += 1
+    return {
+        'top1_agreement': agree / len(reference) if reference else 0.0,
+        'max_score_diff': max_diff,
+        'mean_score_diff': total_diff / count if count else 0.0,
+    }
+
+
+def throughput(model, texts, batch_size, repeats):
+    run(model, texts[:batch_size], batch_size)  # warmup
+    start = time.perf_counter()
+    for _ in range(repeats):
+        run(model, texts, batch_size)
+    elapsed = time.perf_counter() - start
+    return len(texts) * repeats / elapsed if elapsed > 0 else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=list(INFERENCE_BACKENDS), choices=INFERENCE_BACKENDS)
+    parser.add_argument("--corpus", help="Text file with one message per line (default: built-in sample)")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-agreement", type=float, default=0.0,
+                        help="Exit non-zero if any backend's top-1 agreement falls below this")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = SAMPLE_CORPUS
+
+    backends = list(dict.fromkeys(["torch"] + args.backends))
+    report = {}
+    ok = True
+    for model_name in (EMOTION_MODEL, SENTIMENT_MODEL):
+        reference = None
+        report[model_name] = {}
+        for backend in backends:
+            model = load_model(model_name, backend=backend)
+            outputs = run(model, texts, max(args.batch_sizes))
+            if reference is None:
+                reference = outputs
+            entry = {
+                'parity': parity(reference, outputs),
+                'msgs_per_sec': {str(bs): throughput(model, texts, bs, args.repeats) for bs in args.batch_sizes},
+            }
+            if entry['parity']['top1_agreement'] < args.min_agreement:
+                ok = False
+            report[model_name][backend] = entry
+            logger.info(f"{model_name} [{backend}]: {json.dumps(entry)}")
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
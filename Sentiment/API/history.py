@@ -0,0 +1,291 @@
+import json
+import logging
+import sqlite3
+import struct
+import time
+
+# The writer must be a real OS thread: SQLite calls would otherwise block eventlet's hub
+try:
+    from eventlet.patcher import original
+    os_threading = original('threading')
+    os_queue = original('queue')
+except ImportError:
+    import threading as os_threading
+    import queue as os_queue
+
+logger = logging.getLogger(__name__)
+
+MODELS = ("emotion", "sentiment")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    server TEXT,
+    channel TEXT,
+    user TEXT,
+    message TEXT,
+    translated TEXT,
+    emotion TEXT,
+    sentiment TEXT,
+    emotion_probs BLOB,
+    sentiment_probs BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (ts);
+CREATE INDEX IF NOT EXISTS idx_messages_user_ts ON messages (user, ts);
+CREATE INDEX IF NOT EXISTS idx_messages_channel_ts ON messages (channel, ts);
+CREATE TABLE IF NOT EXISTS labels (
+    model TEXT NOT NULL,
+    label TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    PRIMARY KEY (model, label)
+);
+"""
+
+FILTERS = ("user", "channel", "server")
+
+_structs = {}
+
+
+def _float32(n):
+    """Cached packer for a float32 vector of length ``n``."""
+    packer = _structs.get(n)
+    if packer is None:
+        packer = _structs[n] = struct.Struct(f"<{n}f")
+    return packer
+
+
+class HistoryStore:
+    """Append-only SQLite log of every analysed message.
+
+    ``record()`` only enqueues; a background OS thread writes rows in
+    transactions of up to ``batch_size`` (or every ``flush_interval``
+    seconds). Probabilities are stored as float32 vectors indexed by a
+    per-model label table, so a row costs a few bytes per label instead
+    of a JSON object. When the queue is full new rows are dropped and
+    counted rather than slowing the request path.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0, queue_size=100000, retention_days=0):
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.retention = retention_days * 86400 if retention_days else 0
+        self._queue = os_queue.Queue(maxsize=queue_size)
+        self._labels = {model: {} for model in MODELS}
+        self._names = {model: [] for model in MODELS}  # idx -> label, append-only
+        self._labels_lock = os_threading.Lock()
+        self._thread = None
+        self._running = False
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+            for model, label, idx in db.execute("SELECT model, label, idx FROM labels ORDER BY idx"):
+                self._labels.setdefault(model, {})[label] = idx
+                self._names.setdefault(model, []).append(label)
+        finally:
+            db.close()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = os_threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"History store writing to {self.path} (batch_size={self.batch_size})")
+
+    def stop(self, timeout=5):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def flush(self):
+        """Block until every queued row has been written (or dropped on error)."""
+        self._queue.join()
+
+    def last_id(self):
+        db = self._connect()
+        try:
+            return db.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+        finally:
+            db.close()
+
+    def discard_after(self, row_id):
+        """Delete rows newer than ``row_id`` (e.g. written after a replay's last checkpoint)."""
+        db = self._connect()
+        try:
+            with db:
+                return db.execute("DELETE FROM messages WHERE id > ?", (row_id,)).rowcount
+        finally:
+            db.close()
+
+    def record(self, record, translated, emotion, sentiment):
+        """Queue one analysed message for writing; never blocks."""
+        ts = record.get("ts")
+        row = (
+            ts if isinstance(ts, (int, float)) else time.time(),
+            record.get("server"),
+            record.get("channel"),
+            record.get("user"),
+            record.get("message"),
+            translated,
+            emotion,
+            sentiment,
+        )
+        try:
+            self._queue.put_nowait(row)
+        except os_queue.Full:
+            self.dropped += 1
+
+    def _vector(self, db, model, probas):
+        labels = self._labels[model]
+        for proba in probas:
+            if proba['label'] not in labels:
+                with self._labels_lock:
+                    labels[proba['label']] = len(labels)
+                    self._names[model].append(proba['label'])
+                db.execute("INSERT OR IGNORE INTO labels (model, label, idx) VALUES (?, ?, ?)",
+                           (model, proba['label'], labels[proba['label']]))
+        vector = [0.0] * len(labels)
+        for proba in probas:
+            vector[labels[proba['label']]] = proba['score']
+        return _float32(len(vector)).pack(*vector)
+
+    def _write(self, db, rows):
+        with db:
+            db.executemany(
+                "INSERT INTO messages (ts, server, channel, user, message, translated, emotion, sentiment,"
+                " emotion_probs, sentiment_probs) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(ts, server, channel, user, message, translated,
+                  emotion[0]['label'] if emotion else None,
+                  sentiment[0]['label'] if sentiment else None,
+                  self._vector(db, "emotion", emotion),
+                  self._vector(db, "sentiment", sentiment))
+                 for ts, server, channel, user, message, translated, emotion, sentiment in rows])
+        self.written += len(rows)
+        self.batches += 1
+
+    def _prune(self, db):
+        with db:
+            deleted = db.execute("DELETE FROM messages WHERE ts < ?", (time.time() - self.retention,)).rowcount
+        if deleted:
+            logger.info(f"History retention removed {deleted} rows")
+
+    def _run(self):
+        db = self._connect()
+        last_prune = 0.0
+        try:
+            while self._running or not self._queue.empty():
+                rows = []
+                try:
+                    rows.append(self._queue.get(timeout=self.flush_interval))
+                except os_queue.Empty:
+                    pass
+                while rows and len(rows) < self.batch_size:
+                    try:
+                        rows.append(self._queue.get_nowait())
+                    except os_queue.Empty:
+                        break
+                if rows:
+                    try:
+                        self._write(db, rows)
+                    except sqlite3.Error as e:
+                        self.dropped += len(rows)
+                        logger.error(f"History write of {len(rows)} rows failed: {e}")
+                    for _ in rows:
+                        self._queue.task_done()
+                if self.retention and time.time() - last_prune > 3600:
+                    last_prune = time.time()
+                    self._prune(db)
+        finally:
+            db.close()
+
+    def _decode(self, model, blob):
+        scores = _float32(len(blob) // 4).unpack(blob)
+        return {label: round(score, 6) for label, score in zip(self._names[model], scores) if score}
+
+    def _read_chunk(self, cursor, size, probs):
+        items = []
+        for row in cursor.fetchmany(size):
+            item = {
+                'id': row[0], 'ts': row[1], 'server': row[2], 'channel': row[3], 'user': row[4],
+                'message': row[5], 'translated': row[6], 'emotion': row[7], 'sentiment': row[8],
+            }
+            if probs:
+                item['emotion_probs'] = self._decode("emotion", row[9])
+                item['sentiment_probs'] = self._decode("sentiment", row[10])
+            items.append(item)
+        return items
+
+    def query(self, start=None, end=None, limit=1000, after=None, probs=True, chunk_size=5000,
+              offload=None, **filters):
+        """Yield rows as dicts in (ts, id) order, filtered by time range and user/channel/server.
+
+        Rows come straight off the ts, (user, ts) or (channel, ts) index, which
+        SQLite keeps in (ts, id) order, so a limited query never sorts the
+        whole match first (as ``ORDER BY id`` would; ids of backfilled rows
+        are not in time order either). ``after`` is the (ts, id) of the last
+        row already read and resumes a previous scan.
+
+        Runs on a private read connection (WAL lets it proceed alongside the
+        writer). ``offload(func, *args)``, if given, runs each blocking SQLite
+        step elsewhere (e.g. tpool.execute).
+        """
+        run = offload or (lambda func, *args: func(*args))
+        where, params = [], []
+        if after is not None:
+            where.append("(ts, id) > (?, ?)")
+            params.extend(after)
+        if start is not None:
+            where.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("ts < ?")
+            params.append(end)
+        for key in FILTERS:
+            if filters.get(key):
+                where.append(f"{key} = ?")
+                params.append(filters[key])
+        sql = ("SELECT id, ts, server, channel, user, message, translated, emotion, sentiment"
+               + (", emotion_probs, sentiment_probs" if probs else "")
+               + f" FROM messages WHERE {' AND '.join(where) or '1'} ORDER BY ts, id")
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        db = self._connect()
+        try:
+            cursor = run(db.execute, sql, params)
+            while True:
+                items = run(self._read_chunk, cursor, chunk_size, probs)
+                if not items:
+                    return
+                yield from items
+        finally:
+            db.close()
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'queue_depth': self._queue.qsize(),
+            'labels': {model: len(labels) for model, labels in self._labels.items()},
+        }
+
+
+def to_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
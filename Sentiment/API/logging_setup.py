@@ -0,0 +1,137 @@
+import json
+import logging
+import logging.handlers
+import random
+import sys
+
+# The listener must run on an OS thread with an unpatched queue so stdout
+# writes never stall eventlet's hub
+try:
+    from eventlet.patcher import original
+    os_threading = original('threading')
+    os_queue = original('queue')
+except ImportError:
+    import threading as os_threading
+    import queue as os_queue
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; structured fields passed as ``extra={'fields': {...}}``."""
+
+    def format(self, record):
+        entry = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic format, with structured fields appended as compact JSON."""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line = f"{line} {json.dumps(fields, ensure_ascii=False, default=str)}"
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only ``rate`` of the records logged with ``extra={'sample': True}``.
+
+    Records without the flag (errors, audit records) always pass.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, 'sample', False) and self.rate < 1.0:
+            return random.random() < self.rate
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener without formatting them; drops when the queue is full."""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread, not on the request path
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except os_queue.Full:
+            self.dropped += 1
+
+
+class OSThreadQueueListener(logging.handlers.QueueListener):
+    def start(self):
+        self._thread = os_threading.Thread(target=self._monitor, name="log-listener", daemon=True)
+        self._thread.start()
+
+
+class LoggingController:
+    """Owns the queue-backed logging setup and its runtime-adjustable knobs."""
+
+    def __init__(self, level="INFO", fmt="text", sample_rate=1.0, queue_size=10000, stream=None):
+        self.queue = os_queue.Queue(maxsize=queue_size)
+        self.handler = NonBlockingQueueHandler(self.queue)
+        self.sampler = SamplingFilter(sample_rate)
+        self.handler.addFilter(self.sampler)
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter(LOG_FORMAT))
+        self.listener = OSThreadQueueListener(self.queue, output)
+        self.format = fmt
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(self.handler)
+        self.set_level(level)
+        self.listener.start()
+
+    def set_level(self, level, logger_name=None):
+        """Set a level by name (DEBUG, INFO, ...) on the root logger or ``logger_name``."""
+        name = level.upper() if isinstance(level, str) else None
+        if name not in logging._nameToLevel:
+            raise ValueError(f"Unknown log level: {level!r} (expected one of {', '.join(logging._nameToLevel)})")
+        if logger_name is not None and not isinstance(logger_name, str):
+            raise ValueError("logger must be a logger name")
+        logging.getLogger(logger_name).setLevel(logging._nameToLevel[name])
+
+    def set_sample_rate(self, rate):
+        self.sampler.rate = max(0.0, min(1.0, float(rate)))
+
+    def stop(self):
+        self.listener.stop()
+
+    def stats(self):
+        return {
+            'level': logging.getLevelName(logging.getLogger().level),
+            'format': self.format,
+            'sample_rate': self.sampler.rate,
+            'queue_depth': self.queue.qsize(),
+            'dropped': self.handler.dropped,
+        }
+
+
+def configure_logging(level="INFO", fmt="text", sample_rate=1.0, queue_size=10000):
+    """Route all logging through a bounded queue drained by a background thread."""
+    return LoggingController(level=level, fmt=fmt, sample_rate=sample_rate, queue_size=queue_size)
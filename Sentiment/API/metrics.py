@@ -0,0 +1,138 @@
+import time
+from functools import wraps
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram('sentiment_request_duration_seconds',
+                            'HTTP request handling time',
+                            ['endpoint'], buckets=LATENCY_BUCKETS)
+TRANSLATION_LATENCY = Histogram('sentiment_translation_duration_seconds',
+                                'Time to translate one message (cache hits included)',
+                                buckets=LATENCY_BUCKETS)
+INFERENCE_LATENCY = Histogram('sentiment_inference_batch_duration_seconds',
+                              'Time to run one model over one batch',
+                              ['model'], buckets=LATENCY_BUCKETS)
+INFERENCE_BATCH_SIZE = Histogram('sentiment_inference_batch_size',
+                                 'Messages per inference batch',
+                                 buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+EMIT_LATENCY = Histogram('sentiment_emit_duration_seconds',
+                         'Time to emit one Socket.IO event',
+                         buckets=LATENCY_BUCKETS)
+ERRORS = Counter('sentiment_errors_total',
+                 'Errors by processing stage',
+                 ['stage'])
+SOCKETIO_CLIENTS = Gauge('sentiment_socketio_clients',
+                         'Currently connected Socket.IO clients')
+
+
+def timed(histogram):
+    """Decorator observing a function's wall time on ``histogram``."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def timed_model(name, model):
+    """Wrap a pipeline callable so each batch is observed under ``model=name``."""
+    histogram = INFERENCE_LATENCY.labels(model=name)
+
+    def run(texts, **kwargs):
+        start = time.perf_counter()
+        try:
+            return model(texts, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+            INFERENCE_BATCH_SIZE.observe(1 if isinstance(texts, str) else len(texts))
+    return run
+
+
+class ComponentCollector:
+    """Exports the counters the batcher, pipeline, caches, broadcaster, history and cascade already keep,
+    read at scrape time.
+
+    Components are looked up through ``sources`` (name -> zero-arg callable
+    returning the object or None) so they can be swapped after registration.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    def _get(self, name):
+        getter = self.sources.get(name)
+        return getter() if getter else None
+
+    def collect(self):
+        hits = CounterMetricFamily('sentiment_cache_hits', 'Cache hits', labels=['cache'])
+        misses = CounterMetricFamily('sentiment_cache_misses', 'Cache misses', labels=['cache'])
+        entries = GaugeMetricFamily('sentiment_cache_entries', 'Entries held in cache', labels=['cache'])
+        queue_depth = GaugeMetricFamily('sentiment_queue_depth', 'Items waiting in a queue', labels=['queue'])
+        drops = CounterMetricFamily('sentiment_dropped', 'Messages dropped, rejected or degraded under load',
+                                    labels=['reason'])
+        skipped = CounterMetricFamily('sentiment_translation_skipped',
+                                      'Messages not sent to the translator because they looked English')
+        cascaded = CounterMetricFamily('sentiment_cascade_messages',
+                                       'Messages answered by the cascade classifier or escalated to the models',
+                                       labels=['path'])
+
+        translator = self._get('translator')
+        if translator is not None:
+            stats = translator.stats()
+            hits.add_metric(['translation'], stats['cache']['hits'])
+            misses.add_metric(['translation'], stats['cache']['misses'])
+            entries.add_metric(['translation'], stats['cache']['size'])
+            skipped.add_metric([], stats['skipped_english'])
+
+        batcher = self._get('batcher')
+        if batcher is not None:
+            queue_depth.add_metric(['inference'], batcher.queue_depth())
+            if batcher.cache is not None:
+                stats = batcher.cache.stats()
+                hits.add_metric(['results'], stats['hits'])
+                misses.add_metric(['results'], stats['misses'])
+                entries.add_metric(['results'], stats['size'])
+
+        pipeline = self._get('pipeline')
+        if pipeline is not None:
+            stats = pipeline.stats()
+            for stage, stage_stats in stats['stages'].items():
+                queue_depth.add_metric([f"pipeline_{stage}"], stage_stats['queue_depth'])
+            for reason in ('dropped', 'rejected', 'degraded', 'failed'):
+                drops.add_metric([reason], stats[reason])
+
+        broadcaster = self._get('broadcaster')
+        if broadcaster is not None:
+            drops.add_metric(['broadcast_coalesced'], broadcaster.dropped)
+
+        history = self._get('history')
+        if history is not None:
+            queue_depth.add_metric(['history'], history.stats()['queue_depth'])
+            drops.add_metric(['history'], history.dropped)
+
+        cascade = self._get('cascade')
+        if cascade is not None:
+            stats = cascade.stats()
+            cascaded.add_metric(['fast'], stats['fast_path'])
+            cascaded.add_metric(['escalated'], stats['escalated'])
+
+        yield from (hits, misses, entries, queue_depth, drops, skipped, cascaded)
+
+
+def register_component_collector(sources):
+    collector = ComponentCollector(sources)
+    REGISTRY.register(collector)
+    return collector
+
+
+def render_latest():
+    """Body and content type for a /metrics response."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
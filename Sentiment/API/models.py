@@ -0,0 +1,211 @@
+import logging
+import os
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+
+import torch
+from transformers import pipeline
+
+logger = logging.getLogger(__name__)
+
+# Create persistent cache directory
+CACHE_DIR = Path(os.getenv("CACHE_DIR", "/root/.cache"))
+
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+SENTIMENT_MODEL = "finiteautomata/bertweet-base-sentiment-analysis"
+
+INFERENCE_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Synthetic messages pushed through each model before serving traffic
+WARMUP_TEXTS = [
+    "warming up the model",
+    "this is a slightly longer warmup message so buffers for longer inputs get allocated too",
+    "ok",
+    "great, thanks!",
+]
+
+# Ensure cache directory exists and has proper permissions
+def setup_cache_directory():
+    try:
+        # Create cache directory if it doesn't exist
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        
+        # Set permissions to ensure writability
+        os.chmod(CACHE_DIR, 0o777)
+        
+        logger.info(f"Cache directory set up at {CACHE_DIR}")
+    except Exception as e:
+        logger.error(f"Failed to set up cache directory: {e}")
+        raise
+
+# Model loading must run on OS threads even when eventlet has patched `threading`
+try:
+    from eventlet.patcher import original
+    os_threading = original('threading')
+except ImportError:
+    os_threading = threading
+
+# Global cache for models
+model_cache = {}
+model_lock = os_threading.Lock()
+model_load_locks = {}
+
+def is_model_cached(model_name):
+    """True when the checkpoint's files are already in CACHE_DIR"""
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return False
+    found = try_to_load_from_cache(model_name, "config.json", cache_dir=str(CACHE_DIR))
+    return isinstance(found, str)
+
+def retry_on_failure(max_retries=3, delay=1):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            last_exception = None
+            for attempt in range(max_retries):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    last_exception = e
+                    logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
+                    if attempt < max_retries - 1:
+                        time.sleep(delay)
+            raise last_exception
+        return wrapper
+    return decorator
+
+@retry_on_failure(max_retries=3, delay=2)
+def load_model(model_name, task="text-classification", top_k=3, backend="torch", local_first=True):
+    """Load a model with caching and optimized settings"""
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    cache_key = (model_name, backend)
+    # model_lock only guards the bookkeeping so different models can load concurrently
+    with model_lock:
+        if cache_key in model_cache:
+            logger.info(f"Using cached model: {model_name} ({backend})")
+            return model_cache[cache_key]
+        load_lock = model_load_locks.setdefault(cache_key, os_threading.Lock())
+
+    with load_lock:
+        if cache_key in model_cache:
+            return model_cache[cache_key]
+
+        logger.info(f"Loading model: {model_name} ({backend})")
+        try:
+            os.environ['HF_HUB_DOWNLOAD_TIMEOUT'] = '300'  # 5 minutes timeout
+            
+            # Configure cache settings
+            os.environ['TRANSFORMERS_CACHE'] = str(CACHE_DIR)
+            os.environ['HF_HOME'] = str(CACHE_DIR)
+
+            # Skip the hub round trips entirely when the files are already local
+            local_only = local_first and is_model_cached(model_name)
+            logger.info(f"Loading {model_name} from {'local cache' if local_only else 'the hub'}")
+            
+            if backend == "torch":
+                # Load model with simplified settings
+                model = pipeline(
+                    task=task,
+                    model=model_name,
+                    device=0 if torch.cuda.is_available() else -1,
+                    top_k=top_k,
+                    model_kwargs={
+                        "cache_dir": str(CACHE_DIR),
+                        "local_files_only": local_only
+                    }
+                )
+            else:
+                from onnx_backend import load_onnx_pipeline
+                model = load_onnx_pipeline(
+                    model_name,
+                    task=task,
+                    top_k=top_k,
+                    quantize=(backend == "onnx-int8"),
+                    cache_dir=CACHE_DIR,
+                    local_files_only=local_only,
+                )
+            
+            # Cache the model
+            with model_lock:
+                model_cache[cache_key] = model
+            logger.info(f"Successfully loaded and cached model: {model_name}")
+            return model
+            
+        except Exception as e:
+            logger.error(f"Failed to load model {model_name}: {str(e)}")
+            raise
+
+def load_models_sequential(backend="torch", local_first=True):
+    """Load models sequentially with better error handling"""
+    try:
+        logger.info("Starting model loading...")
+        
+        # Define models to load
+        models_to_load = [
+            (EMOTION_MODEL, "emotion"),
+            (SENTIMENT_MODEL, "sentiment")
+        ]
+        
+        results = {}
+        for model_name, name in models_to_load:
+            try:
+                logger.info(f"Loading {name} model...")
+                results[name] = load_model(model_name, backend=backend, local_first=local_first)
+                logger.info(f"{name} model loaded successfully")
+            except Exception as e:
+                logger.error(f"Failed to load {name} model: {e}")
+                raise
+            
+        logger.info("All models loaded successfully")
+        return results["emotion"], results["sentiment"]
+    except Exception as e:
+        logger.error(f"Failed to load models: {e}")
+        raise
+
+def load_models_parallel(backend="torch", local_first=True):
+    """Load both models concurrently, returning (emotion, sentiment, seconds per model)"""
+    logger.info("Starting parallel model loading...")
+
+    def timed_load(model_name):
+        start = time.perf_counter()
+        model = load_model(model_name, backend=backend, local_first=local_first)
+        return model, time.perf_counter() - start
+
+    results = {}
+
+    def worker(name, model_name):
+        try:
+            results[name] = timed_load(model_name)
+        except Exception as e:
+            results[name] = e
+
+    loaders = [
+        os_threading.Thread(target=worker, args=(name, model_name), name=f"model-loader-{name}", daemon=True)
+        for name, model_name in (("emotion", EMOTION_MODEL), ("sentiment", SENTIMENT_MODEL))
+    ]
+    for loader in loaders:
+        loader.start()
+    for loader in loaders:
+        loader.join()
+
+    for name, outcome in results.items():
+        if isinstance(outcome, Exception):
+            logger.error(f"Failed to load {name} model: {outcome}")
+            raise outcome
+    emotion, emo_seconds = results["emotion"]
+    sentiment, sent_seconds = results["sentiment"]
+
+    logger.info("All models loaded successfully")
+    return emotion, sentiment, {'emotion': emo_seconds, 'sentiment': sent_seconds}
+
+def warmup_models(models, texts=WARMUP_TEXTS):
+    """Run a synthetic batch through each model so first requests don't pay for lazy init"""
+    for name, model in models.items():
+        start = time.perf_counter()
+        model(list(texts), batch_size=len(texts))
+        logger.info(f"Warmed up {name} model in {time.perf_counter() - start:.2f}s")
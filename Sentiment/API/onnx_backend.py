@@ -0,0 +1,77 @@
+import logging
+import platform
+from pathlib import Path
+
+from transformers import AutoTokenizer, pipeline
+
+logger = logging.getLogger(__name__)
+
+ONNX_FILE = "model.onnx"
+QUANTIZED_FILE = "model_quantized.onnx"
+
+
+def _require_optimum():
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    except ImportError as e:
+        raise ImportError(
+            "The ONNX inference backend needs optimum[onnxruntime]: install "
+            "requirements-onnx.txt (INSTALL_ONNX=true when building the image) "
+            "or set INFERENCE_BACKEND=torch"
+        ) from e
+    return ORTModelForSequenceClassification, ORTQuantizer, AutoQuantizationConfig
+
+
+def export_dir(model_name, cache_dir, quantize=False):
+    """Where the exported (and optionally quantized) artifacts for a model live."""
+    variant = "int8" if quantize else "fp32"
+    return Path(cache_dir) / "onnx" / model_name.replace("/", "--") / variant
+
+
+def _quantization_config(AutoQuantizationConfig):
+    """Dynamic int8 config matching the host CPU (the Raspberry Pi fleet is arm64)."""
+    if platform.machine().lower() in ("aarch64", "arm64"):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+
+def export_model(model_name, cache_dir, quantize=False, local_files_only=False):
+    """Export a Hugging Face checkpoint to ONNX under ``cache_dir``, reusing earlier exports."""
+    ORTModel, ORTQuantizer, AutoQuantizationConfig = _require_optimum()
+
+    fp32_dir = export_dir(model_name, cache_dir)
+    if not (fp32_dir / ONNX_FILE).exists():
+        logger.info(f"Exporting {model_name} to ONNX at {fp32_dir}")
+        model = ORTModel.from_pretrained(model_name, export=True, cache_dir=str(cache_dir),
+                                         local_files_only=local_files_only)
+        tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=str(cache_dir),
+                                                  local_files_only=local_files_only)
+        model.save_pretrained(fp32_dir)
+        tokenizer.save_pretrained(fp32_dir)
+
+    if not quantize:
+        return fp32_dir, ONNX_FILE
+
+    int8_dir = export_dir(model_name, cache_dir, quantize=True)
+    if not (int8_dir / QUANTIZED_FILE).exists():
+        logger.info(f"Quantizing {model_name} to int8 at {int8_dir}")
+        quantizer = ORTQuantizer.from_pretrained(fp32_dir, file_name=ONNX_FILE)
+        quantizer.quantize(save_dir=int8_dir, quantization_config=_quantization_config(AutoQuantizationConfig))
+        AutoTokenizer.from_pretrained(fp32_dir).save_pretrained(int8_dir)
+    return int8_dir, QUANTIZED_FILE
+
+
+def load_onnx_pipeline(model_name, task="text-classification", top_k=3, quantize=False, cache_dir=".",
+                       local_files_only=False):
+    """Build a transformers pipeline backed by ONNX Runtime.
+
+    The pipeline returns the same ``[{label, score}, ...]`` lists as the
+    PyTorch one, so callers need not know which backend is in use.
+    """
+    ORTModel, _, _ = _require_optimum()
+    model_dir, file_name = export_model(model_name, cache_dir, quantize=quantize,
+                                        local_files_only=local_files_only)
+    model = ORTModel.from_pretrained(model_dir, file_name=file_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    return pipeline(task=task, model=model, tokenizer=tokenizer, top_k=top_k)
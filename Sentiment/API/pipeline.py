@@ -0,0 +1,273 @@
+import logging
+import queue
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_POLICIES = ("drop_oldest", "reject", "degrade")
+
+
+class PipelineOverloaded(Exception):
+    """Raised when a job is refused because the pipeline queues are full."""
+    pass
+
+
+class Stage:
+    """A pool of worker threads reading jobs from one bounded queue.
+
+    ``handler`` receives a list of up to ``batch_size`` jobs and returns the
+    jobs to pass on to ``next_stage`` (or None to pass on nothing). Puts into
+    the next stage block, so a slow stage pushes back on the one before it.
+    If ``handler`` raises, ``on_error(jobs, error)`` is told which jobs were lost.
+    """
+
+    def __init__(self, name, handler, workers=1, maxsize=1000, batch_size=1, on_error=None):
+        self.name = name
+        self.handler = handler
+        self.on_error = on_error
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.next_stage = None
+        self.processed = 0
+        self.errors = 0
+        self.dropped = 0
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _take(self):
+        jobs = [self.queue.get()]
+        while len(jobs) < self.batch_size:
+            try:
+                jobs.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._take()
+            try:
+                out = self.handler(jobs)
+            except Exception as e:
+                logger.error(f"Pipeline stage {self.name} failed on {len(jobs)} jobs: {e}")
+                with self._lock:
+                    self.errors += len(jobs)
+                if self.on_error is not None:
+                    try:
+                        self.on_error(jobs, e)
+                    except Exception as hook_error:
+                        logger.error(f"Pipeline stage {self.name} error hook failed: {hook_error}")
+                continue
+            with self._lock:
+                self.processed += len(jobs)
+            if self.next_stage and out:
+                for job in out:
+                    self.next_stage.queue.put(job)
+
+    def drop_oldest(self):
+        """Remove and return the oldest queued job (None if the queue is empty)."""
+        try:
+            job = self.queue.get_nowait()
+        except queue.Empty:
+            return None
+        with self._lock:
+            self.dropped += 1
+        return job
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'processed': self.processed,
+            'errors': self.errors,
+            'dropped': self.dropped,
+        }
+
+
+class AnalysisPipeline:
+    """ingest -> translate -> infer -> publish, with bounded queues in between.
+
+    ``submit()`` is the ingest step: it assigns a job id and enqueues the job
+    without waiting for any model work. When the translate queue is full the
+    configured overload policy decides what happens:
+
+    - ``drop_oldest``: discard the oldest queued job to make room
+    - ``reject``: raise PipelineOverloaded (the API answers 429)
+    - ``degrade``: skip translation and hand the job straight to inference
+
+    ``submit_many()`` admits a whole batch at once: under ``reject`` and
+    ``degrade`` either every record is queued or none is, so a client
+    retrying a refused batch never duplicates part of it.
+
+    A job whose stage fails is passed to ``fail(job, error)``, so whoever
+    holds its job id can be told it will never get a result.
+
+    Stage workers are plain threads (green threads under eventlet), so the
+    callables must not block the process themselves: ``translate`` and
+    ``infer_many`` are expected to hand their blocking work to OS threads,
+    as the caching translator and the batcher's models do in the API.
+    """
+
+    def __init__(self, translate, infer_many, publish, policy="reject",
+                 queue_size=1000, translate_workers=4, infer_workers=1,
+                 publish_workers=1, infer_batch_size=16, fail=None):
+        if policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy}")
+        self.policy = policy
+        self._translate = translate
+        self._infer_many = infer_many
+        self._publish = publish
+        self._fail = fail
+        self.dropped = 0
+        self.rejected = 0
+        self.degraded = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._admit_lock = threading.Lock()
+
+        self.translate_stage = Stage("translate", self._translate_jobs, translate_workers, queue_size,
+                                     on_error=self._fail_jobs)
+        self.infer_stage = Stage("infer", self._infer_jobs, infer_workers, queue_size, infer_batch_size,
+                                 on_error=self._fail_jobs)
+        self.publish_stage = Stage("publish", self._publish_jobs, publish_workers, queue_size,
+                                   on_error=self._fail_jobs)
+        self.translate_stage.next_stage = self.infer_stage
+        self.infer_stage.next_stage = self.publish_stage
+        self.stages = (self.translate_stage, self.infer_stage, self.publish_stage)
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        logger.info(f"Analysis pipeline started (policy={self.policy})")
+
+    def submit(self, record):
+        """Enqueue a {user, message, ...} record and return its job id."""
+        with self._admit_lock:
+            return self._submit(record)
+
+    def submit_many(self, records):
+        """Enqueue several records and return their job ids, in order."""
+        capacity = self.translate_stage.queue.maxsize
+        if len(records) > capacity:
+            raise ValueError(f"Batch of {len(records)} exceeds the pipeline queue size ({capacity})")
+        with self._admit_lock:
+            # Nothing else enqueues into the translate queue, so its free space can only grow
+            # until the batch is in (under degrade, translate workers may still fill the infer queue)
+            if self.policy != "drop_oldest" and self._free_slots() < len(records):
+                self._count("rejected", len(records))
+                raise PipelineOverloaded("Pipeline queues are full")
+            return [self._submit(record) for record in records]
+
+    def admit(self, count, backlog):
+        """Apply the overload policy to ``count`` jobs handled outside the queues.
+
+        For synchronous callers that translate and infer themselves while
+        ``backlog`` jobs already wait for inference. Returns True if the jobs
+        should skip translation (``degrade``); raises PipelineOverloaded when
+        they must be refused. ``drop_oldest`` refuses too, since there is no
+        queued job of the caller's to drop.
+        """
+        capacity = self.translate_stage.queue.maxsize
+        if count > capacity:
+            raise ValueError(f"Batch of {count} exceeds the pipeline queue size ({capacity})")
+        if backlog + count <= capacity:
+            return False
+        if self.policy == "degrade":
+            self._count("degraded", count)
+            return True
+        self._count("rejected", count)
+        raise PipelineOverloaded("Inference backlog is full")
+
+    def _free_slots(self):
+        """Jobs that can be admitted right now without dropping any."""
+        stages = (self.translate_stage, self.infer_stage) if self.policy == "degrade" else (self.translate_stage,)
+        return sum(stage.queue.maxsize - stage.queue.qsize() for stage in stages)
+
+    def _submit(self, record):
+        job = dict(record)
+        job["job_id"] = uuid.uuid4().hex
+        try:
+            self.translate_stage.queue.put_nowait(job)
+            return job["job_id"]
+        except queue.Full:
+            pass
+
+        if self.policy == "drop_oldest":
+            self._drop_oldest(self.translate_stage)
+            try:
+                self.translate_stage.queue.put_nowait(job)
+            except queue.Full:
+                self._count("rejected")
+                raise PipelineOverloaded("Pipeline queues are full")
+        elif self.policy == "degrade":
+            job["translated"] = job.get("message")
+            try:
+                self.infer_stage.queue.put_nowait(job)
+            except queue.Full:
+                self._count("rejected")
+                raise PipelineOverloaded("Pipeline queues are full")
+            self._count("degraded")
+        else:
+            self._count("rejected")
+            raise PipelineOverloaded("Pipeline queues are full")
+        return job["job_id"]
+
+    def _drop_oldest(self, stage):
+        dropped = stage.drop_oldest()
+        if dropped is None:
+            return
+        logger.warning(f"Pipeline overloaded, dropping job {dropped['job_id']}")
+        self._count("dropped")
+        # Whoever holds the dropped job's id must hear that it will never finish
+        if self._fail is not None:
+            try:
+                self._fail(dropped, "dropped: overloaded")
+            except Exception as e:
+                logger.error(f"Pipeline fail hook failed for dropped job: {e}")
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def _fail_jobs(self, jobs, error):
+        with self._lock:
+            self.failed += len(jobs)
+        if self._fail is None:
+            return
+        for job in jobs:
+            self._fail(job, error)
+
+    def _translate_jobs(self, jobs):
+        for job in jobs:
+            job["translated"] = self._translate(job.get("message"))
+        return jobs
+
+    def _infer_jobs(self, jobs):
+        outputs = self._infer_many([job["translated"] for job in jobs])
+        for job, output in zip(jobs, outputs):
+            job["outputs"] = output
+        return jobs
+
+    def _publish_jobs(self, jobs):
+        for job in jobs:
+            self._publish(job)
+        return None
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'degraded': self.degraded,
+            'failed': self.failed,
+            'stages': {stage.name: stage.stats() for stage in self.stages},
+        }
@@ -0,0 +1,398 @@
+"""Offline replay/backfill of archived IRC logs through the emotion and sentiment models.
+
+Streams log files (or whole directory trees, in sorted order) line by line,
+runs the models over fixed-size batches, and writes results as NDJSON
+and/or into a history database (same schema as the API's /history), so
+memory stays bounded however large the archive is.
+
+    python3 replay.py logs/ --output results.ndjson --workers 4 --batch-size 64
+    python3 replay.py thelounge/logs --history /root/.cache/backfill.db --checkpoint backfill.json --resume
+
+Understood line formats: raw ``:nick!u@h PRIVMSG #chan :text``,
+``[YYYY-MM-DD HH:MM:SS] <nick> text`` (The Lounge, irssi, ZNC with or
+without a date) and WeeChat's ``YYYY-MM-DD HH:MM:SS<TAB>nick<TAB>text``.
+Other lines (joins, parts, topic changes) are skipped. When a line has no
+channel it comes from the file's directory (``.../<network>/<#channel>/<date>.log``)
+or ``--channel``; time-only timestamps take their date from the file name.
+Naive timestamps are read as UTC. Raw lines carry a time only in an IRCv3
+``@time=`` tag; lines with no time at all are left out of ``--history``
+(their NDJSON rows have ``ts: null``) unless ``--undated file`` dates them
+by the file name's date, or failing that its mtime.
+
+With ``--checkpoint`` the byte offset reached in each file is saved every
+``--checkpoint-every`` messages, once the results before it are on disk;
+``--resume`` continues from there and discards any output written past it.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from batcher import normalize_text
+from cache import LRUCache
+from models import EMOTION_MODEL, SENTIMENT_MODEL, INFERENCE_BACKENDS, load_model
+from translation import TRANSLATOR_BACKENDS, create_translator
+
+logger = logging.getLogger(__name__)
+
+_RAW_RE = re.compile(r"^(?:@(?P<tags>\S+) )?:(?P<user>[^!\s]+)!\S+ PRIVMSG (?P<channel>\S+) :(?P<message>.*)$")
+_NICK_RE = re.compile(r"^(?:\[(?P<stamp>[^\]]+)\]|(?P<bare>\d{4}-\d\d-\d\d[T ][\d:.]+\S*))?\s*"
+                      r"<[@+%~&]?\s*(?P<user>[^>\s]+)>\s(?P<message>.*)$")
+_WEECHAT_RE = re.compile(r"^(?P<stamp>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\t[@+%~&]?(?P<user>[^\t\s]+)\t(?P<message>.*)$")
+_DATE_RE = re.compile(r"(\d{4})-?(\d\d)-?(\d\d)")
+_TIME_RE = re.compile(r"^(\d\d?):(\d\d)(?::(\d\d))?$")
+
+CHANNEL_PREFIXES = "#&!+"
+# WeeChat prefixes for join/part/network lines in the nick column
+_WEECHAT_SYSTEM = {"-->", "<--", "--", "=!=", "*", " *"}
+
+
+def parse_timestamp(stamp, day=None):
+    """Epoch seconds for a log timestamp; time-only stamps need ``day`` (a date)."""
+    if not stamp:
+        return None
+    stamp = stamp.strip()
+    match = _TIME_RE.match(stamp)
+    if match:
+        if day is None:
+            return None
+        hours, minutes, seconds = (int(part or 0) for part in match.groups())
+        return datetime(day.year, day.month, day.day, hours, minutes, seconds, tzinfo=timezone.utc).timestamp()
+    try:
+        parsed = datetime.fromisoformat(stamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _tag_time(tags):
+    """Epoch seconds from an IRCv3 ``time`` tag, if the raw line has one."""
+    for tag in (tags or "").split(";"):
+        key, _, value = tag.partition("=")
+        if key == "time":
+            return parse_timestamp(value)
+    return None
+
+
+def parse_line(line, day=None):
+    """``{user, channel, message, ts}`` for a chat line, or None for anything else."""
+    match = _RAW_RE.match(line)
+    if match:
+        return {'user': match['user'], 'channel': match['channel'], 'message': match['message'],
+                'ts': _tag_time(match['tags'])}
+    match = _WEECHAT_RE.match(line)
+    if match:
+        if match['user'] in _WEECHAT_SYSTEM:
+            return None
+        return {'user': match['user'], 'channel': None, 'message': match['message'],
+                'ts': parse_timestamp(match['stamp'])}
+    match = _NICK_RE.match(line)
+    if match:
+        return {'user': match['user'], 'channel': None, 'message': match['message'],
+                'ts': parse_timestamp(match['stamp'] or match['bare'], day)}
+    return None
+
+
+def file_context(path, default_channel=None, default_server=None):
+    """(server, channel, day) implied by a log file's location and name."""
+    parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    channel, server = default_channel, default_server
+    if parent and parent[0] in CHANNEL_PREFIXES:
+        channel = parent
+        server = server or os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(path)))) or None
+    match = _DATE_RE.search(os.path.basename(path))
+    day = None
+    if match:
+        try:
+            day = datetime(int(match[1]), int(match[2]), int(match[3]))
+        except ValueError:
+            pass
+    return server, channel, day
+
+
+def iter_log_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if not name.startswith("."):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def file_timestamp(path, day):
+    """Fallback time for undated lines: the file name's date (UTC midnight), else the file's mtime."""
+    if day is not None:
+        return day.replace(tzinfo=timezone.utc).timestamp()
+    return os.path.getmtime(path)
+
+
+def iter_records(path, offset=0, default_channel=None, default_server=None, undated="skip"):
+    """Yield ``(end_offset, record)`` for every chat line in ``path`` past byte ``offset``."""
+    server, channel, day = file_context(path, default_channel, default_server)
+    fallback_ts = file_timestamp(path, day) if undated == "file" else None
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            offset += len(raw)
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            record = parse_line(line, day) if line else None
+            if record is None or not record['message'].strip():
+                continue
+            record['channel'] = record['channel'] or channel
+            record['server'] = server
+            if record['ts'] is None:
+                record['ts'] = fallback_ts
+            yield offset, record
+
+
+def iter_batches(files, checkpoint, batch_size, default_channel=None, default_server=None, undated="skip"):
+    """Yield ``(records, positions)``; ``positions`` is ``{path: end_offset}`` reached by the batch."""
+    batch, positions = [], {}
+    for path in files:
+        state = checkpoint['files'].get(path, {})
+        if state.get('done'):
+            continue
+        offset = state.get('offset', 0)
+        for offset, record in iter_records(path, offset, default_channel, default_server, undated):
+            batch.append(record)
+            positions[path] = offset
+            if len(batch) >= batch_size:
+                yield batch, positions
+                batch, positions = [], {}
+        positions[path] = None  # finished
+    if batch or positions:
+        yield batch, positions
+
+
+class Analyzer:
+    """Translate and classify batches, with a shared cache for lines seen before.
+
+    IRC logs repeat themselves ("lol", bot output, greetings), so cached lines
+    never reach the models. With ``workers`` the batches go to an
+    InferenceWorkerPool; otherwise both pipelines run in this process.
+    """
+
+    def __init__(self, backend="torch", workers=0, translate="none", cache_size=100000, local_first=True):
+        self.translator = create_translator(backend=translate, cache_size=cache_size)
+        self.cache = LRUCache(max_size=cache_size)
+        self.pool = None
+        self.models = None
+        if workers:
+            from worker_pool import InferenceWorkerPool
+            self.pool = InferenceWorkerPool(workers, backend=backend, local_first=local_first)
+            self.pool.start()
+        else:
+            self.models = {
+                'emotion': load_model(EMOTION_MODEL, backend=backend, local_first=local_first),
+                'sentiment': load_model(SENTIMENT_MODEL, backend=backend, local_first=local_first),
+            }
+
+    def _run(self, texts):
+        if self.pool is not None:
+            return self.pool.run(texts)
+        return {name: model(texts, batch_size=len(texts)) for name, model in self.models.items()}
+
+    def analyse(self, records):
+        """``(translated, emotion, sentiment)`` for each record, in order."""
+        translated = [self.translator.translate(record['message']) for record in records]
+        keys = [normalize_text(text) for text in translated]
+        results = [self.cache.get(key) for key in keys]
+        missing = {keys[i]: translated[i] for i, result in enumerate(results) if result is None}
+        if missing:
+            outputs = self._run(list(missing.values()))
+            fresh = {key: {name: outputs[name][index] for name in outputs} for index, key in enumerate(missing)}
+            for key, result in fresh.items():
+                self.cache.put(key, result)
+            results = [result if result is not None else fresh[keys[i]] for i, result in enumerate(results)]
+        return [(translated[i], result['emotion'], result['sentiment']) for i, result in enumerate(results)]
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.stop()
+
+
+def to_row(record, translated, emotion, sentiment):
+    """Same shape as a /history row."""
+    return {
+        'ts': record['ts'], 'server': record['server'], 'channel': record['channel'], 'user': record['user'],
+        'message': record['message'], 'translated': translated,
+        'emotion': emotion[0]['label'], 'sentiment': sentiment[0]['label'],
+        'emotion_probs': {p['label']: round(p['score'], 6) for p in emotion},
+        'sentiment_probs': {p['label']: round(p['score'], 6) for p in sentiment},
+    }
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'files': {}, 'messages': 0}
+
+
+def save_checkpoint(path, checkpoint):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def replay(args):
+    checkpoint = load_checkpoint(args.checkpoint) if args.resume else {'files': {}, 'messages': 0}
+    files = list(iter_log_files(args.paths))
+
+    output = None
+    if args.output:
+        output = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+        if args.resume and 'output_bytes' in checkpoint:
+            output.truncate(checkpoint['output_bytes'])  # drop rows written after the last checkpoint
+    history = None
+    if args.history:
+        from history import HistoryStore
+        history = HistoryStore(args.history, batch_size=max(args.batch_size, 500),
+                               queue_size=args.checkpoint_every + args.batch_size * args.workers * 4 + 1000)
+        if args.resume and 'history_last_id' in checkpoint:
+            discarded = history.discard_after(checkpoint['history_last_id'])
+            if discarded:
+                logger.info(f"Discarded {discarded} history rows written after the last checkpoint")
+        history.start()
+
+    analyzer = Analyzer(backend=args.backend, workers=args.workers, translate=args.translate,
+                        cache_size=args.cache_size)
+    # Up to two batches queued per worker keeps every worker busy without reading ahead unboundedly
+    executor = ThreadPoolExecutor(max_workers=max(1, args.workers))
+    window = max(1, args.workers) * 2
+    pending = deque()
+
+    start = time.perf_counter()
+    last_report = start
+    processed = 0
+    since_checkpoint = 0
+    undated = 0
+
+    def commit():
+        if output is not None:
+            output.flush()
+            os.fsync(output.fileno())
+            checkpoint['output_bytes'] = output.tell()
+        if history is not None:
+            history.flush()
+            checkpoint['history_last_id'] = history.last_id()
+        if args.checkpoint:
+            save_checkpoint(args.checkpoint, checkpoint)
+
+    def complete(records, positions, future):
+        nonlocal processed, since_checkpoint, last_report, undated
+        if future is None:  # only marks files as finished
+            for path, offset in positions.items():
+                checkpoint['files'][path] = {'done': True} if offset is None else {'offset': offset}
+            return
+        rows = future.result()
+        if output is not None:
+            output.writelines(json.dumps(to_row(record, *row), ensure_ascii=False) + "\n"
+                              for record, row in zip(records, rows))
+        if history is not None:
+            for record, (translated, emotion, sentiment) in zip(records, rows):
+                if record['ts'] is None:
+                    # History is queried by time; storing the replay time would misplace the row
+                    undated += 1
+                    continue
+                history.record(record, translated, emotion, sentiment)
+        for path, offset in positions.items():
+            checkpoint['files'][path] = {'done': True} if offset is None else {'offset': offset}
+        processed += len(records)
+        since_checkpoint += len(records)
+        checkpoint['messages'] += len(records)
+        if since_checkpoint >= args.checkpoint_every:
+            commit()
+            since_checkpoint = 0
+        now = time.perf_counter()
+        if now - last_report >= args.report_interval:
+            logger.info(f"{processed} messages, {processed / (now - start):.0f} msg/s")
+            last_report = now
+
+    try:
+        for records, positions in iter_batches(files, checkpoint, args.batch_size, args.channel, args.server,
+                                               args.undated):
+            future = executor.submit(analyzer.analyse, records) if records else None
+            pending.append((records, positions, future))
+            # Results are written strictly in input order so checkpoint offsets never run ahead
+            while len(pending) >= window or (pending and (pending[0][2] is None or pending[0][2].done())):
+                complete(*pending.popleft())
+        while pending:
+            complete(*pending.popleft())
+        commit()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        analyzer.stop()
+        if history is not None:
+            history.stop(timeout=60)
+        if output is not None:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'files': len(files),
+        'messages': processed,
+        'total_messages': checkpoint['messages'],
+        'elapsed_s': round(elapsed, 3),
+        'msgs_per_sec': round(processed / elapsed, 1) if elapsed > 0 else 0.0,
+        'cache': analyzer.cache.stats(),
+        'translation': analyzer.translator.stats(),
+        'history': history.stats() if history is not None else None,
+        'undated_skipped': undated,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="Log files or directories (walked recursively in sorted order)")
+    parser.add_argument("--output", help="Write one NDJSON result per message to this file")
+    parser.add_argument("--history", help="Write results into this history SQLite database")
+    parser.add_argument("--backend", default="torch", choices=INFERENCE_BACKENDS)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Inference worker processes (0 runs the models in this process)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--translate", default="none", choices=sorted(TRANSLATOR_BACKENDS))
+    parser.add_argument("--cache-size", type=int, default=100000, help="Results and translations kept per run")
+    parser.add_argument("--channel", help="Channel for lines whose file does not name one")
+    parser.add_argument("--server", help="Server name recorded with every message")
+    parser.add_argument("--undated", default="skip", choices=("skip", "file"),
+                        help="Lines without a timestamp: leave them out of --history, or date them by the "
+                             "file name's date (else its mtime)")
+    parser.add_argument("--checkpoint", help="Progress file for --resume")
+    parser.add_argument("--checkpoint-every", type=int, default=10000, help="Messages between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="Continue from --checkpoint")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if not args.output and not args.history:
+        parser.error("nothing to write: pass --output and/or --history")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+    args.batch_size = max(1, args.batch_size)
+    args.checkpoint_every = max(args.batch_size, args.checkpoint_every)
+
+    report = replay(args)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    dropped = report['history']['dropped'] if report['history'] else 0
+    return 1 if dropped else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
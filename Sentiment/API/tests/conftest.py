@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# API modules import each other by bare name, relative to Sentiment/API/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,77 @@
+import pytest
+
+from aggregates import RollingWindow, SentimentAggregator
+
+POSITIVE = [{'label': 'positive', 'score': 0.75}, {'label': 'negative', 'score': 0.25}]
+NEGATIVE = [{'label': 'negative', 'score': 1.0}]
+JOY = [{'label': 'joy', 'score': 1.0}]
+
+
+def _outputs(sentiment):
+    return {'sentiment': sentiment, 'emotion': JOY}
+
+
+def test_window_sums_only_the_last_span():
+    window = RollingWindow(span=60, buckets=6)
+    window.add(100, _outputs(POSITIVE), now=100)
+    window.add(155, _outputs(NEGATIVE), now=155)
+
+    snap = window.snapshot(now=155)
+    assert snap['count'] == 2
+    assert snap['sentiment']['mean'] == {'positive': 0.375, 'negative': 0.625}
+    assert snap['sentiment']['counts'] == {'positive': 1, 'negative': 1}
+    # The first bucket falls out once the window has moved past it
+    assert window.snapshot(now=165)['count'] == 1
+    assert window.snapshot(now=300)['count'] == 0
+
+
+def test_window_ignores_samples_older_than_its_span():
+    window = RollingWindow(span=60, buckets=6)
+    window.add(150, _outputs(POSITIVE), now=150)
+    window.add(80, _outputs(NEGATIVE), now=150)   # same ring slot, older slice
+    assert window.snapshot(now=150)['count'] == 1
+
+
+def test_aggregator_tracks_channel_user_server_and_global():
+    aggregator = SentimentAggregator(windows={'1m': (60, 6)})
+    aggregator.add({'user': 'ann', 'channel': '#a', 'server': 'irc'}, JOY, POSITIVE)
+    aggregator.add({'user': 'bob', 'channel': '#a'}, JOY, NEGATIVE)
+
+    assert aggregator.overall()['1m']['count'] == 2
+    assert aggregator.query('channel', '#a', '1m')['1m']['count'] == 2
+    assert aggregator.query('user', 'ann')['1m']['sentiment']['counts'] == {'positive': 1}
+    assert aggregator.query('server', 'irc')['1m']['count'] == 1
+    assert aggregator.query('user', 'nobody') is None
+    with pytest.raises(ValueError):
+        aggregator.overall('5m')
+
+
+def test_top_ranks_by_count_or_label_mean():
+    aggregator = SentimentAggregator(windows={'1m': (60, 6)})
+    for _ in range(2):
+        aggregator.add({'user': 'grumpy'}, JOY, NEGATIVE)
+    aggregator.add({'user': 'happy'}, JOY, POSITIVE)
+
+    assert [row['user'] for row in aggregator.top('user', '1m')] == ["grumpy", "happy"]
+    assert [row['user'] for row in aggregator.top('user', '1m', sort_by='positive')] == ["happy", "grumpy"]
+    assert len(aggregator.top('user', '1m', limit=1)) == 1
+
+
+def test_least_recently_updated_name_is_evicted():
+    aggregator = SentimentAggregator(windows={'1m': (60, 6)}, max_keys=2)
+    for user in ("a", "b", "a", "c"):
+        aggregator.add({'user': user}, JOY, POSITIVE)
+
+    assert aggregator.query('user', 'b') is None
+    assert aggregator.query('user', 'a') is not None
+    assert aggregator.stats()['evicted'] == 1
+
+
+def test_timestamps_decide_the_window():
+    aggregator = SentimentAggregator(windows={'1m': (60, 6)})
+    aggregator.add({'user': 'u', 'ts': 1000.0}, JOY, POSITIVE, now=1030.0)
+    aggregator.add({'user': 'old', 'ts': 900.0}, JOY, POSITIVE, now=1030.0)
+
+    # Too old for every window: not counted and not tracked
+    assert aggregator.query('user', 'old') is None
+    assert aggregator.stats()['tracked']['user'] == 1
@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from batcher import InferenceBatcher, normalize_text, result_sizeof
+from cache import LRUCache
+
+
+class _Model:
+    """Labels each text with its length, failing any batch containing ``poison``."""
+
+    def __init__(self, poison="boom"):
+        self.poison = poison
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, texts, batch_size=None):
+        with self._lock:
+            self.calls.append(list(texts))
+        if self.poison in texts:
+            raise ValueError("model rejected input")
+        return [[{'label': str(len(text)), 'score': 1.0}] for text in texts]
+
+
+@pytest.fixture
+def batcher():
+    batchers = []
+
+    def build(**kwargs):
+        model = _Model()
+        batcher = InferenceBatcher({'emotion': model, 'sentiment': model}, **kwargs)
+        batcher.model = model
+        batcher.start()
+        batchers.append(batcher)
+        return batcher
+
+    yield build
+    for batcher in batchers:
+        batcher.stop()
+
+
+def test_texts_submitted_together_share_a_batch(batcher):
+    b = batcher(max_batch_size=8, max_wait_ms=50)
+    results = b.infer_many(["a", "bb", "ccc"], timeout=5)
+
+    assert [r['emotion'][0]['label'] for r in results] == ["1", "2", "3"]
+    assert b.stats()['batch_size']['max'] == 3
+
+
+def test_failing_input_fails_only_its_own_caller(batcher):
+    b = batcher(max_batch_size=8, max_wait_ms=50)
+    futures = [b.submit(text) for text in ("ok", "boom", "fine", "yes")]
+
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    assert [f.result(timeout=5)['sentiment'][0]['label'] for f in (futures[0], futures[2], futures[3])] \
+        == ["2", "4", "3"]
+
+
+def test_non_string_is_rejected_without_reaching_the_models(batcher):
+    b = batcher(cache=LRUCache(max_size=10))
+    good = b.submit("hello")
+
+    for bad in (None, 123):
+        with pytest.raises(TypeError):
+            b.submit(bad).result(timeout=5)
+    assert good.result(timeout=5)['emotion'][0]['label'] == "5"
+    assert all(isinstance(text, str) for call in b.model.calls for text in call)
+
+
+def test_cache_answers_normalized_repeats(batcher):
+    b = batcher(cache=LRUCache(max_size=10), cache_namespace="test")
+    b.infer("Hello  World", timeout=5)
+    calls = len(b.model.calls)
+
+    # The cached result is the first spelling's
+    assert b.infer("  hello world", timeout=5)['emotion'][0]['label'] == "12"
+    assert len(b.model.calls) == calls
+    assert normalize_text(" A\tB  ") == "a b"
+
+
+def test_submit_after_stop_fails():
+    b = InferenceBatcher({})
+    with pytest.raises(RuntimeError):
+        b.submit("late").result(timeout=1)
+
+
+def test_result_sizeof_counts_every_proba():
+    small = {'emotion': [{'label': 'joy', 'score': 0.9}]}
+    large = {'emotion': [{'label': 'joy', 'score': 0.9}] * 3,
+             'sentiment': [{'label': 'positive', 'score': 0.8}]}
+    assert 0 < result_sizeof("k", small) < result_sizeof("k", large)
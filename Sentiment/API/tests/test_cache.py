@@ -0,0 +1,65 @@
+import json
+
+from cache import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1   # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cache.time.time", lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.put("k", "v")
+
+    now[0] += 9
+    assert cache.get("k") == "v"
+    now[0] += 2
+    assert cache.get("k") is None
+    assert len(cache) == 0
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_persisted_entries_reload_in_lru_order(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = LRUCache(max_size=3, path=path)
+    for key in "abc":
+        cache.put(key, key.upper())
+    cache.get("a")
+    cache.save()
+
+    reloaded = LRUCache(max_size=2, path=path)
+    # Only the two most recently used survive a smaller cache
+    assert reloaded.get("b") is None
+    assert (reloaded.get("c"), reloaded.get("a")) == ("C", "A")
+
+
+def test_unreadable_persistence_file_starts_empty(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text("{not json")
+    assert len(LRUCache(path=str(path))) == 0
+    LRUCache(path=str(path)).save()
+    assert json.loads(path.read_text()) == []
+
+
+def test_sizeof_tracks_the_footprint_of_stored_entries():
+    cache = LRUCache(max_size=2, sizeof=lambda key, value: len(value))
+    cache.put("a", "xxxx")
+    cache.put("b", "yy")
+    cache.put("a", "z")          # replacing an entry replaces its size
+    assert cache.stats()['approx_bytes'] == 3
+
+    cache.put("c", "wwwww")      # evicts "b"
+    assert cache.stats()['approx_bytes'] == 6
+    cache.clear()
+    assert cache.stats()['approx_bytes'] == 0
+    assert LRUCache().stats()['approx_bytes'] is None
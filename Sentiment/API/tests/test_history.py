@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from history import HistoryStore, to_ndjson
+
+JOY = [{'label': 'joy', 'score': 0.75}, {'label': 'anger', 'score': 0.25}]
+POSITIVE = [{'label': 'positive', 'score': 0.5}]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), batch_size=2, flush_interval=0.05)
+    store.start()
+    yield store
+    store.stop()
+
+
+def _record(store, ts, user="u", channel="#c", message="hi"):
+    store.record({'ts': ts, 'user': user, 'channel': channel, 'server': 's', 'message': message},
+                 message.upper(), JOY, POSITIVE)
+
+
+def test_rows_round_trip_with_probabilities(store):
+    _record(store, 100.0)
+    store.flush()
+
+    [row] = store.query()
+    assert row['ts'] == 100.0 and row['user'] == "u" and row['translated'] == "HI"
+    assert row['emotion'] == "joy" and row['sentiment'] == "positive"
+    assert row['emotion_probs'] == {'joy': 0.75, 'anger': 0.25}
+    assert row['sentiment_probs'] == {'positive': 0.5}
+    assert 'emotion_probs' not in next(store.query(probs=False))
+    assert store.stats()['written'] == 1
+
+
+def test_query_filters_by_time_and_name(store):
+    for ts, user in ((10.0, "a"), (20.0, "b"), (30.0, "a"), (40.0, "a")):
+        _record(store, ts, user=user)
+    store.flush()
+
+    assert [row['ts'] for row in store.query(start=20, end=40)] == [20.0, 30.0]
+    assert [row['ts'] for row in store.query(user="a")] == [10.0, 30.0, 40.0]
+    assert list(store.query(channel="#other")) == []
+
+
+def test_keyset_paging_visits_every_row_once_in_time_order(store):
+    # Backfilled rows arrive out of time order, and two share a timestamp
+    for ts in (50.0, 10.0, 30.0, 30.0, 20.0):
+        _record(store, ts)
+    store.flush()
+
+    seen, after = [], None
+    while True:
+        page = list(store.query(limit=2, after=after))
+        if not page:
+            break
+        seen.extend(page)
+        after = (page[-1]['ts'], page[-1]['id'])
+    assert [row['ts'] for row in seen] == [10.0, 20.0, 30.0, 30.0, 50.0]
+    assert len({row['id'] for row in seen}) == 5
+
+
+def test_offload_runs_every_sqlite_step(store):
+    _record(store, 1.0)
+    store.flush()
+    calls = []
+
+    def offload(func, *args):
+        calls.append(func)
+        return func(*args)
+
+    assert len(list(store.query(offload=offload))) == 1
+    assert len(calls) >= 2
+
+
+def test_labels_and_rows_survive_reopening(store):
+    _record(store, 1.0)
+    store.flush()
+    store.stop()
+
+    reopened = HistoryStore(store.path)
+    assert next(reopened.query())['emotion_probs'] == {'joy': 0.75, 'anger': 0.25}
+    assert reopened.last_id() == 1
+    assert reopened.discard_after(0) == 1
+    assert list(reopened.query()) == []
+
+
+def test_to_ndjson_emits_one_line_per_row():
+    lines = list(to_ndjson([{'a': 1}, {'b': "é"}]))
+    assert [json.loads(line) for line in lines] == [{'a': 1}, {'b': "é"}]
+    assert all(line.endswith("\n") for line in lines)
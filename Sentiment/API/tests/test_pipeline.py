@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+from pipeline import AnalysisPipeline, PipelineOverloaded
+
+
+class _Recorder:
+    """Collects published and failed jobs, signalling once ``expected`` have arrived."""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.published = []
+        self.failed = []
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def publish(self, job):
+        self._add(self.published, job)
+
+    def fail(self, job, error):
+        self._add(self.failed, (job, str(error)))
+
+    def _add(self, target, item):
+        with self._lock:
+            target.append(item)
+            if len(self.published) + len(self.failed) >= self.expected:
+                self.done.set()
+
+
+def _pipeline(recorder, infer_many=None, **kwargs):
+    def infer(texts):
+        return [{'label': text.upper()} for text in texts]
+
+    return AnalysisPipeline(translate=lambda text: f"en:{text}", infer_many=infer_many or infer,
+                            publish=recorder.publish, fail=recorder.fail, **kwargs)
+
+
+def _records(n):
+    return [{'user': 'u', 'message': f"m{i}"} for i in range(n)]
+
+
+def test_jobs_flow_through_every_stage():
+    recorder = _Recorder(expected=3)
+    pipeline = _pipeline(recorder)
+    pipeline.start()
+    job_ids = pipeline.submit_many(_records(3))
+
+    assert recorder.done.wait(5)
+    assert sorted(job['job_id'] for job in recorder.published) == sorted(job_ids)
+    assert {job['outputs']['label'] for job in recorder.published} == {"EN:M0", "EN:M1", "EN:M2"}
+
+
+def test_failed_inference_reaches_the_fail_hook():
+    def infer(texts):
+        raise RuntimeError("model down")
+
+    recorder = _Recorder(expected=2)
+    pipeline = _pipeline(recorder, infer_many=infer)
+    pipeline.start()
+    pipeline.submit_many(_records(2))
+
+    assert recorder.done.wait(5)
+    assert [error for _, error in recorder.failed] == ["model down", "model down"]
+    assert pipeline.stats()['failed'] == 2
+
+
+def test_submit_many_admits_all_or_nothing_under_reject():
+    pipeline = _pipeline(_Recorder(expected=0), queue_size=5)   # not started: queues only fill
+    pipeline.submit_many(_records(3))
+
+    with pytest.raises(PipelineOverloaded):
+        pipeline.submit_many(_records(3))
+    assert pipeline.translate_stage.queue.qsize() == 3
+    assert pipeline.stats()['rejected'] == 3
+    assert len(pipeline.submit_many(_records(2))) == 2
+
+
+def test_submit_many_refuses_batches_larger_than_the_queue():
+    pipeline = _pipeline(_Recorder(expected=0), queue_size=5)
+    with pytest.raises(ValueError):
+        pipeline.submit_many(_records(6))
+    with pytest.raises(ValueError):
+        pipeline.admit(6, backlog=0)
+
+
+def test_degrade_overflows_into_inference():
+    pipeline = _pipeline(_Recorder(expected=0), policy="degrade", queue_size=3)
+    pipeline.submit_many(_records(3))
+    pipeline.submit_many(_records(2))
+
+    assert pipeline.translate_stage.queue.qsize() == 3
+    assert pipeline.infer_stage.queue.qsize() == 2
+    assert pipeline.stats()['degraded'] == 2
+    with pytest.raises(PipelineOverloaded):
+        pipeline.submit_many(_records(2))
+
+
+@pytest.mark.parametrize("policy, degrade", [("reject", None), ("drop_oldest", None), ("degrade", True)])
+def test_admit_applies_the_policy_to_synchronous_batches(policy, degrade):
+    pipeline = _pipeline(_Recorder(expected=0), policy=policy, queue_size=10)
+    assert pipeline.admit(4, backlog=6) is False
+
+    if degrade:
+        assert pipeline.admit(4, backlog=7) is True
+        assert pipeline.stats()['degraded'] == 4
+    else:
+        with pytest.raises(PipelineOverloaded):
+            pipeline.admit(4, backlog=7)
+        assert pipeline.stats()['rejected'] == 4
+
+
+def test_drop_oldest_reports_the_evicted_job():
+    recorder = _Recorder(expected=1)
+    pipeline = _pipeline(recorder, policy="drop_oldest", queue_size=2)   # not started
+    first, _ = pipeline.submit_many(_records(2))
+    pipeline.submit({'user': 'u', 'message': "late"})
+
+    assert recorder.done.wait(5)
+    job, error = recorder.failed[0]
+    assert job['job_id'] == first and error == "dropped: overloaded"
+    assert pipeline.stats()['dropped'] == 1
+    assert pipeline.stats()['stages']['translate']['dropped'] == 1
+    assert pipeline.translate_stage.queue.qsize() == 2
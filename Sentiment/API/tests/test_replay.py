@@ -0,0 +1,39 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+# replay imports the model loaders, which need the real inference stack
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from replay import iter_records, parse_line  # noqa: E402
+
+DAY = datetime(2024, 3, 1, tzinfo=timezone.utc).timestamp()
+
+
+def test_raw_lines_take_their_time_from_the_ircv3_tag():
+    record = parse_line("@time=2024-03-01T12:00:00.000Z;account=a :n!u@h PRIVMSG #c :hello")
+    assert record == {'user': 'n', 'channel': '#c', 'message': 'hello', 'ts': DAY + 12 * 3600}
+    assert parse_line(":n!u@h PRIVMSG #c :hello")['ts'] is None
+
+
+def test_time_only_stamps_use_the_file_date():
+    assert parse_line("[10:30] <ann> hi", day=datetime(2024, 3, 1))['ts'] == DAY + 10.5 * 3600
+    assert parse_line("[10:30] <ann> hi")['ts'] is None
+
+
+def test_undated_lines_stay_undated_unless_asked(tmp_path):
+    channel = tmp_path / "libera" / "#chat"
+    channel.mkdir(parents=True)
+    dated = channel / "2024-03-01.log"
+    dated.write_text(":n!u@h PRIVMSG #chat :one\n")
+    undated = channel / "raw.log"
+    undated.write_text(":n!u@h PRIVMSG #chat :two\n")
+    os.utime(undated, (DAY + 60, DAY + 60))
+
+    assert [r['ts'] for _, r in iter_records(str(dated))] == [None]
+    assert [r['ts'] for _, r in iter_records(str(dated), undated="file")] == [DAY]
+    assert [r['ts'] for _, r in iter_records(str(undated), undated="file")] == [DAY + 60]
+    _, record = next(iter_records(str(dated)))
+    assert (record['server'], record['channel']) == ("libera", "#chat")
@@ -0,0 +1,83 @@
+import threading
+
+from translation import CachingTranslator, IdentityTranslatorBackend, create_translator, is_probably_english
+
+
+class _Backend:
+    """Translator stand-in that records calls and can be made to fail."""
+
+    name = "fake"
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def translate(self, text):
+        self.calls.append(text)
+        if self.fail:
+            raise ConnectionError("translator unreachable")
+        return f"en({text})"
+
+
+def test_english_check():
+    assert is_probably_english("lol that is so good")
+    assert is_probably_english("12345 :) !!!")
+    assert not is_probably_english("c'est vraiment génial")
+    assert not is_probably_english("das ist sehr schlecht heute")
+
+
+def test_english_text_skips_the_backend():
+    backend = _Backend()
+    translator = CachingTranslator(backend)
+
+    assert translator.translate("yes i think so") == "yes i think so"
+    assert translator.translate("") == ""
+    assert backend.calls == []
+    assert translator.stats()['skipped_english'] == 1
+
+
+def test_translations_are_cached_by_stripped_text():
+    backend = _Backend()
+    translator = CachingTranslator(backend)
+
+    assert translator.translate("hola amigos") == "en(hola amigos)"
+    assert translator.translate("  hola amigos ") == "en(hola amigos)"
+    assert backend.calls == ["hola amigos"]
+    assert translator.stats()['cache']['hits'] == 1
+
+
+def test_backend_failure_falls_back_to_the_original_and_is_not_cached():
+    backend = _Backend(fail=True)
+    translator = CachingTranslator(backend)
+
+    assert translator.translate("hola") == "hola"
+    backend.fail = False
+    assert translator.translate("hola") == "en(hola)"
+    assert translator.stats()['failures'] == 1
+
+
+def test_offload_runs_only_the_backend_call():
+    threads = []
+
+    def offload(func, *args):
+        threads.append(threading.current_thread())
+        return func(*args)
+
+    backend = _Backend()
+    translator = CachingTranslator(backend, detect_english=False, offload=offload)
+    translator.translate("bonjour")
+    translator.translate("bonjour")
+
+    assert len(threads) == 1 and backend.calls == ["bonjour"]
+
+
+def test_create_translator_with_a_stub_backend():
+    translator = create_translator(backend="none", detect_english=False)
+    assert isinstance(translator.backend, IdentityTranslatorBackend)
+    assert translator.translate("hallo welt") == "hallo welt"
+
+    # Benchmarks and tests swap in their own backend after construction
+    translator.backend = _Backend()
+    assert translator.translate("hallo welt") == "hallo welt"   # cached from the identity backend
+    assert translator.translate("guten tag") == "en(guten tag)"
+    assert translator.stats()['backend'] == "fake"
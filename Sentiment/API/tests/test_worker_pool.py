@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from worker_pool import InferenceWorkerPool, _Worker
+
+
+class _BrokenPipe:
+    def send(self, value):
+        raise BrokenPipeError("worker is gone")
+
+
+def _pool_with_dead_worker(restart):
+    pool = InferenceWorkerPool(1)
+    worker = _Worker(0)
+    worker.requests = _BrokenPipe()
+    pool._workers = [worker]
+    pool._idle.put(worker)
+    pool._restart = restart
+    return pool, worker
+
+
+def test_worker_goes_back_to_the_pool_after_a_successful_restart():
+    def restart(worker):
+        pool.restarts += 1
+
+    pool, worker = _pool_with_dead_worker(restart)
+    with pytest.raises(RuntimeError, match="died"):
+        pool.run(["hi"])
+    assert pool._idle.get_nowait() is worker
+    assert pool.restarts == 1 and pool.dead == 0
+
+
+def test_worker_that_cannot_restart_is_retired():
+    def restart(worker):
+        raise RuntimeError("no models")
+
+    pool, worker = _pool_with_dead_worker(restart)
+    with pytest.raises(RuntimeError, match="could not be restarted: no models"):
+        pool.run(["hi"])
+    assert pool._idle.qsize() == 0
+    assert worker.dead and pool.stats()['dead'] == 1
+
+    # With nothing left to wait for, run fails at once instead of blocking
+    with pytest.raises(RuntimeError, match="No inference workers left"):
+        pool.run(["hi"])
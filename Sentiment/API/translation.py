@@ -0,0 +1,132 @@
+import logging
+import re
+import threading
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Frequent English words and chat shorthand used by the local language pre-check
+ENGLISH_WORDS = frozenset("""
+a about after all also am an and any are as at be because been but by can
+could did do does dont for from get go going good got had has have he her here
+him his how i if im in is it its just know like look make me more my no not
+now of oh ok okay on one or our out people really right say see she so some
+that thats the their them then there they think this to too up us very want
+was we well were what when where which who why will with would yeah yes you
+your
+lol lmao rofl gg wp brb afk btw imo imho idk omg wtf thx ty np pls plz haha
+hahaha hehe hi hey hello bye nice cool yep nope ok k gn gm
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z']+")
+_LETTER_RE = re.compile(r"[^\W\d_]", re.UNICODE)
+
+
+def is_probably_english(text, threshold=0.5):
+    """Cheap local check for text that does not need translating.
+
+    Returns True for text with no letters at all (emoji, numbers, punctuation)
+    and for ASCII text where at least ``threshold`` of the words are common
+    English words or chat shorthand. Anything with non-ASCII letters is sent
+    to the translator.
+    """
+    if not _LETTER_RE.search(text):
+        return True
+    if not text.isascii():
+        return False
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return True
+    known = sum(1 for token in tokens if token.replace("'", "") in ENGLISH_WORDS)
+    return known / len(tokens) >= threshold
+
+
+class GoogleTranslatorBackend:
+    """deep-translator GoogleTranslator, created once and reused across calls."""
+
+    name = "google"
+
+    def __init__(self, target='en'):
+        from deep_translator import GoogleTranslator
+        self._translator = GoogleTranslator(source='auto', target=target)
+
+    def translate(self, text):
+        return self._translator.translate(text)
+
+
+class IdentityTranslatorBackend:
+    """Returns text unchanged; for offline runs and tests."""
+
+    name = "none"
+
+    def translate(self, text):
+        return text
+
+
+TRANSLATOR_BACKENDS = {
+    GoogleTranslatorBackend.name: GoogleTranslatorBackend,
+    IdentityTranslatorBackend.name: IdentityTranslatorBackend,
+}
+
+
+class CachingTranslator:
+    """Wraps a translator backend with a language pre-check and an LRU cache.
+
+    ``offload(func, *args)``, if given, runs the backend call (e.g. on
+    ``eventlet.tpool.execute`` threads); the cache and counters are only
+    touched by the caller's thread.
+    """
+
+    def __init__(self, backend, cache=None, detect_english=True, offload=None):
+        self.backend = backend
+        self.offload = offload or (lambda func, *args: func(*args))
+        self.cache = cache if cache is not None else LRUCache()
+        self.detect_english = detect_english
+        self.skipped = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def translate(self, text):
+        """Translate ``text`` to English, falling back to the original on failure."""
+        if not text:
+            return text
+        if self.detect_english and is_probably_english(text):
+            with self._lock:
+                self.skipped += 1
+            return text
+
+        key = text.strip()
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            translated = self.offload(self.backend.translate, text)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.warning(f"Translation failed: {e}")
+            return text
+        if translated is None:
+            return text
+
+        self.cache.put(key, translated)
+        return translated
+
+    def stats(self):
+        return {
+            'backend': getattr(self.backend, 'name', type(self.backend).__name__),
+            'skipped_english': self.skipped,
+            'failures': self.failures,
+            'cache': self.cache.stats(),
+        }
+
+
+def create_translator(backend="google", cache_size=10000, cache_ttl=None,
+                      cache_path=None, detect_english=True, offload=None):
+    """Build a CachingTranslator for the named backend."""
+    if backend not in TRANSLATOR_BACKENDS:
+        raise ValueError(f"Unknown translation backend: {backend}")
+    cache = LRUCache(max_size=cache_size, ttl=cache_ttl, path=cache_path)
+    return CachingTranslator(TRANSLATOR_BACKENDS[backend](), cache, detect_english, offload)
@@ -0,0 +1,244 @@
+import logging
+import os
+import time
+
+import torch
+import torch.multiprocessing as torch_mp
+
+from models import (CACHE_DIR, EMOTION_MODEL, SENTIMENT_MODEL, load_model, warmup_models)
+
+# Dispatch happens on OS threads (eventlet.tpool), so use the unpatched primitives
+try:
+    from eventlet.patcher import original
+    os_threading = original('threading')
+    os_queue = original('queue')
+except ImportError:
+    import threading as os_threading
+    import queue as os_queue
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAMES = {"emotion": EMOTION_MODEL, "sentiment": SENTIMENT_MODEL}
+
+
+def default_threads_per_worker(num_workers):
+    """Split the machine's cores evenly between workers."""
+    return max(1, (os.cpu_count() or 1) // max(1, num_workers))
+
+
+def share_model_weights(models):
+    """Move pipeline weights into shared memory so spawned workers map them instead of copying.
+
+    Returns ``{name: nn.Module}`` for the worker processes; tokenizers are
+    cheap and are rebuilt in each worker.
+    """
+    shared = {}
+    for name, model in models.items():
+        module = model.model
+        module.share_memory()
+        module.eval()
+        shared[name] = module
+    return shared
+
+
+def _build_pipelines(backend, shared_modules, local_first):
+    if not shared_modules:
+        return {name: load_model(model_name, backend=backend, local_first=local_first)
+                for name, model_name in MODEL_NAMES.items()}
+
+    from transformers import AutoTokenizer, pipeline
+    pipelines = {}
+    for name, module in shared_modules.items():
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAMES[name], cache_dir=str(CACHE_DIR),
+                                                  local_files_only=local_first)
+        pipelines[name] = pipeline("text-classification", model=module, tokenizer=tokenizer,
+                                   top_k=3, device=-1)
+    return pipelines
+
+
+def _worker_main(index, requests, responses, backend, shared_modules, intra_op_threads,
+                 local_first, warmup):
+    """Inference process: receive a list of texts, reply with per-model outputs."""
+    torch.set_num_threads(intra_op_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already set by an earlier parallel region
+
+    try:
+        models = _build_pipelines(backend, shared_modules, local_first)
+        if warmup:
+            warmup_models(models)
+    except Exception as e:
+        responses.send(("error", f"worker {index} failed to load models: {e}"))
+        return
+    responses.send(("ready", index))
+
+    with torch.inference_mode():
+        while True:
+            try:
+                texts = requests.recv()
+            except EOFError:
+                break
+            if texts is None:
+                break
+            try:
+                outputs = {name: model(texts, batch_size=len(texts)) for name, model in models.items()}
+                responses.send(("ok", outputs))
+            except Exception as e:
+                responses.send(("error", str(e)))
+
+
+class _Worker:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.requests = None
+        self.responses = None
+        self.batches = 0
+        self.items = 0
+        self.dead = False  # died and could not be restarted
+
+
+class InferenceWorkerPool:
+    """N spawned processes, each holding the emotion and sentiment pipelines.
+
+    ``run(texts)`` hands a batch to an idle worker and blocks until it
+    answers, so up to ``num_workers`` batches are in flight at once when
+    called from that many threads. With ``shared_models`` (torch backend)
+    the workers map the parent's weights from shared memory instead of
+    loading their own copy.
+
+    A worker that dies mid-batch is restarted before it takes more work. If
+    the restart fails it is retired, and once every worker is retired
+    ``run`` raises instead of waiting for one.
+    """
+
+    def __init__(self, num_workers, backend="torch", intra_op_threads=None,
+                 local_first=True, shared_models=None, warmup=True, start_timeout=600):
+        self.num_workers = max(1, int(num_workers))
+        self.backend = backend
+        self.intra_op_threads = intra_op_threads or default_threads_per_worker(self.num_workers)
+        self.local_first = local_first
+        self.shared_modules = share_model_weights(shared_models) if shared_models else None
+        self.warmup = warmup
+        self.start_timeout = start_timeout
+        self._ctx = torch_mp.get_context("spawn")
+        self._workers = [_Worker(i) for i in range(self.num_workers)]
+        self._idle = os_queue.Queue()
+        self._lock = os_threading.Lock()
+        self.restarts = 0
+        self.dead = 0
+
+    def start(self):
+        """Spawn every worker and wait until all report ready."""
+        for worker in self._workers:
+            self._spawn(worker)
+        for worker in self._workers:
+            self._await_ready(worker)
+            self._idle.put(worker)
+        logger.info(f"Inference worker pool ready: {self.num_workers} workers x "
+                    f"{self.intra_op_threads} torch threads ({self.backend}, "
+                    f"shared weights={self.shared_modules is not None})")
+
+    def _spawn(self, worker):
+        request_recv, request_send = self._ctx.Pipe(duplex=False)
+        response_recv, response_send = self._ctx.Pipe(duplex=False)
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.index, request_recv, response_send, self.backend, self.shared_modules,
+                  self.intra_op_threads, self.local_first, self.warmup),
+            name=f"inference-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        request_recv.close()
+        response_send.close()
+        worker.requests = request_send
+        worker.responses = response_recv
+
+    def _await_ready(self, worker):
+        if not worker.responses.poll(self.start_timeout):
+            raise RuntimeError(f"Inference worker {worker.index} did not start in time")
+        status, payload = worker.responses.recv()
+        if status != "ready":
+            raise RuntimeError(payload)
+
+    def _restart(self, worker):
+        logger.warning(f"Restarting inference worker {worker.index}")
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        try:
+            self._spawn(worker)
+            self._await_ready(worker)
+        except Exception:
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.kill()
+            raise
+        with self._lock:
+            self.restarts += 1
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if self.dead >= self.num_workers:
+                    raise RuntimeError("No inference workers left: every restart failed")
+            try:
+                return self._idle.get(timeout=1)
+            except os_queue.Empty:
+                continue
+
+    def run(self, texts):
+        """Run both models over ``texts`` on the next idle worker."""
+        worker = self._take_idle()
+        try:
+            worker.requests.send(list(texts))
+            status, payload = worker.responses.recv()
+        except (EOFError, OSError) as e:
+            logger.error(f"Inference worker {worker.index} died: {e}")
+            try:
+                self._restart(worker)
+            except Exception as restart_error:
+                worker.dead = True
+                with self._lock:
+                    self.dead += 1
+                logger.error(f"Inference worker {worker.index} could not be restarted, retiring it: "
+                             f"{restart_error}")
+                raise RuntimeError(f"Inference worker {worker.index} died and could not be restarted: "
+                                   f"{restart_error}") from e
+            self._idle.put(worker)
+            raise RuntimeError(f"Inference worker {worker.index} died") from e
+        self._idle.put(worker)
+
+        if status != "ok":
+            raise RuntimeError(payload)
+        worker.batches += 1
+        worker.items += len(texts)
+        return payload
+
+    def stop(self):
+        for worker in self._workers:
+            try:
+                worker.requests.send(None)
+            except (OSError, AttributeError):
+                pass
+        deadline = time.monotonic() + 5
+        for worker in self._workers:
+            if worker.process:
+                worker.process.join(timeout=max(0, deadline - time.monotonic()))
+
+    def stats(self):
+        return {
+            'workers': self.num_workers,
+            'idle': self._idle.qsize(),
+            'torch_threads_per_worker': self.intra_op_threads,
+            'shared_weights': self.shared_modules is not None,
+            'restarts': self.restarts,
+            'dead': self.dead,
+            'per_worker': [
+                {'index': w.index, 'alive': bool(w.process and w.process.is_alive()), 'dead': w.dead,
+                 'batches': w.batches, 'items': w.items}
+                for w in self._workers
+            ],
+        }
@@ -1,12 +1,17 @@
+import asyncio
+import concurrent.futures
+import os
+import random
 import socket
-import re
-import requests
-import sys
 import signal
-import os
+import threading
 import time
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+import aiohttp
+
+from config import ConnectionSpec, load_servers, plan_connections
+from irc import LineReader, parse_message
+from spool import Spool
 
 def resolve_irc_host():
     """Try to connect to host.docker.internal:6667, fallback to 172.17.0.1"""
@@ -22,8 +27,14 @@ def resolve_irc_host():
     return test_hosts[-1]  # fallback anyway
 
 
-# IRC Server Config
-SERVER = os.getenv("IRC_HOST", resolve_irc_host())
+# Servers and channels: a shared BOT_CONFIG file, split across SHARD_COUNT instances.
+# Without it the bot joins IRC_CHANNEL on IRC_HOST as before.
+BOT_CONFIG = os.getenv("BOT_CONFIG")
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", 0))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 1))
+
+# IRC Server Config (single-server mode)
+SERVER = os.getenv("IRC_HOST") or (None if BOT_CONFIG else resolve_irc_host())
 PORT = int(os.getenv("IRC_PORT", 6667))
 CHANNEL = os.getenv("IRC_CHANNEL", "#nightwatch")
 NICKNAME = os.getenv("IRC_NICKNAME", "SentimentBot")
@@ -31,100 +42,515 @@ NICKNAME = os.getenv("IRC_NICKNAME", "SentimentBot")
 # JSON API Endpoint
 API_HOST = os.getenv("SENTIMENT_API_HOST", "sentiment-api")
 API_PORT = os.getenv("SENTIMENT_API_PORT", "6000")
-API_URL = os.getenv("API_URL", f"http://{API_HOST}:{API_PORT}/receive")
-
-# Configure retry strategy
-retry_strategy = Retry(
-    total=5,  # number of retries
-    backoff_factor=1,  # wait 1, 2, 4, 8, 16 seconds between retries
-    status_forcelist=[500, 502, 503, 504],  # HTTP status codes to retry on
-)
-adapter = HTTPAdapter(max_retries=retry_strategy)
-http = requests.Session()
-http.mount("http://", adapter)
+API_BATCH_URL = os.getenv("API_BATCH_URL", f"http://{API_HOST}:{API_PORT}/receive_batch")
+
+# Forwarding buffer: flush after this many messages or this many seconds
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 50))
+BATCH_FLUSH_INTERVAL = float(os.getenv("BATCH_FLUSH_INTERVAL", 0.5))
+BATCH_MAX_PENDING = int(os.getenv("BATCH_MAX_PENDING", 10000))
+
+# Bytes per socket read; lines are reassembled across reads
+RECV_SIZE = int(os.getenv("IRC_RECV_SIZE", 65536))
+
+# API client: pooled keep-alive connections, a few batches in flight at once
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", 8))
+API_MAX_INFLIGHT = int(os.getenv("API_MAX_INFLIGHT", 4))
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", 10))
+API_RETRIES = int(os.getenv("API_RETRIES", 5))
+
+# Durable delivery: spool messages to this SQLite file until the API accepts them
+# (unset = in-memory queue only)
+SPOOL_PATH = os.getenv("SPOOL_PATH")
+SPOOL_MAX_MESSAGES = int(os.getenv("SPOOL_MAX_MESSAGES", 1000000))
+
+# Outgoing IRC commands per connection (single-server mode; BOT_CONFIG sets these per server)
+IRC_RATE_BURST = int(os.getenv("IRC_RATE_BURST", 5))
+IRC_RATE_PER_SECOND = float(os.getenv("IRC_RATE_PER_SECOND", 1.0))
+
+# Reconnect delays grow exponentially (with jitter) between these bounds
+RECONNECT_MIN_DELAY = float(os.getenv("RECONNECT_MIN_DELAY", 1))
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", 60))
+
+# Status codes worth retrying: the API is overloaded or restarting
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 running = True
 
-def connect_to_irc():
-    global running
+# Set while run_bot() is active so stop() can reach the loop from any thread
+_loop = None
+_stop_event = None
+_connections = set()
+
+# Keep JOIN lines well under the 512-byte IRC limit
+MAX_JOIN_LENGTH = 400
+
+
+class Backoff:
+    """Exponential backoff with jitter.
+
+    Each delay is drawn from the upper half of ``min(cap, base * 2**n)`` so
+    a fleet of bots restarting together does not reconnect in lockstep.
+    """
+
+    def __init__(self, base=1.0, cap=60.0):
+        self.base = base
+        self.cap = cap
+        self.attempts = 0
+
+    def next_delay(self):
+        ceiling = min(self.cap, self.base * 2 ** self.attempts)
+        self.attempts += 1
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class TokenBucket:
+    """Allows ``burst`` commands at once, refilled at ``rate`` per second (0 = unlimited)."""
+
+    def __init__(self, burst=5, rate=1.0):
+        self.capacity = max(1, burst)
+        self.rate = rate
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class MessageSender:
+    """Queues PRIVMSGs and ships them to the API in batches from its own task.
+
+    The IRC reader only calls ``add()``, which never awaits, so API latency
+    and retry backoff never stall the socket. A batch is sent once it has
+    ``max_size`` messages or ``interval`` seconds after its first message;
+    up to ``max_inflight`` batches are posted concurrently over the pooled
+    session. When ``max_pending`` messages are waiting the oldest is shed.
+    """
+
+    def __init__(self, session, url, max_size=50, interval=0.5, max_pending=10000,
+                 max_inflight=4, retries=5):
+        self.session = session
+        self.url = url
+        self.max_size = max_size
+        self.interval = interval
+        self.retries = retries
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.batch_full = asyncio.Event()
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.tasks = set()
+        self.held = []
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+
+    def add(self, user, channel, message, server=None):
+        if self.queue.full():
+            # Shed the oldest message rather than grow without bound
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait({"user": user, "channel": channel, "server": server,
+                               "message": message, "ts": time.time()})
+        if self.queue.qsize() >= self.max_size - 1:
+            self.batch_full.set()
+
+    async def run(self):
+        while True:
+            self.held = await self._next_batch()
+            await self.inflight.acquire()
+            batch, self.held = self.held, []
+            self._spawn(batch)
+
+    def _spawn(self, batch):
+        task = asyncio.create_task(self._send(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _next_batch(self):
+        # Kept on self so close() can still send it if this task is cancelled mid-wait
+        self.held = [await self.queue.get()]
+        if self.queue.qsize() < self.max_size - 1:
+            # Give the batch up to `interval` seconds to fill
+            self.batch_full.clear()
+            try:
+                await asyncio.wait_for(self.batch_full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+        return self.held + self._drain(self.max_size - 1)
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _send(self, batch):
+        dropped, self.dropped = self.dropped, 0
+        if dropped:
+            print(f"[WARN] Dropped {dropped} messages, API is not keeping up")
+        try:
+            await self._post(batch, self.retries)
+        finally:
+            self.inflight.release()
+
+    async def _post(self, batch, retries):
+        """POST one batch. True once the API took it; False if it was rejected or ``retries`` ran out (None = never)."""
+        backoff = Backoff(base=0.5, cap=8.0)
+        error = None
+        attempt = 0
+        while retries is None or attempt <= retries:
+            if attempt:
+                await asyncio.sleep(backoff.next_delay())
+            attempt += 1
+            try:
+                async with self.session.post(self.url, json=batch) as response:
+                    if response.status < 400:
+                        self.sent += len(batch)
+                        return True
+                    if response.status not in RETRY_STATUSES:
+                        print(f"[WARN] API rejected batch of {len(batch)}: HTTP {response.status}")
+                        self.failed += len(batch)
+                        return False
+                    error = f"HTTP {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+        self.failed += len(batch)
+        print(f"[WARN] Failed to send batch of {len(batch)} to API after retries: {error}")
+        return False
+
+    async def close(self, timeout=10.0):
+        """Send whatever is still queued, then wait for in-flight batches."""
+        while self.held or not self.queue.empty():
+            batch, self.held = self.held + self._drain(self.max_size - len(self.held)), []
+            await self.inflight.acquire()
+            self._spawn(batch)
+        if self.tasks:
+            await asyncio.wait(set(self.tasks), timeout=timeout)
+
+
+class SpoolingSender(MessageSender):
+    """MessageSender that lands every batch in a durable Spool before it is posted.
+
+    ``run()`` moves staged messages into the spool; a drainer claims them
+    back out, posts up to ``max_inflight`` batches at once and acks each
+    only after the API accepted it, retrying without limit. SQLite work runs
+    on one background thread so the event loop never waits on the disk.
+    Whatever is still unacked at shutdown is replayed on the next start.
+    """
+
+    def __init__(self, session, url, spool, **kwargs):
+        super().__init__(session, url, **kwargs)
+        self.spool = spool
+        self.spooled = asyncio.Event()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="spool")
+
+    def _io(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def run(self):
+        if self.spool.count:
+            print(f"[INFO] Replaying {self.spool.count} spooled messages from {self.spool.path}")
+        drainer = asyncio.create_task(self._drain_spool())
+        try:
+            while True:
+                batch = await self._next_batch()
+                self.held = []
+                # Once handed to the spool thread the append must finish, even on shutdown
+                await asyncio.shield(self._io(self.spool.append, batch))
+                self.spooled.set()
+        finally:
+            drainer.cancel()
+
+    async def _drain_spool(self):
+        idle = True
+        while True:
+            await self.inflight.acquire()
+            self.spooled.clear()
+            claim = await self._io(self.spool.claim)
+            if claim is None:
+                self.inflight.release()
+                if not idle and not self.tasks:
+                    # Caught up: a good moment to keep the WAL file from growing
+                    await self._io(self.spool.checkpoint)
+                    idle = True
+                await self.spooled.wait()
+                continue
+            idle = False
+            self._spawn_delivery(*claim)
+
+    def _spawn_delivery(self, batch_id, batch):
+        task = asyncio.create_task(self._deliver(batch_id, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _deliver(self, batch_id, batch):
+        try:
+            # Rejected batches are acked too: retrying them would block the spool forever
+            await self._post(batch, retries=None)
+        finally:
+            self.inflight.release()
+        await self._io(self.spool.ack, batch_id)
+
+    async def close(self, timeout=10.0):
+        """Spool whatever is still staged, give in-flight posts a moment, then close the spool."""
+        staged = self.held + self._drain(self.queue.qsize())
+        self.held = []
+        if staged:
+            await self._io(self.spool.append, staged)
+        if self.tasks:
+            await asyncio.wait(set(self.tasks), timeout=timeout)
+            for task in list(self.tasks):
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self._io(self.spool.close)
+        self.executor.shutdown()
+        print(f"[INFO] Spool closed with {self.spool.count} undelivered messages")
+
+
+class IRCConnection:
+    """One IRC session: a reader loop dispatching parsed lines and a rate-limited writer task."""
+
+    def __init__(self, spec, reader, writer, sender):
+        self.spec = spec
+        self.nick = spec.nick
+        self.reader = reader
+        self.writer = writer
+        self.sender = sender
+        self.outgoing = asyncio.Queue()
+        self.limiter = TokenBucket(spec.burst, spec.per_second)
+        self.registered = False
+
+    def send(self, line):
+        self.outgoing.put_nowait(line)
+
+    def send_now(self, line):
+        """Bypass the queue and rate limit; for PONGs, which must not wait behind JOINs."""
+        self.writer.write(f"{line}\r\n".encode("utf-8"))
+
+    async def write_loop(self):
+        while True:
+            line = await self.outgoing.get()
+            await self.limiter.acquire()
+            self.writer.write(f"{line}\r\n".encode("utf-8"))
+            if self.outgoing.empty():
+                await self.writer.drain()
+
+    async def read_loop(self):
+        lines = LineReader()
+        last_ping = time.time()
+        while running:
+            data = await self.reader.read(RECV_SIZE)
+            if not data:
+                print(f"[WARN] [{self.spec.server}] Empty message received, server might be down")
+                return
+
+            if time.time() - last_ping > 60:
+                print(f"⏳ [{self.spec.server}] {self.nick} still connected...")
+                last_ping = time.time()
+
+            # One read may carry many lines, or end mid-line
+            for line in lines.feed(data):
+                msg = parse_message(line)
+                if msg is None:
+                    continue
+                handler = HANDLERS.get(msg.command)
+                if handler is None:
+                    print(f"[IRC] [{self.spec.server}] {line.decode('utf-8', errors='replace')}")
+                    continue
+                if not handler(self, msg):
+                    return
+
+    def close(self):
+        self.writer.close()
+
+
+def join_commands(channels):
+    """Pack channels into as few ``JOIN #a,#b,...`` lines as the line limit allows."""
+    commands, group = [], []
+    for channel in channels:
+        if group and len(",".join(group + [channel])) > MAX_JOIN_LENGTH:
+            commands.append(f"JOIN {','.join(group)}")
+            group = []
+        group.append(channel)
+    if group:
+        commands.append(f"JOIN {','.join(group)}")
+    return commands
+
+def on_welcome(conn, msg):
+    if not conn.registered:
+        print(f"[DEBUG] [{conn.spec.server}] {conn.nick} joining {', '.join(conn.spec.channels)}")
+        for command in join_commands(conn.spec.channels):
+            conn.send(command)
+        conn.registered = True
+    return True
+
+def on_nick_in_use(conn, msg):
+    # Another shard or a stale session holds the nick; try a variant
+    conn.nick = f"{conn.nick}_"
+    print(f"[WARN] [{conn.spec.server}] Nick in use, retrying as {conn.nick}")
+    conn.send(f"NICK {conn.nick}")
+    return True
+
+def on_ping(conn, msg):
+    token = msg.params[0] if msg.params else ""
+    pong_msg = f"PONG :{token}"
+    print(f"[PING] [{conn.spec.server}] -> {pong_msg}")
+    conn.send_now(pong_msg)
+    return True
+
+def on_privmsg(conn, msg):
+    if len(msg.params) < 2:
+        return True
+    user, channel, message = msg.nick, msg.params[0], msg.params[1]
+    print(f"{user} in {conn.spec.server}/{channel}: {message}")
+
+    # Hand off to the sender task; it posts to the API in the background
+    conn.sender.add(user, channel, message, server=conn.spec.server)
+    return True
+
+def on_notice(conn, msg):
+    print(f"[IRC] [{conn.spec.server}] NOTICE {' '.join(msg.params)}")
+    if msg.params and "Server going down" in msg.params[-1]:
+        print(f"[INFO] [{conn.spec.server}] Server is going down, will reconnect...")
+        return False
+    return True
+
+def on_error(conn, msg):
+    print(f"[INFO] [{conn.spec.server}] Server closed the link: {' '.join(msg.params)}, will reconnect...")
+    return False
+
+# Dispatch table by IRC command; anything else is only logged
+HANDLERS = {
+    "001": on_welcome,
+    "433": on_nick_in_use,
+    "PING": on_ping,
+    "PRIVMSG": on_privmsg,
+    "NOTICE": on_notice,
+    "ERROR": on_error,
+}
+
+
+def connection_specs():
+    """The connections this instance owns, from BOT_CONFIG or the single-server settings."""
+    if BOT_CONFIG:
+        servers = load_servers(BOT_CONFIG)
+        return plan_connections(servers, SHARD_INDEX, SHARD_COUNT, default_nick=NICKNAME)
+    return [ConnectionSpec(server=SERVER, host=SERVER, port=PORT, nick=NICKNAME, channels=[CHANNEL],
+                           burst=IRC_RATE_BURST, per_second=IRC_RATE_PER_SECOND)]
+
+
+async def run_session(spec, sender):
+    """Connect, register and read until the server goes away. Returns the connection."""
+    print(f"[DEBUG] Trying to connect to IRC at {spec.host}:{spec.port} as {spec.nick}")
+    reader, writer = await asyncio.open_connection(spec.host, spec.port)
+    print(f"[DEBUG] [{spec.server}] Connected successfully")
+    conn = IRCConnection(spec, reader, writer, sender)
+    _connections.add(conn)
+    writer_task = asyncio.create_task(conn.write_loop())
+    conn.send(f"NICK {spec.nick}")
+    conn.send(f"USER {spec.nick} @ * :Sentiment Analysis Bot")
+    try:
+        await conn.read_loop()
+    finally:
+        _connections.discard(conn)
+        writer_task.cancel()
+        conn.close()
+    return conn
+
+
+async def run_connection(spec, sender):
+    """Keep one connection alive, reconnecting with jittered backoff."""
+    backoff = Backoff(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
     attempts = 0
     while running:
         try:
-            print(f"[DEBUG] Connecting to {SERVER}: {PORT}")
-            """Connect to the IRC server and listen for messages"""
-            irc = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            print(f"[DEBUG] Trying to connect to IRC at {SERVER}:{PORT}")
-            irc.connect((SERVER, PORT))
-            print("[DEBUG] Connected successfully")
-            irc.send(f"NICK {NICKNAME}\r\n".encode("utf-8"))
-            irc.send(f"USER {NICKNAME} @ * :Sentiment Analysis Bot\r\n".encode("utf-8"))
-
-            last_ping = time.time()
-            joined = False
-
-            while running:
-                try:
-                    msg = irc.recv(2048).decode("utf-8", errors="ignore").strip()
-                    if not msg:
-                        print("[WARN] Empty message received, server might be down")
-                        break
-
-                    if "Server going down" in msg:
-                        print("[INFO] Server is going down, will reconnect...")
-                        break
-
-                    if not joined and re.search(r" 001 ", msg):
-                        print(f"[DEBUG] Sending JOIN to {CHANNEL}")
-                        irc.send(f"JOIN {CHANNEL}\r\n".encode("utf-8"))
-                        joined = True
-
-                    if time.time() - last_ping > 60:
-                        print("⏳ Still connected...")
-                        last_ping = time.time()
-
-                    if msg:
-                        print(f"[IRC] {msg}")
-
-                    if msg.startswith("PING"):
-                        token = msg.split(":", 1)[1] if ":" in msg else ""
-                        pong_msg = f"PONG :{token}\r\n"
-                        print(f"[PING] -> {pong_msg.strip()}")
-                        irc.send(pong_msg.encode("utf-8"))
-
-                    match = re.search(r":(\S+)!.* PRIVMSG (\S+) :(.*)", msg)
-                    if match:
-                        user, channel, message = match.groups()
-                        print(f"{user} in {channel}: {message}")
-
-                        # Send message to Sentiment API with retry mechanism
-                        payload = {"user": user, "message": message}
-                        try:
-                            http.post(API_URL, json=payload, timeout=5)
-                        except Exception as e:
-                            print(f"[WARN] Failed to send to API after retries: {e}")
-
-                except socket.error as e:
-                    print(f"[ERROR] Socket error: {e}")
-                    break
-
+            conn = await run_session(spec, sender)
+            if conn.registered:
+                backoff.reset()
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
+            # Any failure ends only this connection; the others in run_bot's gather keep running
             attempts += 1
-            print(f"[ERROR] IRC connection #{attempts} failed: {e}")
-            time.sleep(5)
-        finally:
-            try:
-                irc.close()
-            except:
-                pass
-            print("[INFO] Attempting to reconnect...")
-            time.sleep(5)  # Add delay before reconnection attempt
+            print(f"[ERROR] [{spec.server}] IRC connection #{attempts} failed: {type(e).__name__}: {e}")
+        if not running:
+            break
+        delay = backoff.next_delay()
+        print(f"[INFO] [{spec.server}] Attempting to reconnect in {delay:.1f}s...")
+        try:
+            await asyncio.wait_for(_stop_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_bot():
+    global _loop, _stop_event
+    _loop = asyncio.get_running_loop()
+    _stop_event = asyncio.Event()
+    if threading.current_thread() is threading.main_thread():
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            _loop.add_signal_handler(sig, request_stop)
 
-def signal_handler(sig, frame):
+    specs = connection_specs()
+    if not specs:
+        print(f"[WARN] Shard {SHARD_INDEX}/{SHARD_COUNT} owns no channels, nothing to do")
+        _loop = None
+        return
+    print(f"[INFO] Shard {SHARD_INDEX}/{SHARD_COUNT}: {len(specs)} connection(s), "
+          f"{sum(len(spec.channels) for spec in specs)} channel(s)")
+
+    connector = aiohttp.TCPConnector(limit=API_MAX_CONNECTIONS)
+    timeout = aiohttp.ClientTimeout(total=API_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        options = dict(max_size=BATCH_MAX_SIZE, interval=BATCH_FLUSH_INTERVAL, max_pending=BATCH_MAX_PENDING,
+                       max_inflight=API_MAX_INFLIGHT, retries=API_RETRIES)
+        if SPOOL_PATH:
+            sender = SpoolingSender(session, API_BATCH_URL, Spool(SPOOL_PATH, SPOOL_MAX_MESSAGES), **options)
+        else:
+            sender = MessageSender(session, API_BATCH_URL, **options)
+        sender_task = asyncio.create_task(sender.run())
+
+        # All connections share one sender, so the API sees mixed-channel batches
+        await asyncio.gather(*(run_connection(spec, sender) for spec in specs))
+
+        sender_task.cancel()
+        await asyncio.gather(sender_task, return_exceptions=True)
+        await sender.close(timeout=API_TIMEOUT)
+    _loop = None
+
+
+def request_stop():
+    """Stop reading and reconnecting; queued messages are still flushed. Runs on the bot's loop."""
+    global running
+    running = False
+    _stop_event.set()
+    for conn in list(_connections):
+        conn.close()
+
+
+def stop():
+    """Thread-safe shutdown, for callers outside the bot's event loop."""
+    global running
+    running = False
+    loop = _loop
+    if loop is not None and not loop.is_closed():
+        loop.call_soon_threadsafe(request_stop)
+
+
+def connect_to_irc():
+    asyncio.run(run_bot())
     print("Shutting down gracefully...")
-    sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
 
 if __name__ == "__main__":
     connect_to_irc()
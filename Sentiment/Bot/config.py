@@ -0,0 +1,90 @@
+"""Which IRC servers and channels this bot instance handles.
+
+``BOT_CONFIG`` names a JSON file shared by every bot instance::
+
+    {"servers": [{"name": "nightwatch", "host": "ngircd", "port": 6667,
+                  "nick": "SentBot", "channels": ["#nightwatch", "#ops"],
+                  "channels_per_connection": 20,
+                  "rate_limit": {"burst": 5, "per_second": 1.0}}]}
+
+Each (server, channel) pair belongs to exactly one shard, picked by a stable
+hash, so instances started with ``SHARD_INDEX=0..SHARD_COUNT-1`` split the
+channels between them without talking to each other. Within an instance a
+server's channels are spread over connections of at most
+``channels_per_connection`` channels each.
+"""
+import json
+import zlib
+
+DEFAULT_CHANNELS_PER_CONNECTION = 20
+
+# ngircd penalises clients that send faster than about one command a second
+DEFAULT_RATE_BURST = 5
+DEFAULT_RATE_PER_SECOND = 1.0
+
+
+class ConnectionSpec:
+    """One IRC connection to open: where, as whom, which channels and how fast to write."""
+
+    def __init__(self, server, host, port, nick, channels, burst, per_second):
+        self.server = server
+        self.host = host
+        self.port = port
+        self.nick = nick
+        self.channels = channels
+        self.burst = burst
+        self.per_second = per_second
+
+    def __repr__(self):
+        return f"ConnectionSpec({self.server!r}, {self.host}:{self.port}, nick={self.nick!r}, channels={self.channels!r})"
+
+
+def shard_of(server, channel, shard_count):
+    """Shard owning ``channel`` on ``server``; stable across processes and restarts."""
+    key = f"{server}/{channel.lower()}".encode("utf-8")
+    return zlib.crc32(key) % shard_count
+
+
+def load_servers(path):
+    with open(path) as f:
+        config = json.load(f)
+    servers = config.get("servers") if isinstance(config, dict) else None
+    if not servers:
+        raise ValueError(f"{path}: expected a non-empty 'servers' list")
+    for server in servers:
+        for key in ("host", "channels"):
+            if not server.get(key):
+                raise ValueError(f"{path}: server entry {server!r} is missing '{key}'")
+        server.setdefault("name", server["host"])
+    return servers
+
+
+def plan_connections(servers, shard_index=0, shard_count=1, default_nick="SentimentBot"):
+    """Connections this shard should open, with its channels packed onto as few as allowed."""
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"SHARD_INDEX must be in [0, {shard_count}), got {shard_index}")
+
+    specs = []
+    for server in servers:
+        name = server["name"]
+        channels = [c for c in server["channels"] if shard_of(name, c, shard_count) == shard_index]
+        if not channels:
+            continue
+        per_connection = max(1, int(server.get("channels_per_connection", DEFAULT_CHANNELS_PER_CONNECTION)))
+        rate = server.get("rate_limit", {})
+        groups = [channels[i:i + per_connection] for i in range(0, len(channels), per_connection)]
+        nick = server.get("nick", default_nick)
+        for index, group in enumerate(groups):
+            # Nicks must be unique per server across every shard and connection
+            # (separated, so shard 1 / connection 10 and shard 11 / connection 0 differ)
+            suffix = f"{shard_index}-{index}" if shard_count > 1 or len(groups) > 1 else ""
+            specs.append(ConnectionSpec(
+                server=name,
+                host=server["host"],
+                port=int(server.get("port", 6667)),
+                nick=f"{nick}{suffix}",
+                channels=group,
+                burst=int(rate.get("burst", DEFAULT_RATE_BURST)),
+                per_second=float(rate.get("per_second", DEFAULT_RATE_PER_SECOND)),
+            ))
+    return specs
@@ -0,0 +1,161 @@
+"""IRC line framing and IRCv3 message parsing.
+
+Lines are split on ``\\n`` across reads (a trailing ``\\r`` is dropped), so
+several messages in one ``recv()`` and messages cut across two reads are
+both handled. Parsing works on the raw bytes and only decodes the pieces
+callers use.
+"""
+
+# IRCv3 allows 8191 bytes of tags plus the 512-byte message body
+MAX_LINE_LENGTH = 8191 + 512
+
+_TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+class LineReader:
+    """Accumulates socket reads and yields complete lines as bytes."""
+
+    def __init__(self, max_line_length=MAX_LINE_LENGTH):
+        self.buffer = bytearray()
+        self.max_line_length = max_line_length
+        self.overflows = 0
+        # Set after an overlong line until its terminating newline arrives
+        self.discarding = False
+
+    def feed(self, data):
+        """Add a chunk and return the complete lines it finishes (without CR/LF)."""
+        if self.discarding:
+            newline = data.find(b"\n")
+            if newline < 0:
+                return []
+            data = data[newline + 1:]
+            self.discarding = False
+
+        self.buffer += data
+        lines = []
+        end = self.buffer.rfind(b"\n")
+        if end >= 0:
+            view = memoryview(self.buffer)
+            chunk = bytes(view[:end])
+            view.release()
+            del self.buffer[:end + 1]
+
+            for line in chunk.split(b"\n"):
+                if line.endswith(b"\r"):
+                    line = line[:-1]
+                if len(line) > self.max_line_length:
+                    self.overflows += 1
+                elif line:
+                    lines.append(line)
+
+        if len(self.buffer) > self.max_line_length:
+            # A line this long is garbage; drop it, and the rest of it up to its newline
+            self.buffer.clear()
+            self.overflows += 1
+            self.discarding = True
+        return lines
+
+
+def _unescape_tag_value(value):
+    if "\\" not in value:
+        return value
+    out = []
+    i = 0
+    while i < len(value):
+        char = value[i]
+        if char == "\\" and i + 1 < len(value):
+            out.append(_TAG_ESCAPES.get(value[i + 1], value[i + 1]))
+            i += 2
+        elif char == "\\":
+            i += 1
+        else:
+            out.append(char)
+            i += 1
+    return "".join(out)
+
+
+class Message:
+    """A parsed IRC message: ``@tags :prefix COMMAND param param :trailing``."""
+
+    __slots__ = ("raw_tags", "prefix", "command", "params", "_tags")
+
+    def __init__(self, raw_tags, prefix, command, params):
+        self.raw_tags = raw_tags
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+        self._tags = None
+
+    @property
+    def tags(self):
+        """IRCv3 message tags, parsed on first access."""
+        if self._tags is None:
+            self._tags = {}
+            if self.raw_tags:
+                for item in self.raw_tags.decode("utf-8", errors="replace").split(";"):
+                    key, _, value = item.partition("=")
+                    if key:
+                        self._tags[key] = _unescape_tag_value(value)
+        return self._tags
+
+    @property
+    def nick(self):
+        if not self.prefix:
+            return None
+        return self.prefix.split("!", 1)[0].split("@", 1)[0]
+
+    def __repr__(self):
+        return f"Message(prefix={self.prefix!r}, command={self.command!r}, params={self.params!r})"
+
+
+def parse_message(line, encoding="utf-8"):
+    """Parse one line (bytes, bytearray or memoryview) into a Message, or None if empty."""
+    if isinstance(line, memoryview):
+        line = line.tobytes()
+    pos = 0
+    length = len(line)
+
+    raw_tags = None
+    if line.startswith(b"@"):
+        space = line.find(b" ", 1)
+        if space < 0:
+            return None
+        raw_tags = line[1:space]
+        pos = space + 1
+        while pos < length and line[pos] == 0x20:
+            pos += 1
+
+    prefix = None
+    if line.startswith(b":", pos):
+        space = line.find(b" ", pos)
+        if space < 0:
+            return None
+        prefix = line[pos + 1:space].decode(encoding, errors="replace")
+        pos = space + 1
+        while pos < length and line[pos] == 0x20:
+            pos += 1
+
+    space = line.find(b" ", pos)
+    if space < 0:
+        command = line[pos:]
+        rest = b""
+    else:
+        command = line[pos:space]
+        rest = line[space + 1:]
+    if not command:
+        return None
+
+    params = []
+    while rest:
+        if rest.startswith(b":"):
+            params.append(rest[1:].decode(encoding, errors="replace"))
+            break
+        space = rest.find(b" ")
+        if space < 0:
+            params.append(rest.decode(encoding, errors="replace"))
+            break
+        if space:
+            params.append(rest[:space].decode(encoding, errors="replace"))
+        rest = rest[space + 1:]
+
+    return Message(raw_tags, prefix, command.decode("ascii", errors="replace").upper(), params)
@@ -0,0 +1,86 @@
+"""Durable, bounded spool of messages waiting to reach the Sentiment API.
+
+Batches of records are appended to a SQLite table in WAL mode, one row per
+batch, so the per-message cost is a share of one insert. A drainer claims
+rows in id order, posts them and deletes them only once the API has
+accepted them, so anything not yet delivered when the bot stops (or the
+API is down) is replayed on the next start. Claims are tracked in memory
+only; after a restart the cursor starts from zero again.
+"""
+import json
+import sqlite3
+
+
+class Spool:
+    """Append-only message log with claim/ack delivery. Not thread-safe; use from one thread at a time."""
+
+    def __init__(self, path, max_messages=1000000):
+        self.path = path
+        self.max_messages = max_messages
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL survives process crashes; only a power cut can lose the last commits
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS spool ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, size INTEGER NOT NULL, batch TEXT NOT NULL)")
+        self.db.commit()
+
+        self.cursor = 0  # highest id handed out by claim()
+        self.count = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM spool").fetchone()[0]
+        self.replayed = self.count
+        self.appended = 0
+        self.acked = 0
+        self.dropped = 0
+
+    def append(self, records):
+        """Store one batch; it is claimed and acked as a unit."""
+        if not records:
+            return
+        with self.db:
+            self.db.execute("INSERT INTO spool (size, batch) VALUES (?, ?)",
+                            (len(records), json.dumps(records, ensure_ascii=False)))
+            self.count += len(records)
+            self.appended += len(records)
+            while self.count > self.max_messages:
+                # Full: shed the oldest batches rather than fill the disk
+                row = self.db.execute("SELECT id, size FROM spool ORDER BY id LIMIT 1").fetchone()
+                self.db.execute("DELETE FROM spool WHERE id = ?", (row[0],))
+                self.count -= row[1]
+                self.dropped += row[1]
+
+    def claim(self):
+        """Oldest unclaimed batch as ``(id, records)``, or None when caught up."""
+        row = self.db.execute("SELECT id, batch FROM spool WHERE id > ? ORDER BY id LIMIT 1",
+                              (self.cursor,)).fetchone()
+        if row is None:
+            return None
+        self.cursor = row[0]
+        return row[0], json.loads(row[1])
+
+    def ack(self, batch_id):
+        """Forget a delivered batch."""
+        row = self.db.execute("SELECT size FROM spool WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return  # shed by append() while in flight
+        with self.db:
+            self.db.execute("DELETE FROM spool WHERE id = ?", (batch_id,))
+        self.count -= row[0]
+        self.acked += row[0]
+
+    def checkpoint(self):
+        """Fold the WAL back into the database and truncate it, keeping the log file small."""
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'pending': self.count,
+            'max_messages': self.max_messages,
+            'replayed': self.replayed,
+            'appended': self.appended,
+            'acked': self.acked,
+            'dropped': self.dropped,
+        }
+
+    def close(self):
+        self.db.close()
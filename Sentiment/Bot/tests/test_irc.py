@@ -0,0 +1,66 @@
+from irc import LineReader, parse_message
+
+
+def test_line_split_across_reads_is_reassembled():
+    reader = LineReader()
+    assert reader.feed(b"PING :irc.exa") == []
+    assert reader.feed(b"mple.org\r\n") == [b"PING :irc.example.org"]
+    assert reader.buffer == b""
+
+
+def test_several_lines_in_one_read_keep_the_partial_tail():
+    reader = LineReader()
+    assert reader.feed(b"PING :a\r\nPING :b\nPING :c\r\nPRIV") == [b"PING :a", b"PING :b", b"PING :c"]
+    assert reader.feed(b"MSG #x :hi\r\n") == [b"PRIVMSG #x :hi"]
+
+
+def test_blank_lines_are_skipped():
+    assert LineReader().feed(b"\r\n\nPING :a\r\n") == [b"PING :a"]
+
+
+def test_overflow_discards_the_rest_of_the_line():
+    reader = LineReader(max_line_length=10)
+    assert reader.feed(b"x" * 11) == []
+    assert reader.overflows == 1 and reader.discarding
+    # The tail of the overlong line is not a line of its own
+    assert reader.feed(b"abc") == []
+    assert reader.feed(b"def\r\nPING :ok\r\n") == [b"PING :ok"]
+    assert not reader.discarding
+
+
+def test_overlong_line_within_one_read_is_dropped():
+    reader = LineReader(max_line_length=10)
+    assert reader.feed(b"y" * 20 + b"\r\nPING :ok\r\n") == [b"PING :ok"]
+    assert reader.overflows == 1
+
+
+def test_parse_prefix_command_params_and_trailing():
+    msg = parse_message(b":nick!user@host PRIVMSG #chan :hello  world :)")
+    assert msg.prefix == "nick!user@host" and msg.nick == "nick"
+    assert msg.command == "PRIVMSG"
+    assert msg.params == ["#chan", "hello  world :)"]
+    assert msg.tags == {}
+
+
+def test_parse_without_prefix_or_trailing():
+    msg = parse_message(b"ping server1 server2")
+    assert msg.prefix is None and msg.nick is None
+    assert msg.command == "PING"
+    assert msg.params == ["server1", "server2"]
+
+
+def test_parse_ircv3_tags_with_escapes():
+    msg = parse_message(b"@time=2026-01-01T00:00:00Z;msg=a\\sb\\:c\\\\d\\r\\n;+flag :n!u@h PRIVMSG #c :x")
+    assert msg.tags == {"time": "2026-01-01T00:00:00Z", "msg": "a b;c\\d\r\n", "+flag": ""}
+    assert msg.nick == "n" and msg.params == ["#c", "x"]
+
+
+def test_parse_decodes_invalid_utf8_and_accepts_memoryview():
+    msg = parse_message(memoryview(b":n!u@h PRIVMSG #c :caf\xe9"))
+    assert msg.params == ["#c", "caf�"]
+
+
+def test_parse_rejects_empty_or_truncated_lines():
+    assert parse_message(b"") is None
+    assert parse_message(b"@tags-only") is None
+    assert parse_message(b":prefix-only") is None
@@ -0,0 +1,77 @@
+import pytest
+
+from spool import Spool
+
+
+def _batch(*ids):
+    return [{'user': 'u', 'message': f"m{i}"} for i in ids]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "spool.db")
+
+
+def test_claims_in_append_order_and_acks_forget(path):
+    spool = Spool(path)
+    spool.append(_batch(1, 2))
+    spool.append(_batch(3))
+    spool.append([])   # ignored
+
+    first_id, first = spool.claim()
+    second_id, second = spool.claim()
+    assert [r['message'] for r in first + second] == ["m1", "m2", "m3"]
+    assert first_id < second_id
+    assert spool.claim() is None
+
+    # Acks may arrive out of order; each only removes its own batch
+    spool.ack(second_id)
+    assert spool.stats()['pending'] == 2
+    spool.ack(first_id)
+    spool.ack(first_id)
+    stats = spool.stats()
+    assert (stats['pending'], stats['appended'], stats['acked'], stats['dropped']) == (0, 3, 3, 0)
+    spool.close()
+
+
+def test_unacked_batches_are_replayed_after_reopen(path):
+    spool = Spool(path)
+    spool.append(_batch(1))
+    spool.append(_batch(2, 3))
+    batch_id, _ = spool.claim()
+    spool.ack(batch_id)
+    spool.claim()   # in flight when the bot stops
+    spool.close()
+
+    reopened = Spool(path)
+    assert reopened.stats()['replayed'] == 2
+    _, records = reopened.claim()
+    assert [r['message'] for r in records] == ["m2", "m3"]
+    assert reopened.claim() is None
+    reopened.close()
+
+
+def test_full_spool_sheds_whole_oldest_batches(path):
+    spool = Spool(path, max_messages=5)
+    for i in range(3):
+        spool.append(_batch(2 * i, 2 * i + 1))
+
+    # Six messages in batches of two: shedding the oldest batch leaves four, not five
+    stats = spool.stats()
+    assert stats['pending'] == 4 and stats['dropped'] == 2 and stats['appended'] == 6
+    _, records = spool.claim()
+    assert [r['message'] for r in records] == ["m2", "m3"]
+    spool.close()
+
+
+def test_ack_of_a_batch_shed_while_in_flight_is_ignored(path):
+    spool = Spool(path, max_messages=2)
+    spool.append(_batch(1, 2))
+    batch_id, _ = spool.claim()
+    spool.append(_batch(3))   # sheds the in-flight batch
+
+    spool.ack(batch_id)
+    assert spool.stats()['pending'] == 1
+    assert spool.stats()['acked'] == 0
+    spool.checkpoint()
+    spool.close()
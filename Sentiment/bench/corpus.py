@@ -0,0 +1,66 @@
+"""Benchmark corpora: synthetic IRC chatter or lines loaded from a recorded log."""
+import random
+import re
+
+ENGLISH = [
+    "hello everyone", "good morning folks", "lol", "gg", "brb", "that was hilarious",
+    "why is the server so slow today", "thanks a lot, you really helped me",
+    "I can't believe they cancelled it, I'm furious", "this is the best day ever",
+    "anyone around?", "I miss you all so much", "meh, whatever", "what a surprise",
+    "the build is broken again", "nice work on the release", "I'm so scared about tomorrow",
+]
+FOREIGN = [
+    "bonjour tout le monde", "je suis très content aujourd'hui", "¿qué tal estáis?",
+    "das ist wirklich schlecht", "grazie mille a tutti", "estou muito triste hoje",
+    "c'est vraiment nul", "buenas noches amigos",
+]
+EMOJI = ["😀", "😂😂😂", "👍", "🔥🔥", ":)", ":(", "<3"]
+COMMANDS = ["!help", "!stats", "!uptime", "!weather paris"]
+
+# <timestamp> <nick> message / [hh:mm] <nick> message / raw ":nick!u@h PRIVMSG #c :message"
+_LOG_PATTERNS = [
+    re.compile(r"^:(?P<user>[^!\s]+)!\S+ PRIVMSG (?P<channel>\S+) :(?P<message>.*)$"),
+    re.compile(r"^\S*\s*\[?[\d:\-T .]*\]?\s*<[@+%~&]?(?P<user>[^>]+)>\s(?P<message>.*)$"),
+]
+
+
+def synthetic_corpus(size, seed=42, repeat_ratio=0.3, foreign_ratio=0.2, emoji_ratio=0.1):
+    """Yield ``size`` (user, channel, message) tuples with IRC-like repetition."""
+    rng = random.Random(seed)
+    users = [f"user{i}" for i in range(50)]
+    channels = ["#nightwatch", "#general", "#random"]
+    history = []
+    for _ in range(size):
+        roll = rng.random()
+        if history and roll < repeat_ratio:
+            message = rng.choice(history)
+        elif roll < repeat_ratio + foreign_ratio:
+            message = rng.choice(FOREIGN)
+        elif roll < repeat_ratio + foreign_ratio + emoji_ratio:
+            message = rng.choice(EMOJI)
+        elif roll < repeat_ratio + foreign_ratio + emoji_ratio + 0.05:
+            message = rng.choice(COMMANDS)
+        else:
+            # Vary English lines so not everything is an exact repeat
+            message = rng.choice(ENGLISH)
+            if rng.random() < 0.5:
+                message = f"{message} {rng.choice(ENGLISH)}"
+        history.append(message)
+        yield rng.choice(users), rng.choice(channels), message
+
+
+def load_corpus(path, default_channel="#nightwatch"):
+    """Yield (user, channel, message) from a log file: raw IRC lines, ``<nick> text`` logs or plain text."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            for pattern in _LOG_PATTERNS:
+                match = pattern.match(line)
+                if match:
+                    fields = match.groupdict()
+                    yield fields["user"], fields.get("channel") or default_channel, fields["message"]
+                    break
+            else:
+                yield "user", default_channel, line
@@ -0,0 +1,118 @@
+"""Minimal IRC server and API sink used to benchmark the bot offline."""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeIRCServer:
+    """Accepts one client, completes registration and replays a corpus as PRIVMSGs.
+
+    Each message is sent from nick ``b<seq>`` so the sink can match arrivals
+    back to send times. ``rate`` caps lines per second (0 = as fast as possible).
+    """
+
+    def __init__(self, corpus, rate=0.0, host="127.0.0.1", port=0, lines_per_write=20):
+        self.corpus = list(corpus)
+        self.rate = rate
+        self.lines_per_write = lines_per_write
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(1)
+        self.address = self.sock.getsockname()
+        self.sent_at = {}
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        with conn:
+            # Wait for NICK/USER before welcoming the client
+            buffer = b""
+            while b"USER" not in buffer:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    return
+                buffer += chunk
+            conn.sendall(b":fake.irc 001 bench :Welcome to the benchmark\r\n")
+            time.sleep(0.2)  # let the client JOIN
+
+            interval = 1.0 / self.rate if self.rate else 0.0
+            start = time.perf_counter()
+            pending = []
+            for seq, (_, channel, message) in enumerate(self.corpus):
+                if interval:
+                    delay = start + seq * interval - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                line = f":b{seq}!bench@fake.irc PRIVMSG {channel} :{message}\r\n"
+                pending.append(line.encode("utf-8"))
+                self.sent_at[f"b{seq}"] = time.perf_counter()
+                # Several lines per write, as a real server does under load
+                if len(pending) >= self.lines_per_write or interval:
+                    conn.sendall(b"".join(pending))
+                    pending = []
+            if pending:
+                conn.sendall(b"".join(pending))
+            self.done.set()
+            # Keep the connection open until the benchmark tears it down
+            conn.settimeout(1.0)
+            while True:
+                try:
+                    if not conn.recv(4096):
+                        break
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+
+    def close(self):
+        self.sock.close()
+
+
+class APISink:
+    """HTTP server standing in for the Sentiment API; records when each message arrives."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.arrived_at = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"null")
+                now = time.perf_counter()
+                records = body if isinstance(body, list) else (body.get("messages") or [body])
+                with sink.lock:
+                    sink.requests += 1
+                    for record in records:
+                        sink.arrived_at.setdefault(record.get("user"), now)
+                payload = json.dumps({"results": []}).encode("utf-8")
+                self.send_response(201)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.address = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
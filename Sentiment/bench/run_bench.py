@@ -0,0 +1,359 @@
+"""Offline throughput/latency benchmark for the IRC -> bot -> API path.
+
+    python3 run_bench.py receive --messages 5000 --concurrency 16
+    python3 run_bench.py receive --endpoint receive_batch --batch-size 50
+    python3 run_bench.py irc --messages 20000
+    python3 run_bench.py receive --baseline last.json --max-regression 0.15
+
+``receive`` drives the Flask app in-process with a stub translator and stub
+(or small local) models, timing translation, each model, and the Socket.IO
+emit separately. ``--clients`` in-process Socket.IO clients subscribe to a
+mix of the catch-all, channel and channel+user rooms, so the emit stage
+fans out to real sessions. ``irc`` runs the bot's asyncio client against a fake
+IRC server and measures IRC-to-API delivery. Both print a JSON report.
+"""
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+API_DIR = BENCH_DIR.parent / "API"
+BOT_DIR = BENCH_DIR.parent / "Bot"
+
+from corpus import load_corpus, synthetic_corpus
+from stubs import StubTranslator, install_model_stubs, local_models, stub_models
+
+# Stage timings are recorded from tpool threads (models, translation) as well
+# as green threads, so the recorder needs a real OS lock
+try:
+    from eventlet.patcher import original
+    os_threading = original('threading')
+except ImportError:
+    os_threading = threading
+
+
+class StageRecorder:
+    """Thread-safe collection of per-stage durations."""
+
+    def __init__(self):
+        self.samples = {}
+        self.lock = os_threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        report = {}
+        with self.lock:
+            items = {stage: sorted(values) for stage, values in self.samples.items()}
+        for stage, values in items.items():
+            report[stage] = {
+                'count': len(values),
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': values[-1] * 1000,
+            }
+        return report
+
+
+class TimedTranslator:
+    def __init__(self, backend, recorder):
+        self.name = getattr(backend, "name", "timed")
+        self.translate = recorder.wrap("translation", backend.translate)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+class ResourceMeter:
+    """CPU time and RSS of this process over the measured interval."""
+
+    def __enter__(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.cpu_start = usage.ru_utime + usage.ru_stime
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.cpu_seconds = usage.ru_utime + usage.ru_stime - self.cpu_start
+        self.wall_seconds = time.perf_counter() - self.wall_start
+        self.peak_rss_mb = usage.ru_maxrss / 1024  # KiB on Linux
+        self.rss_mb = current_rss_mb()
+
+    def report(self):
+        return {
+            'wall_s': self.wall_seconds,
+            'cpu_s': self.cpu_seconds,
+            'cpu_percent': 100.0 * self.cpu_seconds / self.wall_seconds if self.wall_seconds else 0.0,
+            'rss_mb': self.rss_mb,
+            'peak_rss_mb': self.peak_rss_mb,
+        }
+
+
+def build_corpus(args):
+    if args.corpus:
+        corpus = list(load_corpus(args.corpus))
+        if args.messages:
+            corpus = (corpus * (args.messages // max(1, len(corpus)) + 1))[:args.messages]
+        return corpus
+    return list(synthetic_corpus(args.messages, seed=args.seed))
+
+
+def connect_clients(api, count, corpus):
+    """Socket.IO test clients: a third stay in the catch-all room, a third follow one
+    channel, a third follow a channel and a user (overlapping rooms)."""
+    channels = sorted({channel for _, channel, _ in corpus})
+    users = sorted({user for user, _, _ in corpus})
+    clients = []
+    for i in range(count):
+        client = api.socketio.test_client(api.app)
+        if i % 3 == 1:
+            client.emit('subscribe', {'channels': [channels[i % len(channels)]]})
+        elif i % 3 == 2:
+            client.emit('subscribe', {'channels': [channels[i % len(channels)]], 'users': [users[i % len(users)]]})
+        client.get_received()
+        clients.append(client)
+    return clients
+
+
+def count_received(clients):
+    frames = events = 0
+    for client in clients:
+        for packet in client.get_received():
+            if packet['name'] == 'sentiment_event':
+                frames += 1
+                events += 1
+            elif packet['name'] == 'sentiment_batch':
+                frames += 1
+                events += len(packet['args'][0])
+        client.disconnect()
+    return {'subscribers': len(clients), 'frames_received': frames, 'events_received': events}
+
+
+def bench_receive(args, corpus):
+    os.environ.setdefault("TRANSLATION_BACKEND", "none")
+    os.environ.setdefault("HISTORY_ENABLED", "false")
+    os.environ["RESULT_CACHE_SIZE"] = str(args.result_cache_size)
+    os.environ["RECEIVE_MODE"] = "async" if args.use_async else "sync"
+    os.environ["BROADCAST_INTERVAL_MS"] = str(args.broadcast_interval_ms)
+    # Keep caches (and the chmod the API applies to its cache dir) away from the real one
+    cache_dir = tempfile.mkdtemp(prefix="sentiment-bench-")
+    # Registered before the API's own exit hooks, so it runs after them
+    atexit.register(shutil.rmtree, cache_dir, ignore_errors=True)
+    os.environ["CACHE_DIR"] = cache_dir
+    local = bool(args.emotion_model and args.sentiment_model)
+    if not local:
+        install_model_stubs()
+    sys.path.insert(0, str(API_DIR))
+    import api  # noqa: E402  (monkey-patches eventlet, so import only in this mode)
+
+    recorder = StageRecorder()
+    api.translator.backend = TimedTranslator(StubTranslator(args.translation_ms), recorder)
+    if local:
+        models = local_models(args.emotion_model, args.sentiment_model)
+    else:
+        models = stub_models(args.model_batch_ms, args.model_item_ms)
+    api.activate_models({name: recorder.wrap(f"model_{name}", model) for name, model in models.items()})
+    api.emit_result = recorder.wrap("emit", api.emit_result)
+    api.broadcaster.start()
+    subscribers = connect_clients(api, args.clients, corpus)
+
+    client = api.app.test_client()
+    if args.endpoint == "receive_batch":
+        requests_ = [
+            ("/receive_batch", [{"user": u, "channel": c, "message": m, "ts": time.time()}
+                                for u, c, m in corpus[i:i + args.batch_size]])
+            for i in range(0, len(corpus), args.batch_size)
+        ]
+    else:
+        requests_ = [("/receive", {"user": u, "channel": c, "message": m}) for u, c, m in corpus]
+
+    cursor = iter(requests_)
+    cursor_lock = threading.Lock()
+    errors = []
+
+    def worker():
+        while True:
+            with cursor_lock:
+                item = next(cursor, None)
+            if item is None:
+                return
+            url, payload = item
+            start = time.perf_counter()
+            response = client.post(url, json=payload)
+            recorder.record("request", time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+
+    with ResourceMeter() as meter:
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if args.use_async:
+            # Wait for the pipeline to publish everything that was accepted
+            deadline = time.time() + args.timeout
+            while time.time() < deadline and len(recorder.samples.get("emit", [])) < len(corpus) - len(errors):
+                time.sleep(0.01)
+        # Send whatever coalesced frames are still queued
+        api.broadcaster.stop()
+
+    return {
+        'mode': 'receive',
+        'endpoint': args.endpoint,
+        'async': args.use_async,
+        'messages': len(corpus),
+        'errors': len(errors),
+        'throughput_msgs_per_s': len(corpus) / meter.wall_seconds if meter.wall_seconds else 0.0,
+        'stages': recorder.summary(),
+        'resources': meter.report(),
+        'batcher': api.batcher.stats(),
+        'broadcast': {**api.broadcaster.stats(), **count_received(subscribers)},
+    }
+
+
+def bench_irc(args, corpus):
+    from fake_irc import APISink, FakeIRCServer
+
+    sink = APISink().start()
+    server = FakeIRCServer(corpus, rate=args.rate).start()
+    sink_url = f"http://{sink.address[0]}:{sink.address[1]}"
+    os.environ.update({
+        "IRC_HOST": server.address[0],
+        "IRC_PORT": str(server.address[1]),
+        "IRC_CHANNEL": "#nightwatch",
+        "API_BATCH_URL": f"{sink_url}/receive_batch",
+    })
+    sys.path.insert(0, str(BOT_DIR))
+    import bot  # noqa: E402
+
+    recorder = StageRecorder()
+    with ResourceMeter() as meter:
+        # The bot logs every line; keep that cost but not the terminal spam
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            bot_thread = threading.Thread(target=bot.connect_to_irc, daemon=True)
+            bot_thread.start()
+            deadline = time.time() + args.timeout
+            while time.time() < deadline and len(sink.arrived_at) < len(corpus):
+                time.sleep(0.01)
+            bot.stop()
+            bot_thread.join(timeout=10)
+
+    delivered = 0
+    for nick, sent in server.sent_at.items():
+        arrived = sink.arrived_at.get(nick)
+        if arrived is not None:
+            delivered += 1
+            recorder.record("irc_to_api", arrived - sent)
+
+    server.close()
+    sink.close()
+    return {
+        'mode': 'irc',
+        'messages': len(corpus),
+        'delivered': delivered,
+        'api_requests': sink.requests,
+        'throughput_msgs_per_s': delivered / meter.wall_seconds if meter.wall_seconds else 0.0,
+        'stages': recorder.summary(),
+        'resources': meter.report(),
+    }
+
+
+def check_regression(report, baseline, max_regression):
+    """Compare throughput and p99 request/delivery latency against a previous report."""
+    failures = []
+    base_tp = baseline.get('throughput_msgs_per_s', 0.0)
+    if base_tp and report['throughput_msgs_per_s'] < base_tp * (1 - max_regression):
+        failures.append(f"throughput {report['throughput_msgs_per_s']:.1f} < baseline {base_tp:.1f}")
+    for stage in ("request", "irc_to_api"):
+        base = baseline.get('stages', {}).get(stage)
+        current = report['stages'].get(stage)
+        if base and current and current['p99_ms'] > base['p99_ms'] * (1 + max_regression):
+            failures.append(f"{stage} p99 {current['p99_ms']:.1f}ms > baseline {base['p99_ms']:.1f}ms")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sentiment pipeline benchmark")
+    parser.add_argument("mode", choices=["receive", "irc"])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--corpus", help="Recorded IRC log or text file to replay instead of synthetic chatter")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--baseline", help="Previous JSON report to gate regressions against")
+    parser.add_argument("--max-regression", type=float, default=0.1)
+
+    receive = parser.add_argument_group("receive mode")
+    receive.add_argument("--endpoint", choices=["receive", "receive_batch"], default="receive")
+    receive.add_argument("--batch-size", type=int, default=50)
+    receive.add_argument("--concurrency", type=int, default=8)
+    receive.add_argument("--async", dest="use_async", action="store_true")
+    receive.add_argument("--translation-ms", type=float, default=0.0)
+    receive.add_argument("--model-batch-ms", type=float, default=2.0)
+    receive.add_argument("--model-item-ms", type=float, default=0.5)
+    receive.add_argument("--result-cache-size", type=int, default=0)
+    receive.add_argument("--clients", type=int, default=12, help="Subscribed Socket.IO clients")
+    receive.add_argument("--broadcast-interval-ms", type=float, default=0.0,
+                         help="Coalesce Socket.IO events (0 = one sentiment_event per result)")
+    receive.add_argument("--emotion-model", help="Local directory of a small emotion checkpoint")
+    receive.add_argument("--sentiment-model", help="Local directory of a small sentiment checkpoint")
+
+    irc = parser.add_argument_group("irc mode")
+    irc.add_argument("--rate", type=float, default=0.0, help="Lines per second from the fake server (0 = flood)")
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args)
+    report = bench_receive(args, corpus) if args.mode == "receive" else bench_irc(args, corpus)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = check_regression(report, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"[REGRESSION] {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
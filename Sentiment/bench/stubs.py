@@ -0,0 +1,88 @@
+"""Offline stand-ins for the translator and transformer pipelines."""
+import hashlib
+import sys
+import time
+import types
+
+EMOTION_LABELS = ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"]
+SENTIMENT_LABELS = ["NEG", "NEU", "POS"]
+
+
+class StubTranslator:
+    """Translator backend that returns text unchanged after a fixed delay."""
+
+    name = "stub"
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+
+    def translate(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return text
+
+
+class StubClassifier:
+    """Deterministic pipeline stand-in with a per-batch and per-item cost.
+
+    Called like a transformers text-classification pipeline with ``top_k=3``:
+    a list of texts in, one ``[{label, score}, ...]`` list per text out.
+    """
+
+    def __init__(self, labels, batch_ms=2.0, item_ms=0.5, top_k=3):
+        self.labels = labels
+        self.batch_cost = batch_ms / 1000.0
+        self.item_cost = item_ms / 1000.0
+        self.top_k = top_k
+
+    def _classify(self, text):
+        digest = hashlib.md5(text.encode("utf-8")).digest()
+        weights = [digest[i % len(digest)] + 1 for i in range(len(self.labels))]
+        total = float(sum(weights))
+        scored = sorted(zip(self.labels, weights), key=lambda p: p[1], reverse=True)
+        return [{'label': label, 'score': weight / total} for label, weight in scored[:self.top_k]]
+
+    def __call__(self, texts, batch_size=None):
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        time.sleep(self.batch_cost + self.item_cost * len(batch))
+        outputs = [self._classify(text) for text in batch]
+        return [outputs[0]] if single else outputs
+
+
+def _unavailable(*args, **kwargs):
+    raise RuntimeError("transformers is stubbed out in this benchmark; pass --emotion-model/--sentiment-model")
+
+
+def install_model_stubs():
+    """Put placeholder ``torch`` and ``transformers`` modules in ``sys.modules``.
+
+    The API imports both at module level; with stub models nothing calls
+    into them, so the bench runs without either installed and without
+    paying their import time.
+    """
+    torch = types.ModuleType("torch")
+    torch.cuda = types.SimpleNamespace(is_available=lambda: False)
+    torch.set_num_threads = lambda n: None
+    transformers = types.ModuleType("transformers")
+    transformers.pipeline = _unavailable
+    transformers.AutoTokenizer = types.SimpleNamespace(from_pretrained=_unavailable)
+    transformers.AutoModelForSequenceClassification = types.SimpleNamespace(from_pretrained=_unavailable)
+    sys.modules.setdefault("torch", torch)
+    sys.modules.setdefault("transformers", transformers)
+
+
+def stub_models(batch_ms=2.0, item_ms=0.5):
+    return {
+        "emotion": StubClassifier(EMOTION_LABELS, batch_ms, item_ms),
+        "sentiment": StubClassifier(SENTIMENT_LABELS, batch_ms, item_ms),
+    }
+
+
+def local_models(emotion_path, sentiment_path):
+    """Small transformers checkpoints from local directories (no network)."""
+    from transformers import pipeline
+    return {
+        "emotion": pipeline("text-classification", model=emotion_path, top_k=3, device=-1),
+        "sentiment": pipeline("text-classification", model=sentiment_path, top_k=3, device=-1),
+    }